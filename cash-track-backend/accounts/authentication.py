@@ -0,0 +1,91 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from .models import User
+from .revocation import revocation_store
+
+# Fields kept in the cache; everything else is loaded lazily if a view needs it
+CACHED_USER_FIELDS = [
+    "id",
+    "email",
+    "username",
+    "name",
+    "role",
+    "status",
+    "is_active",
+    "is_staff",
+    "is_superuser",
+    "created_at",
+]
+
+
+def user_cache_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+def invalidate_cached_user(user_id):
+    """Drop the cached user now and again once the current DB transaction commits"""
+    cache = caches[settings.AUTH_USER_CACHE_ALIAS]
+    key = user_cache_key(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that checks the revocation store and caches the resolved
+    user for AUTH_USER_CACHE_TIMEOUT seconds, so authenticated requests skip the
+    users lookup.
+
+    Entries are invalidated by the User post_save/post_delete signals
+    (status toggle, update, delete, password change). ``QuerySet.update()``,
+    ``bulk_update()`` and raw SQL send no signal: call ``invalidate_cached_user``
+    for each changed user, otherwise the old entry lives until the timeout
+    (keep AUTH_USER_CACHE_TIMEOUT short). With several worker processes,
+    AUTH_USER_CACHE_ALIAS must point to a shared cache for the invalidation
+    to reach every worker.
+
+    Cached or not, users must be active (``is_active`` and ``status``), as at login.
+    """
+
+    def get_validated_token(self, raw_token):
+        """Reject tokens present in the in-memory revocation store"""
+        validated_token = super().get_validated_token(raw_token)
+        if revocation_store.is_revoked(validated_token):
+            raise InvalidToken(_("Token is blacklisted"))
+        return validated_token
+
+    def get_user(self, validated_token):
+        user = self.get_cached_user(validated_token)
+        if user.status != "active":
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
+
+    def get_cached_user(self, validated_token):
+        timeout = settings.AUTH_USER_CACHE_TIMEOUT
+        if not timeout:
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        cache = caches[settings.AUTH_USER_CACHE_ALIAS]
+        key = user_cache_key(user_id)
+        cached = cache.get(key)
+        if cached is None:
+            user = super().get_user(validated_token)
+            cache.set(key, {field: getattr(user, field) for field in CACHED_USER_FIELDS}, timeout)
+            return user
+
+        # Rebuild a regular model instance; the other fields stay deferred
+        field_names = [f.attname for f in User._meta.concrete_fields if f.attname in cached]
+        user = User.from_db("default", field_names, [cached[name] for name in field_names])
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
@@ -0,0 +1,24 @@
+"""
+Password hashers with work factors taken from settings.
+
+The defaults follow the OWASP password storage recommendations; the
+``python manage.py bench_login`` figures they were chosen from are recorded
+next to them in settings.py. Raise them if the benchmark shows headroom on
+the production hardware. Changing a parameter is safe:
+existing hashes keep verifying and are rehashed with the new parameters on
+the user's next successful login (``check_password`` does this).
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, ScryptPasswordHasher
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """Argon2id with configurable time/memory cost"""
+    time_cost = settings.ARGON2_TIME_COST
+    memory_cost = settings.ARGON2_MEMORY_COST
+    parallelism = settings.ARGON2_PARALLELISM
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    """scrypt with a configurable work factor"""
+    work_factor = settings.SCRYPT_WORK_FACTOR
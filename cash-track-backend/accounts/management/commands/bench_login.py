@@ -0,0 +1,60 @@
+"""
+Measure login cost per CPU core: password verification per hasher, then
+full POST /api/auth/login/ requests with the configured hasher.
+
+The bench user is created inside a transaction that is rolled back, so the
+command never changes the database.
+"""
+import time
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand
+from django.db import transaction as db_transaction
+from rest_framework.test import APIClient
+from accounts.models import User
+
+PASSWORD = "Bench-Password-2024!"
+
+
+class Command(BaseCommand):
+    help = "Benchmark password hashers and login_view throughput (logins/sec per core)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20, help="Verifications / logins per measurement")
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        preferred = get_hasher().algorithm
+
+        self.stdout.write(f"{'hasher':<14} {'ms/verify':>10} {'verify/s/core':>14}")
+        for algorithm in ("argon2", "scrypt", "pbkdf2_sha256"):
+            hasher = get_hasher(algorithm)
+            encoded = hasher.encode(PASSWORD, hasher.salt())
+            start = time.perf_counter()
+            for _ in range(iterations):
+                hasher.verify(PASSWORD, encoded)
+            elapsed = (time.perf_counter() - start) / iterations
+            marker = "  <- PASSWORD_HASHER" if algorithm == preferred else ""
+            self.stdout.write(f"{algorithm:<14} {elapsed * 1000:>10.1f} {1 / elapsed:>14,.1f}{marker}")
+
+        with db_transaction.atomic():
+            User.objects.create_user(
+                username="bench-login", email="Bench-Login@example.com", password=PASSWORD, role="user"
+            )
+            client = APIClient()
+            start = time.perf_counter()
+            for _ in range(iterations):
+                response = client.post(
+                    "/api/auth/login/",
+                    {"email": "bench-login@example.com", "password": PASSWORD},
+                    format="json",
+                )
+                if response.status_code != 200:
+                    self.stderr.write(self.style.ERROR(f"Login failed: {response.status_code}"))
+                    break
+            elapsed = (time.perf_counter() - start) / iterations
+            db_transaction.set_rollback(True)
+
+        self.stdout.write(
+            f"\nlogin_view ({preferred}): {elapsed * 1000:.1f} ms/login, "
+            f"{1 / elapsed:,.1f} logins/s per core"
+        )
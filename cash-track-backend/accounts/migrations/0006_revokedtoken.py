@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-19 02:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_alter_user_options_remove_user_deleted_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevokedToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jti', models.CharField(blank=True, max_length=255, null=True, unique=True)),
+                ('revoked_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='token_revocations', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Jeton révoqué',
+                'verbose_name_plural': 'Jetons révoqués',
+                'db_table': 'revoked_tokens',
+            },
+        ),
+    ]
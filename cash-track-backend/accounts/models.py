@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models.functions import Lower
 
 
 class User(AbstractUser):
@@ -31,10 +32,27 @@ class User(AbstractUser):
         verbose_name = "Utilisateur"
         verbose_name_plural = "Utilisateurs"
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(Lower("email"), name="users_email_lower_idx"),
+        ]
     
     def __str__(self):
         return self.email or "Utilisateur sans email"
     
+    @classmethod
+    def get_by_email(cls, email):
+        """Case-insensitive email lookup, served by the lower(email) index"""
+        users = list(
+            cls.objects.alias(email_lower=Lower("email")).filter(email_lower=email.strip().lower())[:2]
+        )
+        if not users:
+            raise cls.DoesNotExist
+        # Legacy accounts may differ only by case: prefer the exact match
+        for user in users:
+            if user.email == email:
+                return user
+        return users[0]
+    
     @property
     def is_admin(self):
         return self.role == "admin"
@@ -42,3 +60,27 @@ class User(AbstractUser):
     @property
     def is_readonly(self):
         return self.role == "readonly"
+
+
+class RevokedToken(models.Model):
+    """
+    Revoked JWTs, synced into each worker's in-memory revocation store.
+    A row either revokes one token (jti) or every token of a user issued
+    before revoked_at (user). Rows are useless once expires_at has passed.
+    """
+    jti = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, null=True, blank=True, related_name="token_revocations"
+    )
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = "revoked_tokens"
+        verbose_name = "Jeton révoqué"
+        verbose_name_plural = "Jetons révoqués"
+
+    def __str__(self):
+        if self.jti:
+            return f"Jeton {self.jti}"
+        return f"Tous les jetons de {self.user} avant {self.revoked_at.strftime('%Y-%m-%d %H:%M')}"
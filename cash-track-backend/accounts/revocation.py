@@ -0,0 +1,112 @@
+"""
+JWT revocation store.
+
+Each worker keeps the revoked JTIs and per-user cutoffs in memory, so checking
+a token is a dict lookup. The ``revoked_tokens`` table is the shared source of
+truth: revocations are written there and every worker pulls new rows at most
+every REVOCATION_SYNC_INTERVAL seconds (one indexed query, not one per request).
+
+JWT ``iat`` claims are whole seconds, so a user revocation is stored at that
+granularity: it rejects the tokens issued before the second it happened in
+(``iat < int(revoked_at)``). A token issued during that same second, e.g. by
+a login right after a password change, stays valid.
+"""
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from .models import RevokedToken
+
+# Rows are re-read for this long after a sync, so a revocation whose
+# transaction committed late is still picked up
+SYNC_OVERLAP = timedelta(seconds=60)
+
+# Expired rows are deleted by the periodic sync at most this often, in seconds
+PURGE_INTERVAL = 600
+
+
+class RevocationStore:
+    """In-memory view of ``revoked_tokens``, refreshed incrementally"""
+
+    def __init__(self):
+        self._jtis = {}          # jti -> expiry timestamp
+        self._user_cutoffs = {}  # str(user id) -> (revoked_at whole second, expiry timestamp)
+        self._last_sync = None
+        self._next_sync = 0.0
+        self._next_purge = 0.0
+        self._lock = threading.Lock()
+
+    def is_revoked(self, token):
+        """True if the token's jti was revoked or its user was revoked after it was issued"""
+        self._maybe_sync()
+        if token.get(api_settings.JTI_CLAIM) in self._jtis:
+            return True
+        cutoff = self._user_cutoffs.get(str(token.get(api_settings.USER_ID_CLAIM)))
+        return cutoff is not None and token.get("iat", 0) < cutoff[0]
+
+    def revoke_token(self, token):
+        """
+        Revoke a single token until it expires. Returns True if this call
+        revoked it, False if it was already revoked (the unique jti settles
+        concurrent calls, e.g. two refreshes with the same token).
+        """
+        jti = token.get(api_settings.JTI_CLAIM)
+        if not jti:
+            return False
+        expires_at = datetime.fromtimestamp(token["exp"], tz=dt_timezone.utc)
+        _, created = RevokedToken.objects.get_or_create(jti=jti, defaults={"expires_at": expires_at})
+        self._jtis[jti] = expires_at.timestamp()
+        return created
+
+    def revoke_user(self, user_id):
+        """Revoke every token issued to the user so far (deactivation, password change)"""
+        revoked = RevokedToken.objects.create(
+            user_id=user_id,
+            expires_at=timezone.now() + api_settings.REFRESH_TOKEN_LIFETIME,
+        )
+        self._add_user_cutoff(user_id, revoked.revoked_at, revoked.expires_at)
+
+    def sync(self):
+        """Pull revocations written since the last sync and forget expired ones"""
+        with self._lock:
+            now = timezone.now()
+            rows = RevokedToken.objects.filter(expires_at__gt=now)
+            if self._last_sync is not None:
+                rows = rows.filter(revoked_at__gte=self._last_sync - SYNC_OVERLAP)
+            for jti, user_id, revoked_at, expires_at in rows.values_list(
+                "jti", "user_id", "revoked_at", "expires_at"
+            ):
+                if jti:
+                    self._jtis[jti] = expires_at.timestamp()
+                elif user_id:
+                    self._add_user_cutoff(user_id, revoked_at, expires_at)
+            self._last_sync = now
+
+            cutoff = now.timestamp()
+            self._jtis = {jti: exp for jti, exp in self._jtis.items() if exp > cutoff}
+            self._user_cutoffs = {uid: entry for uid, entry in self._user_cutoffs.items() if entry[1] > cutoff}
+            self._next_sync = time.monotonic() + settings.REVOCATION_SYNC_INTERVAL
+            if time.monotonic() >= self._next_purge:
+                self._purge_expired()
+
+    def _maybe_sync(self):
+        if time.monotonic() >= self._next_sync:
+            self.sync()
+
+    def _add_user_cutoff(self, user_id, revoked_at, expires_at):
+        # Token claims carry the user id as a string
+        key = str(user_id)
+        previous = self._user_cutoffs.get(key)
+        entry = (int(revoked_at.timestamp()), expires_at.timestamp())
+        if previous is None or previous[0] < entry[0]:
+            self._user_cutoffs[key] = entry
+
+    def _purge_expired(self):
+        """Keep the table small; runs from the periodic sync, every PURGE_INTERVAL seconds"""
+        RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+        self._next_purge = time.monotonic() + PURGE_INTERVAL
+
+
+revocation_store = RevocationStore()
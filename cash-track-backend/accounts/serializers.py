@@ -1,9 +1,10 @@
 from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
+from cash_track_api.metrics import TimedSerializerMixin
 from .models import User
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for User model"""
     is_superuser = serializers.BooleanField(read_only=True)
     
@@ -13,7 +14,7 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "created_at", "is_superuser"]
 
 
-class UserCreateSerializer(serializers.ModelSerializer):
+class UserCreateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for creating users"""
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
     
@@ -22,10 +23,12 @@ class UserCreateSerializer(serializers.ModelSerializer):
         fields = ["email", "password", "name", "role", "status"]
     
     def validate_email(self, value):
-        """Check if email already exists"""
-        if User.objects.filter(email=value).exists():
-            raise serializers.ValidationError("Un utilisateur avec cet email existe déjà.")
-        return value
+        """Check if email already exists (case-insensitive)"""
+        try:
+            User.get_by_email(value)
+        except User.DoesNotExist:
+            return value
+        raise serializers.ValidationError("Un utilisateur avec cet email existe déjà.")
     
     def create(self, validated_data):
         """Create a new user"""
@@ -51,7 +54,7 @@ class UserCreateSerializer(serializers.ModelSerializer):
         return user
 
 
-class UserUpdateSerializer(serializers.ModelSerializer):
+class UserUpdateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for updating users"""
     
     class Meta:
@@ -59,7 +62,7 @@ class UserUpdateSerializer(serializers.ModelSerializer):
         fields = ["name", "role", "status"]
 
 
-class LoginSerializer(serializers.Serializer):
+class LoginSerializer(TimedSerializerMixin, serializers.Serializer):
     """Serializer for login"""
     email = serializers.EmailField()
     password = serializers.CharField(write_only=True)
@@ -0,0 +1,11 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import User
+from .authentication import invalidate_cached_user
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_cache(sender, instance, **kwargs):
+    """Any change to a user (status, role, password, deletion) drops its cached auth entry"""
+    invalidate_cached_user(instance.pk)
@@ -1,3 +1,198 @@
-from django.test import TestCase
+from datetime import timedelta
+from django.contrib.auth.hashers import get_hasher, identify_hasher, make_password
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from cash_track_api.testing import FIXTURE_SIZES, QueryBudgetTestCase
+from transactions.seeding import ensure_bench_users
+from .authentication import invalidate_cached_user, user_cache_key
+from .models import RevokedToken, User
+from .revocation import revocation_store
 
-# Create your tests here.
+PASSWORD = "Cash-Track-2026!"
+
+
+class AccountsTestCase(APITestCase):
+    """An admin and a user; the in-memory revocation store starts empty"""
+
+    def setUp(self):
+        # Test databases reuse user ids: forget the revocations of earlier tests
+        revocation_store._jtis.clear()
+        revocation_store._user_cutoffs.clear()
+        cache.clear()
+        self.admin = User.objects.create_user("admin", "admin@example.com", PASSWORD, role="admin")
+        self.user = User.objects.create_user("user", "user@example.com", PASSWORD)
+
+    def login(self, email, password=PASSWORD):
+        return self.client.post(reverse("login"), {"email": email, "password": password}, format="json")
+
+    def bearer(self, token):
+        return {"Authorization": f"Bearer {token}"}
+
+    def me(self, token):
+        return self.client.get(reverse("current-user"), headers=self.bearer(token))
+
+    def issued_earlier(self, user):
+        """Access token of ``user`` issued ten seconds ago"""
+        token = AccessToken.for_user(user)
+        token["iat"] -= 10
+        return str(token)
+
+
+class UserQueryBudgetTests(QueryBudgetTestCase):
+    """Query count of the user list must not grow with users or transactions"""
+
+    def test_user_list(self):
+        url = reverse("user-list-create")
+        for size in FIXTURE_SIZES:
+            ensure_bench_users(size)
+            self.grow_ledger(size)
+            with self.subTest(size=size):
+                self.assertQueryBudget(2, "user list", lambda: self.client.get(url))
+
+
+class TokenRevocationTests(AccountsTestCase):
+    """Logout, refresh rotation, password change and deactivation revoke tokens"""
+
+    def test_refresh_rotation_revokes_the_old_token(self):
+        refresh = self.login("user@example.com").data["refresh"]
+        rotated = self.client.post(reverse("refresh"), {"refresh": refresh}, format="json")
+        self.assertEqual(rotated.status_code, 200)
+        self.assertEqual(self.me(rotated.data["access"]).status_code, 200)
+        replayed = self.client.post(reverse("refresh"), {"refresh": refresh}, format="json")
+        self.assertEqual(replayed.status_code, 401)
+        self.assertNotIn("refresh", replayed.data)
+
+    def test_replay_missed_by_the_memory_store_is_refused(self):
+        refresh = RefreshToken.for_user(self.user)
+        self.assertTrue(revocation_store.revoke_token(refresh))
+        # Another worker has not synced the revocation yet: the unique jti still refuses it
+        revocation_store._jtis.clear()
+        replayed = self.client.post(reverse("refresh"), {"refresh": str(refresh)}, format="json")
+        self.assertEqual(replayed.status_code, 401)
+        self.assertFalse(revocation_store.revoke_token(refresh))
+
+    def test_logout_revokes_both_tokens(self):
+        tokens = self.login("user@example.com").data
+        logout = self.client.post(
+            reverse("logout"), {"refresh": tokens["refresh"]}, format="json", headers=self.bearer(tokens["access"])
+        )
+        self.assertEqual(logout.status_code, 200)
+        self.assertEqual(RevokedToken.objects.count(), 2)
+        self.assertEqual(self.me(tokens["access"]).status_code, 401)
+        refreshed = self.client.post(reverse("refresh"), {"refresh": tokens["refresh"]}, format="json")
+        self.assertEqual(refreshed.status_code, 401)
+
+    def test_password_change_revokes_earlier_tokens(self):
+        earlier = self.issued_earlier(self.user)
+        self.assertEqual(self.me(earlier).status_code, 200)
+        changed = self.client.post(
+            reverse("user-change-password", args=[self.user.pk]), {"password": "Nouveau-Mot-2026!"},
+            format="json", headers=self.bearer(AccessToken.for_user(self.admin)),
+        )
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(self.me(earlier).status_code, 401)
+        # Issued in the same second as the revocation: still valid
+        fresh = self.login("user@example.com", "Nouveau-Mot-2026!").data["access"]
+        self.assertEqual(self.me(fresh).status_code, 200)
+
+    def test_deactivation_revokes_earlier_tokens(self):
+        earlier = self.issued_earlier(self.user)
+        toggled = self.client.post(
+            reverse("user-toggle-status", args=[self.user.pk]), headers=self.bearer(AccessToken.for_user(self.admin))
+        )
+        self.assertEqual(toggled.data["status"], "inactive")
+        self.assertEqual(self.me(earlier).status_code, 401)
+
+    def test_sync_pulls_other_workers_revocations_and_purges_expired_rows(self):
+        earlier = self.issued_earlier(self.user)
+        now = timezone.now()
+        # Written by another worker
+        RevokedToken.objects.create(user=self.user, expires_at=now + timedelta(days=1))
+        RevokedToken.objects.create(jti="expired", expires_at=now - timedelta(seconds=1))
+        revocation_store._next_purge = 0.0
+        revocation_store.sync()
+        self.assertEqual(self.me(earlier).status_code, 401)
+        self.assertFalse(RevokedToken.objects.filter(jti="expired").exists())
+
+
+class CachedUserTests(AccountsTestCase):
+    """The JWT user is served from the cache, dropped on change and always checked"""
+
+    def setUp(self):
+        super().setUp()
+        self.token = AccessToken.for_user(self.user)
+
+    def test_user_is_cached_and_invalidated_on_save(self):
+        self.assertEqual(self.me(self.token).status_code, 200)
+        key = user_cache_key(self.user.pk)
+        self.assertEqual(cache.get(key)["email"], "user@example.com")
+        self.user.name = "Renommé"
+        self.user.save()
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(self.me(self.token).data["name"], "Renommé")
+
+    def test_cached_user_status_is_checked(self):
+        self.me(self.token)
+        key = user_cache_key(self.user.pk)
+        cache.set(key, {**cache.get(key), "status": "inactive"})
+        self.assertEqual(self.me(self.token).status_code, 401)
+
+    def test_bulk_update_invalidates_explicitly(self):
+        self.me(self.token)
+        User.objects.filter(pk=self.user.pk).update(is_active=False, status="inactive")
+        # No signal: the entry stays until invalidate_cached_user
+        self.assertEqual(self.me(self.token).status_code, 200)
+        invalidate_cached_user(self.user.pk)
+        self.assertEqual(self.me(self.token).status_code, 401)
+
+    @override_settings(AUTH_USER_CACHE_TIMEOUT=0)
+    def test_status_is_checked_without_cache(self):
+        User.objects.filter(pk=self.user.pk).update(status="inactive")
+        self.assertEqual(self.me(self.token).status_code, 401)
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+
+
+class PasswordLoginTests(AccountsTestCase):
+    """Logins match emails case-insensitively and rehash outdated passwords"""
+
+    def test_email_lookup_ignores_case(self):
+        self.assertEqual(User.get_by_email(" USER@Example.com "), self.user)
+        self.assertEqual(self.login("User@Example.COM").status_code, 200)
+        with self.assertRaises(User.DoesNotExist):
+            User.get_by_email("nobody@example.com")
+
+    def test_exact_email_wins_among_legacy_case_duplicates(self):
+        legacy = User.objects.create_user("legacy", "USER@example.com", PASSWORD)
+        self.assertEqual(User.get_by_email("USER@example.com"), legacy)
+        self.assertEqual(User.get_by_email("user@example.com"), self.user)
+
+    def test_creation_rejects_case_duplicates(self):
+        created = self.client.post(
+            reverse("user-list-create"), {"email": "User@Example.com", "password": PASSWORD, "name": "Doublon"},
+            format="json", headers=self.bearer(AccessToken.for_user(self.admin)),
+        )
+        self.assertEqual(created.status_code, 400)
+        self.assertIn("email", created.data)
+
+    def test_new_passwords_use_the_preferred_hasher(self):
+        preferred = get_hasher()
+        self.assertEqual(identify_hasher(self.user.password).algorithm, preferred.algorithm)
+        self.assertFalse(preferred.must_update(self.user.password))
+
+    def test_login_rehashes_outdated_passwords(self):
+        User.objects.filter(pk=self.user.pk).update(password=make_password(PASSWORD, hasher="pbkdf2_sha1"))
+        self.assertEqual(self.login("user@example.com").status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(identify_hasher(self.user.password).algorithm, get_hasher().algorithm)
+        self.assertTrue(self.user.check_password(PASSWORD))
+
+    def test_wrong_password_keeps_the_hash(self):
+        outdated = make_password(PASSWORD, hasher="pbkdf2_sha1")
+        User.objects.filter(pk=self.user.pk).update(password=outdated)
+        self.assertEqual(self.login("user@example.com", "mauvais").status_code, 401)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.password, outdated)
@@ -3,8 +3,11 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.exceptions import TokenError
 from django.contrib.auth import authenticate
 from .models import User
+from .revocation import revocation_store
 from .serializers import (
     UserSerializer,
     UserCreateSerializer,
@@ -24,9 +27,10 @@ def login_view(request):
         password = serializer.validated_data["password"]
         
         try:
-            user = User.objects.get(email=email)
+            user = User.get_by_email(email)
             
-            # Check password first
+            # Check password first (rehashes transparently if the hasher or
+            # its work factor changed since the password was set)
             if not user.check_password(password):
                 return Response(
                     {"error": "Identifiants invalides"},
@@ -80,11 +84,29 @@ def refresh_token_view(request):
     
     try:
         refresh = RefreshToken(refresh_token)
-        access_token = refresh.access_token
+        if revocation_store.is_revoked(refresh):
+            return Response(
+                {"error": "Token invalide"},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+        
+        data = {"access": str(refresh.access_token)}
+        
+        # Rotate the refresh token; the old one can no longer be used. Only
+        # the request that revokes it gets a new one: a concurrent replay of
+        # the same token finds it already revoked
+        if jwt_settings.ROTATE_REFRESH_TOKENS:
+            if jwt_settings.BLACKLIST_AFTER_ROTATION and not revocation_store.revoke_token(refresh):
+                return Response(
+                    {"error": "Token invalide"},
+                    status=status.HTTP_401_UNAUTHORIZED
+                )
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data["refresh"] = str(refresh)
         
-        return Response({
-            "access": str(access_token),
-        }, status=status.HTTP_200_OK)
+        return Response(data, status=status.HTTP_200_OK)
     except Exception as e:
         return Response(
             {"error": "Token invalide"},
@@ -103,9 +125,17 @@ def current_user_view(request):
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def logout_view(request):
-    """Logout endpoint"""
-    # In a simple JWT setup, we just return success
-    # The client should remove the tokens
+    """Logout endpoint: revoke the access token and, if sent, the refresh token"""
+    if request.auth is not None:
+        revocation_store.revoke_token(request.auth)
+    
+    refresh_token = request.data.get("refresh")
+    if refresh_token:
+        try:
+            revocation_store.revoke_token(RefreshToken(refresh_token))
+        except TokenError:
+            pass
+    
     return Response({"message": "Déconnexion réussie"}, status=status.HTTP_200_OK)
 
 
@@ -143,6 +173,9 @@ def change_user_password_view(request, pk):
         user.set_password(new_password)
         user.save()
         
+        # Tokens issued with the old password stop working
+        revocation_store.revoke_user(user.id)
+        
         return Response(
             {"message": "Mot de passe modifié avec succès"},
             status=status.HTTP_200_OK
@@ -181,6 +214,9 @@ def toggle_user_status_view(request, pk):
         user.is_active = (new_status == "active")
         user.save()
         
+        if new_status == "inactive":
+            revocation_store.revoke_user(user.id)
+        
         return Response(
             {
                 "message": f"Statut de l'utilisateur modifié à {new_status}",
@@ -265,6 +301,12 @@ class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
             )
         return super().update(request, *args, **kwargs)
     
+    def perform_update(self, serializer):
+        was_active = serializer.instance.status == "active"
+        user = serializer.save()
+        if was_active and user.status != "active":
+            revocation_store.revoke_user(user.id)
+    
     def destroy(self, request, *args, **kwargs):
         """Delete user (hard delete) - related fields will be set to null automatically"""
         instance = self.get_object()
@@ -0,0 +1,66 @@
+"""
+Async counterpart of ``@api_view`` for read-only endpoints.
+
+DRF views are synchronous: under ASGI each request is handed to a worker
+thread. Views wrapped with ``async_api_view`` run on the event loop instead and
+await the async ORM (``aaggregate``, ``acount``, ``async for``). Everything
+else is DRF's own ``APIView`` machinery: the request is a DRF ``Request``,
+``initial()`` (content negotiation, authentication, permission and throttle
+classes from the settings) runs in a worker thread, and errors go through the
+configured exception handler, so status codes, headers and bodies match the
+DRF views.
+"""
+from asgiref.sync import sync_to_async
+from django.http import HttpResponseBase
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+
+async def fetch_all(queryset):
+    """Evaluate a queryset with async iteration"""
+    return [row async for row in queryset]
+
+
+class AsyncAPIView(APIView):
+    """APIView whose handlers may be coroutines; ``dispatch`` awaits them"""
+
+    async def dispatch(self, request, *args, **kwargs):
+        # Same steps as APIView.dispatch, with the blocking policy checks in a thread
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if not isinstance(response, HttpResponseBase):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response.render()
+
+
+def async_api_view(view):
+    """
+    Wrap an ``async def view(request, ...)`` returning plain data into a GET
+    endpoint with the default DRF policies, rendered like ``Response(data)``.
+    """
+    async def get(self, request, *args, **kwargs):
+        data = await view(request, *args, **kwargs)
+        return data if isinstance(data, HttpResponseBase) else Response(data)
+
+    WrappedAsyncAPIView = type("WrappedAsyncAPIView", (AsyncAPIView,), {"get": get})
+    # Built like @api_view(["GET"]) builds it, for the same Allow header
+    WrappedAsyncAPIView.http_method_names = [method.lower() for method in set(["GET"]) | {"options"}]
+    WrappedAsyncAPIView.__name__ = view.__name__
+    WrappedAsyncAPIView.__module__ = view.__module__
+    WrappedAsyncAPIView.__doc__ = view.__doc__
+    return WrappedAsyncAPIView.as_view()
@@ -0,0 +1,132 @@
+"""
+Read-replica routing for the heavy read endpoints.
+
+When REPLICA_DATABASE names a database alias (a streaming replica of
+``default``), views decorated with ``reads_from_replica`` and code running
+inside ``replica_reads()`` (report workers, exports) read from it; every
+other read and all writes stay on ``default``.
+
+Read-your-writes: after a successful write request (POST, PUT, PATCH,
+DELETE), ``ReplicaStickinessMiddleware`` pins the user to ``default`` for
+REPLICA_STICKY_SECONDS, longer than the replication lag, so they see their
+own change immediately. The pin lives in the default cache: with several
+workers it must be a shared cache (REDIS_URL).
+"""
+import contextvars
+import functools
+from contextlib import contextmanager
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+
+_replica_reads = contextvars.ContextVar("replica_reads", default=False)
+
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+
+def _sticky_key(user_id):
+    return f"db-sticky:{user_id}"
+
+
+def is_pinned_to_primary(user):
+    """True while ``user`` has a recent write the replica may not have yet"""
+    return bool(user is not None and user.is_authenticated and cache.get(_sticky_key(user.pk)))
+
+
+def pin_to_primary(user):
+    cache.set(_sticky_key(user.pk), True, settings.REPLICA_STICKY_SECONDS)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Send the reads of the enclosed block to the replica, if one is configured"""
+    token = _replica_reads.set(bool(enabled and settings.REPLICA_DATABASE))
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def reads_from_replica(view=None, *, when=None):
+    """
+    Decorate a (sync or async) view, below ``@api_view``/``@async_api_view``,
+    so its reads go to the replica unless the user is pinned to the primary.
+    ``when(request)`` restricts it to some requests (e.g. ``?all=true``).
+    """
+    if view is None:
+        return functools.partial(reads_from_replica, when=when)
+
+    def wanted(request):
+        return when is None or when(request)
+
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            user = request.user
+            pinned = user.is_authenticated and await cache.aget(_sticky_key(user.pk))
+            with replica_reads(wanted(request) and not pinned):
+                return await view(request, *args, **kwargs)
+
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with replica_reads(wanted(request) and not is_pinned_to_primary(request.user)):
+            return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+class ReplicaRouter:
+    """Reads inside ``replica_reads()`` go to REPLICA_DATABASE, everything else to default"""
+
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get():
+            return settings.REPLICA_DATABASE
+        return None
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as default
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica follows the primary's schema through replication
+        if settings.REPLICA_DATABASE and db == settings.REPLICA_DATABASE:
+            return False
+        return None
+
+
+class ReplicaStickinessMiddleware:
+    """Pin the user to the primary after a successful write request"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REPLICA_DATABASE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        response = self.get_response(request)
+        self.process(request, response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        self.process(request, response)
+        return response
+
+    @staticmethod
+    def process(request, response):
+        user = getattr(request, "user", None)
+        if request.method in WRITE_METHODS and response.status_code < 400 and user is not None and user.is_authenticated:
+            pin_to_primary(user)
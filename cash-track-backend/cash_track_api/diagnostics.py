@@ -0,0 +1,346 @@
+"""
+Opt-in SQL diagnostics: slow-query log and N+1 detector.
+
+With QUERY_DIAGNOSTICS, ``QueryDiagnosticsMiddleware`` groups the statements
+of each request by shape (SQL with placeholders, literal numbers and IN lists
+collapsed) and remembers the project stack frames that issued each shape.
+At the end of the request it logs, as one JSON object per line in
+QUERY_DIAGNOSTICS_LOG:
+- ``slow_query``: a statement slower than SLOW_QUERY_MS,
+- ``n_plus_one``: a shape executed NPLUSONE_THRESHOLD times or more, e.g. a
+  per-row aggregate issued from a serializer method.
+
+``top_offenders_view`` (GET /api/diagnostics/queries/, admins only) aggregates
+the log file so the entries of every worker are included.
+
+Views decorated with ``explainable`` answer ``?explain=1`` from an admin with
+their statements, plans and timings instead of their data: EXPLAIN (ANALYZE,
+BUFFERS) on PostgreSQL, EXPLAIN QUERY PLAN on SQLite.
+"""
+import contextvars
+import functools
+import json
+import logging
+import os
+import re
+import sys
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+from accounts.permissions import IsAdminRole
+from .metrics import view_name
+
+logger = logging.getLogger("cash_track_api.diagnostics")
+
+# Project frames recorded per query shape, innermost first
+STACK_DEPTH = 6
+
+_IN_LIST = re.compile(r"\((?:\s*%s\s*,)+\s*%s\s*\)")
+_NUMBER = re.compile(r"\b\d+\b")
+_INTERNAL_FILES = {os.path.abspath(__file__), os.path.join(os.path.dirname(os.path.abspath(__file__)), "metrics.py")}
+
+current_request = contextvars.ContextVar("diagnostics_request", default=None)
+# [(alias, sql, params, seconds)] of the view being explained
+current_explain = contextvars.ContextVar("diagnostics_explain", default=None)
+
+
+def query_shape(sql):
+    """SQL with variable parts collapsed, so repeated queries compare equal"""
+    return _NUMBER.sub("?", _IN_LIST.sub("(%s, ...)", sql))
+
+
+def project_stack():
+    """``path:line in function`` of the innermost project frames of the caller"""
+    root = str(settings.BASE_DIR)
+    frames = []
+    frame = sys._getframe(1)
+    while frame is not None and len(frames) < STACK_DEPTH:
+        filename = frame.f_code.co_filename
+        if filename.startswith(root) and "site-packages" not in filename and filename not in _INTERNAL_FILES:
+            frames.append(f"{os.path.relpath(filename, root)}:{frame.f_lineno} in {frame.f_code.co_name}")
+        frame = frame.f_back
+    return frames
+
+
+class RequestQueries:
+    """Statements of the request being handled, grouped by shape"""
+    __slots__ = ("shapes", "slow")
+
+    def __init__(self):
+        self.shapes = {}  # shape -> {"count", "seconds", "stack"}
+        self.slow = []    # (shape, seconds, stack)
+
+
+def diagnostics_timer(execute, sql, params, many, context):
+    """execute_wrapper recording shape, duration and origin of each statement"""
+    state = current_request.get()
+    if state is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        seconds = time.perf_counter() - start
+        shape = query_shape(sql)
+        entry = state.shapes.get(shape)
+        if entry is None:
+            entry = state.shapes[shape] = {"count": 0, "seconds": 0.0, "stack": project_stack()}
+        entry["count"] += 1
+        entry["seconds"] += seconds
+        if seconds * 1000 >= settings.SLOW_QUERY_MS:
+            state.slow.append((shape, seconds, project_stack()))
+
+
+def explain_recorder(execute, sql, params, many, context):
+    """execute_wrapper recording the statements of an explained view"""
+    statements = current_explain.get()
+    if statements is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        statements.append((context["connection"].alias, sql, params, time.perf_counter() - start))
+
+
+def _add_diagnostics_timer(sender, connection, **kwargs):
+    for wrapper in (diagnostics_timer, explain_recorder):
+        if wrapper not in connection.execute_wrappers:
+            connection.execute_wrappers.append(wrapper)
+
+
+_installed = False
+
+
+def install():
+    """Hook the statement recorders on every connection (once per process)"""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    connection_created.connect(_add_diagnostics_timer, dispatch_uid="diagnostics_timer")
+    for connection in connections.all(initialized_only=True):
+        _add_diagnostics_timer(None, connection)
+
+
+def report(request, state):
+    """Log the slow statements and repeated shapes of a finished request"""
+    base = {
+        "time": timezone.now().isoformat(),
+        "view": view_name(request),
+        "method": request.method,
+        "path": request.path,
+    }
+    for shape, seconds, stack in state.slow:
+        logger.warning(json.dumps({
+            **base,
+            "type": "slow_query",
+            "sql": shape,
+            "duration_ms": round(seconds * 1000, 3),
+            "stack": stack,
+        }))
+    for shape, entry in state.shapes.items():
+        if entry["count"] >= settings.NPLUSONE_THRESHOLD:
+            logger.warning(json.dumps({
+                **base,
+                "type": "n_plus_one",
+                "sql": shape,
+                "count": entry["count"],
+                "duration_ms": round(entry["seconds"] * 1000, 3),
+                "stack": entry["stack"],
+            }))
+
+
+class QueryDiagnosticsMiddleware:
+    """Log slow queries and N+1 patterns of each request"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.QUERY_DIAGNOSTICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        install()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        state = RequestQueries()
+        token = current_request.set(state)
+        try:
+            return self.get_response(request)
+        finally:
+            current_request.reset(token)
+            report(request, state)
+
+    async def __acall__(self, request):
+        state = RequestQueries()
+        token = current_request.set(state)
+        try:
+            return await self.get_response(request)
+        finally:
+            current_request.reset(token)
+            report(request, state)
+
+
+def explain_statement(alias, sql, params):
+    """Plan lines of a statement, run again on the database it was sent to"""
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + sql, params)
+            return [row[0] for row in cursor.fetchall()]
+        if connection.vendor == "sqlite":
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            depths, lines = {0: -1}, []
+            for node, parent, _, detail in cursor.fetchall():
+                depths[node] = depths.get(parent, -1) + 1
+                lines.append("  " * depths[node] + detail)
+            return lines
+    return []
+
+
+def explain_report(statements, seconds):
+    """``?explain=1`` payload: every statement with its timing, and the plan of the reads"""
+    queries = []
+    for alias, sql, params, duration in statements:
+        entry = {
+            "database": alias,
+            "sql": sql,
+            "params": list(params or []),
+            "duration_ms": round(duration * 1000, 3),
+        }
+        if sql.lstrip()[:6].upper() in ("SELECT", "WITH"):
+            entry["plan"] = explain_statement(alias, sql, params)
+        queries.append(entry)
+    return {
+        "duration_ms": round(seconds * 1000, 3),
+        "sql_ms": round(sum(duration for *_, duration in statements) * 1000, 3),
+        "query_count": len(queries),
+        "queries": queries,
+    }
+
+
+def wants_explain(request):
+    """True for ``?explain=1``, which only admins may ask for"""
+    if request.query_params.get("explain", "").lower() not in ("1", "true"):
+        return False
+    if not IsAdminRole().has_permission(request, None):
+        raise exceptions.PermissionDenied()
+    install()
+    return True
+
+
+def explainable(view):
+    """
+    Decorate a read view (below ``@api_view`` / ``@async_api_view``, or a
+    ``list`` method through ``method_decorator``) so ``?explain=1`` from an
+    admin runs it, then returns ``explain_report`` instead of its data.
+    """
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            if not wants_explain(request):
+                return await view(request, *args, **kwargs)
+            statements = []
+            token = current_explain.set(statements)
+            start = time.perf_counter()
+            try:
+                await view(request, *args, **kwargs)
+            finally:
+                current_explain.reset(token)
+            return await sync_to_async(explain_report)(statements, time.perf_counter() - start)
+
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not wants_explain(request):
+            return view(request, *args, **kwargs)
+        statements = []
+        token = current_explain.set(statements)
+        start = time.perf_counter()
+        try:
+            view(request, *args, **kwargs)
+        finally:
+            current_explain.reset(token)
+        return Response(explain_report(statements, time.perf_counter() - start))
+
+    return wrapper
+
+
+def read_events(path):
+    """Events of the current log file (rotated files are not read)"""
+    try:
+        with open(path) as source:
+            for line in source:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        return
+
+
+def top_offenders(events, limit=20, event_type=None):
+    """Group events by type, SQL shape and issuing frame, worst total time first"""
+    groups = {}
+    for event in events:
+        if event_type and event["type"] != event_type:
+            continue
+        location = event["stack"][0] if event["stack"] else None
+        key = (event["type"], event["sql"], location)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {
+                "type": event["type"],
+                "sql": event["sql"],
+                "location": location,
+                "stack": event["stack"],
+                "views": [],
+                "occurrences": 0,
+                "queries": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "last_seen": None,
+            }
+        group["occurrences"] += 1
+        group["queries"] += event.get("count", 1)
+        group["total_ms"] += event["duration_ms"]
+        group["max_ms"] = max(group["max_ms"], event["duration_ms"])
+        group["last_seen"] = event["time"]
+        if event["view"] not in group["views"]:
+            group["views"].append(event["view"])
+
+    results = sorted(groups.values(), key=lambda group: group["total_ms"], reverse=True)[:limit]
+    for group in results:
+        group["total_ms"] = round(group["total_ms"], 3)
+    return results
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminRole])
+def top_offenders_view(request):
+    """Top slow queries / N+1 patterns from the diagnostics log (admin only)"""
+    try:
+        limit = int(request.query_params.get("limit", 20))
+    except ValueError:
+        limit = 20
+    event_type = request.query_params.get("type")
+    results = top_offenders(read_events(settings.QUERY_DIAGNOSTICS_LOG), limit, event_type)
+    return Response({
+        "slow_query_ms": settings.SLOW_QUERY_MS,
+        "n_plus_one_threshold": settings.NPLUSONE_THRESHOLD,
+        "count": len(results),
+        "results": results,
+    })
@@ -0,0 +1,165 @@
+"""
+Production server: pre-forked gunicorn workers serving the WSGI or ASGI
+application, preloaded and warmed up in the master process.
+
+Before forking, the command
+- applies migrations only when some are pending (one query on
+  ``django_migrations`` when the schema is current),
+- with --init-data, creates the default users and categories (--setup-only
+  stops there, for start.sh before runserver),
+- loads the application (settings, URLconf, views, serializers),
+- warms the in-process caches the workers inherit (compiled fast-path
+  converters, JWT revocation list) and the database cache for the hot
+  tables (categories, totals),
+- closes its database and cache connections so no socket is shared.
+
+Each worker then connects to the database (and fills its connection pool
+with DB_POOL) before accepting requests, so connection setup is not paid by
+the first requests.
+"""
+import os
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Q, Sum
+from django.urls import get_resolver
+from cash_track_api.metrics import reset_metrics_dir
+
+WORKER_CLASSES = {
+    "wsgi": "sync",
+    "asgi": "uvicorn_worker.UvicornWorker",
+}
+
+
+def connect_worker(worker):
+    """gunicorn post_worker_init hook: open the worker's database connections"""
+    for connection in connections.all():
+        connection.ensure_connection()
+        # A pooled connection goes back to the pool, a persistent one serves the first request
+        if getattr(connection, "pool", None):
+            connection.close()
+
+
+class Command(BaseCommand):
+    help = "Run the API with pre-forked, preloaded and warmed-up gunicorn workers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bind", default="0.0.0.0:8000", help="Address to listen on")
+        parser.add_argument("--mode", choices=WORKER_CLASSES, default=settings.SERVER_MODE, help="WSGI or ASGI workers")
+        parser.add_argument("--workers", type=int, default=settings.WEB_WORKERS, help="Worker processes (0 = auto)")
+        parser.add_argument("--timeout", type=int, default=30, help="Seconds before a silent worker is restarted")
+        parser.add_argument("--no-migrate", action="store_true", help="Do not check or apply migrations")
+        parser.add_argument("--init-data", action="store_true", help="Create the default users and categories if missing")
+        parser.add_argument("--no-warmup", action="store_true", help="Skip the cache warm-up")
+        parser.add_argument("--warmup-only", action="store_true", help="Migrate, load and warm up, then exit")
+        parser.add_argument("--setup-only", action="store_true", help="Only migrate (if needed) and --init-data, then exit")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        if not options["no_migrate"]:
+            self.step("migrations", self.migrate_if_needed)
+        if options["init_data"]:
+            self.step("initial data", self.init_data)
+        if options["setup_only"]:
+            return
+        application = self.step("application", lambda: self.load_application(options["mode"]))
+        if not options["no_warmup"]:
+            self.step("warm-up", self.warm_up)
+
+        # Workers open their own connections (and pools) after the fork
+        connections.close_all()
+        for connection in connections.all():
+            if getattr(connection, "pool", None):
+                connection.close_pool()
+        caches.close_all()
+        reset_metrics_dir()
+
+        self.stdout.write(f"Ready in {(time.perf_counter() - started) * 1000:.0f} ms")
+        if options["warmup_only"]:
+            return
+
+        workers = options["workers"] or self.default_workers(options["mode"])
+        self.stdout.write(f"Serving {options['mode'].upper()} on {options['bind']} with {workers} workers")
+        self.run_server(application, {
+            "bind": options["bind"],
+            "workers": workers,
+            "worker_class": WORKER_CLASSES[options["mode"]],
+            "timeout": options["timeout"],
+            "preload_app": True,
+            "accesslog": "-",
+            **({} if options["no_warmup"] else {"post_worker_init": connect_worker}),
+        })
+
+    def step(self, name, func):
+        start = time.perf_counter()
+        result = func()
+        self.stdout.write(f"  {name}: {(time.perf_counter() - start) * 1000:.0f} ms")
+        return result
+
+    def migrate_if_needed(self):
+        """Run migrate only if the migration graph has unapplied nodes"""
+        executor = MigrationExecutor(connections[DEFAULT_DB_ALIAS])
+        if executor.migration_plan(executor.loader.graph.leaf_nodes()):
+            call_command("migrate", interactive=False, verbosity=1)
+
+    @staticmethod
+    def init_data():
+        from manage_data import create_initial_data
+        create_initial_data()
+
+    @staticmethod
+    def load_application(mode):
+        if mode == "asgi":
+            from django.core.asgi import get_asgi_application
+            application = get_asgi_application()
+        else:
+            from django.core.wsgi import get_wsgi_application
+            application = get_wsgi_application()
+        # Import every view module and build the URL patterns now, not on the first request
+        get_resolver().reverse_dict
+        return application
+
+    @staticmethod
+    def warm_up():
+        from accounts.revocation import revocation_store
+        from categories.models import Category
+        from transactions import fastpath
+        from transactions.models import CashBox, Transaction
+
+        fastpath.compile_converters()
+        revocation_store.sync()
+        # Read the hot tables once so their pages are in the database cache
+        list(Category.objects.all())
+        list(CashBox.objects.select_related("balance"))
+        Transaction.objects.aggregate(
+            recettes=Sum("amount", filter=Q(type="recette")),
+            depenses=Sum("amount", filter=Q(type="depense")),
+        )
+
+    @staticmethod
+    def default_workers(mode):
+        cpus = os.cpu_count() or 1
+        # Sync workers block on I/O, async workers don't
+        return cpus if mode == "asgi" else 2 * cpus + 1
+
+    @staticmethod
+    def run_server(application, config):
+        try:
+            from gunicorn.app.base import BaseApplication
+        except ImportError:
+            raise CommandError("gunicorn n'est pas installé (pip install -r requirements.txt)")
+
+        class Server(BaseApplication):
+            def load_config(self):
+                for key, value in config.items():
+                    self.cfg.set(key, value)
+
+            def load(self):
+                return application
+
+        Server().run()
@@ -0,0 +1,457 @@
+"""
+Per-request performance metrics exposed in Prometheus text format.
+
+With METRICS_ENABLED, ``MetricsMiddleware`` records for each resolved URL name
+(and method) the request latency, the number and duration of SQL queries, the
+time spent serializing the response data and the response size, and
+``metrics_view`` serves them at /api/metrics to admins or to the bearer of
+METRICS_TOKEN. When disabled, the middleware removes itself
+(MiddlewareNotUsed) and nothing is wrapped.
+
+Serializer time covers building the response data and encoding it: the
+project's serializers (``TimedSerializerMixin``, ``to_representation``), the
+JSON and MessagePack renderers and the transactions fast path
+(``timed_serialization``).
+
+SQL statements are timed by a wrapper added to ``connection.execute_wrappers``
+of every database connection; the per-request totals live in a context
+variable, so queries issued by async views (on another thread) are counted too.
+
+Each process keeps its own counters. With pre-forked workers, set METRICS_DIR
+to a directory shared by the workers: each one writes a snapshot there every
+METRICS_FLUSH_INTERVAL seconds and /api/metrics returns the sum of all of them.
+The counters of a worker that has exited still count; its gauges (pool
+connections in use, requests waiting...) do not.
+
+Database connections are reported per alias: connections opened and, with the
+psycopg pool (DB_POOL), connections in use and idle, requests waiting and the
+time spent waiting for a connection.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework import exceptions
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.request import Request
+
+PREFIX = "cashtrack"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class RequestState:
+    """SQL and serializer totals of the request being handled"""
+    __slots__ = ("queries", "sql_seconds", "serializer_seconds", "serializer_depth")
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.serializer_depth = 0
+
+
+current_request = contextvars.ContextVar("metrics_request", default=None)
+
+
+def _new_histogram(buckets):
+    # One count per bucket plus +Inf, then sum and count
+    return {"counts": [0] * (len(buckets) + 1), "sum": 0.0, "count": 0}
+
+
+def _observe(histogram, buckets, value):
+    index = 0
+    while index < len(buckets) and value > buckets[index]:
+        index += 1
+    histogram["counts"][index] += 1
+    histogram["sum"] += value
+    histogram["count"] += 1
+
+
+def _new_entry():
+    return {
+        "responses": {},
+        "latency": _new_histogram(LATENCY_BUCKETS),
+        "queries": _new_histogram(QUERY_BUCKETS),
+        "sql_seconds": 0.0,
+        "serializer_seconds": 0.0,
+        "size": _new_histogram(SIZE_BUCKETS),
+    }
+
+
+class Registry:
+    """Metrics of this process, keyed by "view name\\tmethod" (JSON-friendly)"""
+
+    def __init__(self):
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._next_flush = 0.0
+
+    def record(self, view, method, status, seconds, state, size):
+        with self._lock:
+            entry = self.entries.get(f"{view}\t{method}")
+            if entry is None:
+                entry = self.entries[f"{view}\t{method}"] = _new_entry()
+            entry["responses"][str(status)] = entry["responses"].get(str(status), 0) + 1
+            _observe(entry["latency"], LATENCY_BUCKETS, seconds)
+            _observe(entry["queries"], QUERY_BUCKETS, state.queries)
+            entry["sql_seconds"] += state.sql_seconds
+            entry["serializer_seconds"] += state.serializer_seconds
+            _observe(entry["size"], SIZE_BUCKETS, size)
+        if settings.METRICS_DIR and time.monotonic() >= self._next_flush:
+            self.flush()
+
+    def snapshot(self):
+        with self._lock:
+            return {"views": json.loads(json.dumps(self.entries)), "database": database_stats()}
+
+    def flush(self):
+        """Write this process's snapshot to METRICS_DIR (atomically)"""
+        self._next_flush = time.monotonic() + settings.METRICS_FLUSH_INTERVAL
+        path = os.path.join(settings.METRICS_DIR, f"{os.getpid()}.json")
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        with open(f"{path}.tmp", "w") as output:
+            json.dump(self.snapshot(), output)
+        os.replace(f"{path}.tmp", path)
+
+    def collect(self):
+        """Snapshot of every worker summed when METRICS_DIR is set, else of this process"""
+        if not settings.METRICS_DIR:
+            return self.snapshot()
+        self.flush()
+        merged = {"views": {}, "database": {}}
+        for name in os.listdir(settings.METRICS_DIR):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(settings.METRICS_DIR, name)) as source:
+                    snapshot = json.load(source)
+            except (OSError, ValueError):
+                continue
+            alive = _is_alive(name[:-len(".json")])
+            for key, entry in snapshot["views"].items():
+                _merge(merged["views"].setdefault(key, _new_entry()), entry)
+            # Counters of each worker's connections add up, gauges only for live workers
+            for alias, stats in snapshot["database"].items():
+                target = merged["database"].setdefault(alias, {})
+                for stat, value in stats.items():
+                    if alive or stat not in GAUGE_STATS:
+                        target[stat] = target.get(stat, 0) + value
+        return merged
+
+
+def _is_alive(pid):
+    """Whether the worker that wrote ``<pid>.json`` is still running"""
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (ValueError, PermissionError):
+        # Not a pid, or a process of another user
+        return True
+    return True
+
+
+def _merge(target, entry):
+    for status, count in entry["responses"].items():
+        target["responses"][status] = target["responses"].get(status, 0) + count
+    for name in ("latency", "queries", "size"):
+        target[name]["counts"] = [a + b for a, b in zip(target[name]["counts"], entry[name]["counts"])]
+        target[name]["sum"] += entry[name]["sum"]
+        target[name]["count"] += entry[name]["count"]
+    target["sql_seconds"] += entry["sql_seconds"]
+    target["serializer_seconds"] += entry["serializer_seconds"]
+
+
+registry = Registry()
+
+
+def reset_metrics_dir():
+    """Remove the snapshots of a previous run (called by ``manage.py serve`` before forking)"""
+    if settings.METRICS_ENABLED and settings.METRICS_DIR and os.path.isdir(settings.METRICS_DIR):
+        for name in os.listdir(settings.METRICS_DIR):
+            if name.endswith(".json"):
+                os.remove(os.path.join(settings.METRICS_DIR, name))
+
+
+# SQL timing
+
+def sql_timer(execute, sql, params, many, context):
+    """execute_wrapper counting and timing the statements of the current request"""
+    state = current_request.get()
+    if state is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        state.queries += 1
+        state.sql_seconds += time.perf_counter() - start
+
+
+def _add_sql_timer(sender, connection, **kwargs):
+    if sql_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sql_timer)
+
+
+# Database connections
+
+_connections_opened = {}
+
+
+def _count_connection(sender, connection, **kwargs):
+    _connections_opened[connection.alias] = _connections_opened.get(connection.alias, 0) + 1
+
+
+def database_stats():
+    """Connection figures of this process per database alias"""
+    stats = {}
+    for alias in connections:
+        pool_options = connections.settings[alias].get("OPTIONS", {}).get("pool")
+        if not pool_options:
+            stats[alias] = {"connections_opened": _connections_opened.get(alias, 0)}
+            continue
+        pool = connections[alias].pool
+        # psycopg_pool only reports the counters that are not zero
+        pool_stats = pool.get_stats()
+        stats[alias] = {
+            "connections_opened": pool_stats.get("connections_num", 0),
+            "connection_setup_seconds": pool_stats.get("connections_ms", 0) / 1000,
+            "pool_max": pool_stats.get("pool_max", 0),
+            "pool_in_use": pool_stats.get("pool_size", 0) - pool_stats.get("pool_available", 0),
+            "pool_idle": pool_stats.get("pool_available", 0),
+            "pool_waiting": pool_stats.get("requests_waiting", 0),
+            "pool_requests": pool_stats.get("requests_num", 0),
+            "pool_wait_seconds": pool_stats.get("requests_wait_ms", 0) / 1000,
+            "pool_timeouts": pool_stats.get("requests_errors", 0),
+        }
+    return stats
+
+
+# Serializer timing
+
+def _timed(func, *args, **kwargs):
+    """Call ``func``, adding its duration to the current request's serializer time"""
+    state = current_request.get()
+    if state is None or state.serializer_depth:
+        return func(*args, **kwargs)
+    state.serializer_depth += 1
+    start = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        state.serializer_seconds += time.perf_counter() - start
+        state.serializer_depth -= 1
+
+
+def timed_serialization(func):
+    """
+    Count the time spent in ``func`` as serializer time (no-op when metrics
+    are disabled); nested timed calls are counted once, by the outermost one.
+    """
+    if not settings.METRICS_ENABLED:
+        return func
+
+    def wrapper(*args, **kwargs):
+        return _timed(func, *args, **kwargs)
+
+    wrapper.__wrapped__ = func
+    return wrapper
+
+
+class TimedSerializerMixin:
+    """
+    Serializer mixin counting ``to_representation`` as serializer time, so
+    ``serializer.data`` is timed in every view that uses the serializer.
+    Outside a measured request it only costs a context variable lookup.
+    """
+
+    def to_representation(self, instance):
+        return _timed(super().to_representation, instance)
+
+
+_installed = False
+
+
+def install():
+    """Hook the SQL timer (once per process)"""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    connection_created.connect(_add_sql_timer, dispatch_uid="metrics_sql_timer")
+    connection_created.connect(_count_connection, dispatch_uid="metrics_connection_count")
+    for connection in connections.all(initialized_only=True):
+        _add_sql_timer(None, connection)
+
+
+# Middleware and endpoint
+
+def view_name(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unresolved"
+    return match.view_name or match._func_path
+
+
+class MetricsMiddleware:
+    """Record latency, SQL and serializer time and response size per URL name"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        install()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        state = RequestState()
+        token = current_request.set(state)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.record(request, response, time.perf_counter() - start, state)
+        return response
+
+    async def __acall__(self, request):
+        state = RequestState()
+        token = current_request.set(state)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.record(request, response, time.perf_counter() - start, state)
+        return response
+
+    @staticmethod
+    def record(request, response, seconds, state):
+        size = 0 if response.streaming else len(response.content)
+        registry.record(view_name(request), request.method, response.status_code, seconds, state, size)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _histogram_lines(name, buckets, histogram, labels):
+    lines = []
+    cumulative = 0
+    for bound, count in zip(list(buckets) + ["+Inf"], histogram["counts"]):
+        cumulative += count
+        lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {cumulative}")
+    lines.append(f"{name}_sum{_labels(**labels)} {histogram['sum']}")
+    lines.append(f"{name}_count{_labels(**labels)} {histogram['count']}")
+    return lines
+
+
+# (stat, metric, type, help) of the database figures
+DATABASE_FAMILIES = [
+    ("connections_opened", "db_connections_opened_total", "counter", "Database connections opened"),
+    ("connection_setup_seconds", "db_connection_setup_seconds_total", "counter", "Time spent opening pooled connections"),
+    ("pool_max", "db_pool_max_connections", "gauge", "Maximum size of the connection pools"),
+    ("pool_in_use", "db_pool_connections_in_use", "gauge", "Pooled connections lent to requests"),
+    ("pool_idle", "db_pool_connections_idle", "gauge", "Pooled connections available"),
+    ("pool_waiting", "db_pool_requests_waiting", "gauge", "Requests waiting for a pooled connection"),
+    ("pool_requests", "db_pool_requests_total", "counter", "Connections requested from the pools"),
+    ("pool_wait_seconds", "db_pool_wait_seconds_total", "counter", "Time spent waiting for a pooled connection"),
+    ("pool_timeouts", "db_pool_timeouts_total", "counter", "Connection requests that failed or timed out"),
+]
+
+# Figures that describe a live worker, dropped once it has exited
+GAUGE_STATS = {stat for stat, _, kind, _ in DATABASE_FAMILIES if kind == "gauge"}
+
+
+def render_prometheus(snapshot):
+    """Prometheus text exposition (version 0.0.4) of a collected snapshot"""
+    entries = snapshot["views"]
+    families = {
+        "http_requests_total": ("counter", "Responses by view, method and status", []),
+        "http_request_duration_seconds": ("histogram", "Request latency by view", []),
+        "http_request_sql_queries": ("histogram", "SQL queries per request by view", []),
+        "http_request_sql_duration_seconds_total": ("counter", "Time spent in SQL by view", []),
+        "http_request_serializer_duration_seconds_total": ("counter", "Time spent serializing and rendering response data by view", []),
+        "http_response_size_bytes": ("histogram", "Response body size by view", []),
+    }
+    for key in sorted(entries):
+        entry = entries[key]
+        view, method = key.split("\t")
+        labels = {"view": view, "method": method}
+        for status in sorted(entry["responses"]):
+            families["http_requests_total"][2].append(
+                f"{PREFIX}_http_requests_total{_labels(**labels, status=status)} {entry['responses'][status]}"
+            )
+        families["http_request_duration_seconds"][2].extend(
+            _histogram_lines(f"{PREFIX}_http_request_duration_seconds", LATENCY_BUCKETS, entry["latency"], labels)
+        )
+        families["http_request_sql_queries"][2].extend(
+            _histogram_lines(f"{PREFIX}_http_request_sql_queries", QUERY_BUCKETS, entry["queries"], labels)
+        )
+        families["http_request_sql_duration_seconds_total"][2].append(
+            f"{PREFIX}_http_request_sql_duration_seconds_total{_labels(**labels)} {entry['sql_seconds']}"
+        )
+        families["http_request_serializer_duration_seconds_total"][2].append(
+            f"{PREFIX}_http_request_serializer_duration_seconds_total{_labels(**labels)} {entry['serializer_seconds']}"
+        )
+        families["http_response_size_bytes"][2].extend(
+            _histogram_lines(f"{PREFIX}_http_response_size_bytes", SIZE_BUCKETS, entry["size"], labels)
+        )
+
+    for stat, name, kind, help_text in DATABASE_FAMILIES:
+        samples = [
+            f"{PREFIX}_{name}{_labels(alias=alias)} {stats[stat]}"
+            for alias, stats in sorted(snapshot["database"].items())
+            if stat in stats
+        ]
+        if samples:
+            families[name] = (kind, help_text, samples)
+
+    lines = []
+    for name, (kind, help_text, samples) in families.items():
+        lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+def can_scrape(request):
+    """The bearer of METRICS_TOKEN, or an admin (``IsAdminRole``, by session or JWT)"""
+    if settings.METRICS_TOKEN and request.headers.get("Authorization") == f"Bearer {settings.METRICS_TOKEN}":
+        return True
+    from accounts.authentication import CachedJWTAuthentication
+    from accounts.permissions import IsAdminRole
+    request = Request(request, authenticators=[SessionAuthentication(), CachedJWTAuthentication()])
+    try:
+        return bool(IsAdminRole().has_permission(request, None))
+    except exceptions.AuthenticationFailed:
+        return False
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint (GET /api/metrics)"""
+    if not can_scrape(request):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        render_prometheus(registry.collect()),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
@@ -0,0 +1,118 @@
+"""
+Query-plan checks (PostgreSQL): the key read endpoints must not fall back
+to sequential scans of the ledger tables.
+
+``endpoint_plans`` calls an endpoint, captures its statements and EXPLAINs
+each one. ``sequential_scans`` reports the ``Seq Scan`` nodes on the ledger
+tables (partitions included) that an index should have avoided:
+- any of them in a statement with a LIMIT (a page is read in index order),
+- otherwise those expected to return less than SELECTIVE_FRACTION of the
+  table: reading most of it (an unfiltered count, the balance before a
+  page) is cheapest as a sequential scan.
+Tables (or partitions) under MIN_TABLE_ROWS rows are read whole anyway.
+
+The statistics decide which plan is picked, so the checks only mean
+something on a large, ANALYZEd dataset: ``QueryPlanTests`` seeds one, and
+``manage.py check_query_plans`` runs them on the current database (e.g.
+after ``seed_bench``).
+"""
+import json
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+LEDGER_TABLES = ("transactions", "transaction_history")
+SELECTIVE_FRACTION = 0.1
+MIN_TABLE_ROWS = 1000
+
+
+def key_requests(category_name, user_id, transaction_id):
+    """(name, url, params) of the endpoint calls to check, filters taken from existing rows"""
+    list_url = reverse("transaction-list-create")
+    history_url = reverse("transaction-history")
+    recent = (timezone.localdate() - timezone.timedelta(days=7)).isoformat()
+    return [
+        ("list", list_url, {}),
+        ("list by type", list_url, {"type": "depense"}),
+        ("list by category", list_url, {"category": category_name}),
+        ("list by amount", list_url, {"amount_min": 400000, "amount_max": 450000}),
+        ("list by creation date", list_url, {"date_from": recent}),
+        ("list by update date", list_url, {"updated_at_from": recent}),
+        ("dashboard stats", reverse("dashboard-stats"), {}),
+        ("analytics", reverse("transaction-analytics"), {}),
+        ("history", history_url, {}),
+        ("history of a transaction", history_url, {"transaction_id": transaction_id}),
+        ("history by action", history_url, {"action": "deleted"}),
+        ("history by user", history_url, {"user_id": user_id}),
+        ("history by date", history_url, {"date_from": recent}),
+    ]
+
+
+def explain(sql):
+    """JSON plan (top node) of a captured statement"""
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+
+def plan_nodes(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def _table_rows(relation):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)", [relation])
+        row = cursor.fetchone()
+    return max(row[0], 0) if row else 0
+
+
+def is_ledger_table(relation):
+    return any(relation == table or relation.startswith(table + "_") for table in LEDGER_TABLES)
+
+
+def sequential_scans(plan):
+    """[(relation, estimated rows)] of the avoidable ledger seq scans of a plan (see module docstring)"""
+    nodes = list(plan_nodes(plan))
+    paged = any(node["Node Type"] == "Limit" for node in nodes)
+    found = []
+    for node in nodes:
+        relation = node.get("Relation Name", "")
+        if node["Node Type"] != "Seq Scan" or not is_ledger_table(relation):
+            continue
+        table_rows = _table_rows(relation)
+        if table_rows < MIN_TABLE_ROWS:
+            continue
+        if paged or node["Plan Rows"] < SELECTIVE_FRACTION * table_rows:
+            found.append((relation, node["Plan Rows"]))
+    return found
+
+
+def endpoint_plans(client, url, params):
+    """Call the endpoint and return (status, [(sql, plan)]) of its SELECT statements"""
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(url, params)
+    plans = [
+        (query["sql"], explain(query["sql"]))
+        for query in context.captured_queries
+        if query["sql"].lstrip().upper().startswith("SELECT")
+    ]
+    return response.status_code, plans
+
+
+def format_plan(node, depth=0):
+    """Indented one-line-per-node rendering of a JSON plan"""
+    label = node["Node Type"]
+    if node.get("Relation Name"):
+        label += f" on {node['Relation Name']}"
+    if node.get("Index Name"):
+        label += f" using {node['Index Name']}"
+    lines = [f"{'  ' * depth}{label} (rows={node['Plan Rows']})"]
+    for child in node.get("Plans", []):
+        lines.extend(format_plan(child, depth + 1))
+    return lines
@@ -0,0 +1,71 @@
+"""
+Fast renderers and parsers for the API.
+
+- ORJSONRenderer / ORJSONParser: drop-in replacements for DRF's JSON classes
+  backed by orjson. Types orjson does not handle natively (Decimal, datetime,
+  lazy strings...) go through DRF's own encoder so the output is unchanged.
+- MessagePackRenderer: opt-in binary responses, picked with
+  ``Accept: application/msgpack`` (or ``?format=msgpack``).
+"""
+import msgpack
+import orjson
+from rest_framework import renderers, parsers
+from rest_framework.exceptions import ParseError
+from rest_framework.utils import encoders
+from .metrics import timed_serialization
+
+_encoder = encoders.JSONEncoder()
+
+# Keep datetimes out of orjson's native path so they render exactly like DRF
+# (isoformat with "Z" for UTC), and accept non-str dict keys like json.dumps
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+def encode_default(obj):
+    """Fallback for types the fast encoders don't handle natively"""
+    return _encoder.default(obj)
+
+
+class ORJSONRenderer(renderers.JSONRenderer):
+    """JSONRenderer producing the same bytes through orjson"""
+
+    @timed_serialization
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        renderer_context = renderer_context or {}
+        option = ORJSON_OPTIONS
+        if self.get_indent(accepted_media_type, renderer_context):
+            option |= orjson.OPT_INDENT_2
+
+        ret = orjson.dumps(data, default=encode_default, option=option)
+        # Same JavaScript-safe escaping as JSONRenderer
+        if b"\xe2\x80\xa8" in ret or b"\xe2\x80\xa9" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+        return ret
+
+
+class ORJSONParser(parsers.JSONParser):
+    """JSONParser backed by orjson"""
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError("JSON parse error - %s" % str(exc))
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    """Render responses as MessagePack (opt-in through the Accept header)"""
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    @timed_serialization
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=encode_default, use_bin_type=True)
@@ -4,7 +4,9 @@ Django settings for cash_track_api project.
 
 from pathlib import Path
 from datetime import timedelta
+import copy
 import os
+from corsheaders.defaults import default_headers
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -35,12 +37,19 @@ INSTALLED_APPS = [
     "rest_framework_simplejwt",
     "corsheaders",
     # Local apps
+    "cash_track_api",
     "accounts",
     "categories",
     "transactions",
 ]
 
 MIDDLEWARE = [
+    # Removes itself unless METRICS_ENABLED
+    "cash_track_api.metrics.MetricsMiddleware",
+    # Removes itself unless QUERY_DIAGNOSTICS
+    "cash_track_api.diagnostics.QueryDiagnosticsMiddleware",
+    # Removes itself unless a read replica is configured
+    "cash_track_api.db_router.ReplicaStickinessMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -84,6 +93,28 @@ if os.getenv("DB_ENGINE") == "postgresql" or os.getenv("POSTGRES_DB"):
             "PORT": os.getenv("POSTGRES_PORT", "5432"),
         }
     }
+    # Connection reuse. DB_POOL=True: psycopg connection pool shared by the
+    # threads of each worker (DB_POOL_MIN_SIZE connections opened up front,
+    # at most DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT seconds to wait for one).
+    # Otherwise: persistent connections kept DB_CONN_MAX_AGE seconds and
+    # checked before reuse.
+    if os.getenv("DB_POOL", "False") == "True":
+        DATABASES["default"]["OPTIONS"] = {
+            "pool": {
+                "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+                "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+                "timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),
+            },
+        }
+    else:
+        DATABASES["default"]["CONN_MAX_AGE"] = int(os.getenv("DB_CONN_MAX_AGE", "60"))
+        DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+    # DB_PGBOUNCER=True behind PgBouncer in transaction pooling mode: a session
+    # is not kept between transactions, so no server-side cursors and no
+    # prepared statements
+    if os.getenv("DB_PGBOUNCER", "False") == "True":
+        DATABASES["default"]["DISABLE_SERVER_SIDE_CURSORS"] = True
+        DATABASES["default"].setdefault("OPTIONS", {})["prepare_threshold"] = None
 else:
     # Fallback to SQLite for local development without Docker
     DATABASES = {
@@ -93,6 +124,70 @@ else:
         }
     }
 
+# Read replica for the heavy read endpoints (analytics, full history) and
+# report workers: POSTGRES_REPLICA_HOST / POSTGRES_REPLICA_PORT, same database
+# name and credentials as the primary. See cash_track_api/db_router.py.
+if "postgresql" in DATABASES["default"]["ENGINE"] and os.getenv("POSTGRES_REPLICA_HOST"):
+    DATABASES["replica"] = copy.deepcopy(DATABASES["default"])
+    DATABASES["replica"]["HOST"] = os.getenv("POSTGRES_REPLICA_HOST")
+    DATABASES["replica"]["PORT"] = os.getenv("POSTGRES_REPLICA_PORT", DATABASES["default"]["PORT"])
+
+DATABASE_ROUTERS = ["cash_track_api.db_router.ReplicaRouter"]
+REPLICA_DATABASE = "replica" if "replica" in DATABASES else ""
+# Seconds a user reads from the primary after a write (read-your-writes)
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", "10"))
+
+# Cache
+# Shared Redis cache when REDIS_URL is set (required with several workers so
+# invalidations reach every process), in-process memory otherwise
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Authenticated user resolved from the JWT is cached for this many seconds
+# (0 disables the cache); entries are dropped as soon as the user is saved or
+# deleted. Bulk updates (QuerySet.update, raw SQL) must call
+# accounts.authentication.invalidate_cached_user, or wait for the timeout
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv("AUTH_USER_CACHE_TIMEOUT", "60"))
+AUTH_USER_CACHE_ALIAS = "default"
+
+# Password hashing
+# PASSWORD_HASHER picks the hasher for new passwords (argon2, scrypt or
+# pbkdf2); the others stay listed so existing hashes still verify and get
+# rehashed on the next login. Work factors: see accounts/hashers.py and
+# "python manage.py bench_login".
+# The Argon2id defaults are the OWASP minimum (19 MiB, 2 passes, 1 lane),
+# chosen for login throughput over Django's 100 MiB/8 lanes. bench_login
+# --iterations 20, one Intel Xeon core, Django 6.0, argon2-cffi 25.1:
+#   argon2 t=2 m=19456 p=1 (defaults)     42 ms/verify  48 ms/login  ~21 logins/s
+#   argon2 t=2 m=102400 p=8 (Django's)   288 ms/verify 322 ms/login   ~3 logins/s
+#   scrypt n=2**14                        336 ms/verify
+#   pbkdf2_sha256 (1 200 000 iterations)  706 ms/verify
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "2"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "19456"))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "1"))
+SCRYPT_WORK_FACTOR = int(os.getenv("SCRYPT_WORK_FACTOR", str(2 ** 14)))
+
+_PASSWORD_HASHERS = {
+    "argon2": "accounts.hashers.TunedArgon2PasswordHasher",
+    "scrypt": "accounts.hashers.TunedScryptPasswordHasher",
+    "pbkdf2": "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+}
+_preferred_hasher = _PASSWORD_HASHERS[os.getenv("PASSWORD_HASHER", "argon2")]
+PASSWORD_HASHERS = [_preferred_hasher] + [
+    hasher for hasher in _PASSWORD_HASHERS.values() if hasher != _preferred_hasher
+] + ["django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher"]
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -123,6 +218,13 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Cold archive of closed periods (transactions/archive.py). Kept out of
+# MEDIA_ROOT, which is served publicly in DEBUG.
+ARCHIVE_ROOT = Path(os.getenv("ARCHIVE_ROOT", BASE_DIR / "archive"))
+ARCHIVE_ZSTD_LEVEL = int(os.getenv("ARCHIVE_ZSTD_LEVEL", "10"))
+# Archived months a list or history request may read (400 beyond)
+ARCHIVE_MAX_SEGMENTS = int(os.getenv("ARCHIVE_MAX_SEGMENTS", "12"))
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
@@ -132,15 +234,89 @@ AUTH_USER_MODEL = "accounts.User"
 # REST Framework Configuration
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "accounts.authentication.CachedJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    # orjson for JSON (same output, faster encoding); MessagePack on request
+    # with "Accept: application/msgpack"
+    "DEFAULT_RENDERER_CLASSES": [
+        "cash_track_api.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+        "cash_track_api.renderers.MessagePackRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "cash_track_api.renderers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 20,
 }
 
+# Serve GET /api/transactions/ through the values()-based fast path
+# (same JSON as TransactionSerializer, without per-instance serializer overhead)
+TRANSACTIONS_FAST_LIST = os.getenv("TRANSACTIONS_FAST_LIST", "True") == "True"
+
+# Paginated lists (transactions, history) matching at least this many rows
+# report the PostgreSQL planner estimate instead of an exact COUNT(*)
+# (0: always exact, see transactions/pagination.py)
+COUNT_ESTIMATE_THRESHOLD = int(os.getenv("COUNT_ESTIMATE_THRESHOLD", "0"))
+
+# Route the statistics / history endpoints to their native async versions
+# (meant for ASGI deployments, see SERVER_MODE below)
+ASYNC_READ_VIEWS = os.getenv("ASYNC_READ_VIEWS", "False") == "True"
+
+# manage.py serve: "wsgi" (gunicorn sync workers) or "asgi" (uvicorn workers),
+# number of pre-forked workers (0 = derived from the CPU count)
+SERVER_MODE = os.getenv("SERVER_MODE", "wsgi")
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "0"))
+
+# Per-request metrics (latency, SQL, serializer time, size) served in Prometheus
+# format at /api/metrics to staff users, or to scrapers sending METRICS_TOKEN as
+# a bearer token. METRICS_DIR is a directory shared by the workers so the
+# endpoint reports all of them
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "False") == "True"
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# SQL diagnostics: log statements slower than SLOW_QUERY_MS and query shapes
+# repeated NPLUSONE_THRESHOLD times in one request (JSON lines), with the code
+# that issued them; top offenders at /api/diagnostics/queries/ (admins)
+QUERY_DIAGNOSTICS = os.getenv("QUERY_DIAGNOSTICS", "False") == "True"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+NPLUSONE_THRESHOLD = int(os.getenv("NPLUSONE_THRESHOLD", "5"))
+QUERY_DIAGNOSTICS_LOG = os.getenv("QUERY_DIAGNOSTICS_LOG", str(BASE_DIR / "logs" / "queries.jsonl"))
+
+if QUERY_DIAGNOSTICS:
+    os.makedirs(os.path.dirname(QUERY_DIAGNOSTICS_LOG), exist_ok=True)
+    LOGGING = {
+        "version": 1,
+        "disable_existing_loggers": False,
+        "formatters": {
+            "raw": {"format": "%(message)s"},
+        },
+        "handlers": {
+            "query_diagnostics": {
+                "class": "logging.handlers.RotatingFileHandler",
+                "filename": QUERY_DIAGNOSTICS_LOG,
+                "maxBytes": 10 * 1024 * 1024,
+                "backupCount": 3,
+                "formatter": "raw",
+                "delay": True,
+            },
+        },
+        "loggers": {
+            "cash_track_api.diagnostics": {
+                "handlers": ["query_diagnostics"],
+                "level": "WARNING",
+                "propagate": False,
+            },
+        },
+    }
+
 # Simple JWT Configuration
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(hours=1),
@@ -158,7 +334,16 @@ SIMPLE_JWT = {
     "TOKEN_TYPE_CLAIM": "token_type",
 }
 
+# Workers pull new token revocations (logout, refresh rotation, deactivation)
+# from the revoked_tokens table at most this often, in seconds
+REVOCATION_SYNC_INTERVAL = int(os.getenv("REVOCATION_SYNC_INTERVAL", "5"))
+
+# Transaction writes sent with an Idempotency-Key header replay their stored
+# response to retries with the same key for this long, in seconds
+IDEMPOTENCY_KEY_TTL = int(os.getenv("IDEMPOTENCY_KEY_TTL", "86400"))
+
 # CORS Configuration - Allow all origins
 CORS_ALLOWED_ORIGINS = []  # Not needed when CORS_ALLOW_ALL_ORIGINS is True
 CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOW_ALL_ORIGINS = True  # Allow all origins
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key")
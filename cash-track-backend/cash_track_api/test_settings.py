@@ -0,0 +1,18 @@
+"""
+Settings for the test suite: ``manage.py test`` uses them by default, other
+runners (pytest-django, ``python -m django test``) through
+DJANGO_SETTINGS_MODULE=cash_track_api.test_settings.
+"""
+import copy
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES
+
+# A second, separate database stands in for the replica, and routing is only
+# switched on by the tests that exercise it. The settings module's own dict
+# is left untouched.
+DATABASES = copy.deepcopy(DATABASES)
+DATABASES["replica"] = copy.deepcopy(DATABASES["default"])
+if "postgresql" in DATABASES["default"]["ENGINE"]:
+    DATABASES["replica"]["TEST"] = {"NAME": f"test_{DATABASES['default']['NAME']}_replica"}
+
+REPLICA_DATABASE = ""
@@ -0,0 +1,99 @@
+"""
+Query-budget test helpers.
+
+``QueryBudgetTestCase`` grows a synthetic ledger through several sizes and
+checks that an endpoint always issues the same, fixed number of queries. When
+a budget is exceeded, the failure message lists the statements and a diff of
+their shapes against the smallest fixture, so the new or repeated query is
+visible at once.
+"""
+import difflib
+import itertools
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from transactions.models import CashBoxBalance, Transaction, TransactionHistory
+from transactions.seeding import (
+    HISTORY_COLUMNS,
+    TRANSACTION_COLUMNS,
+    LedgerGenerator,
+    ensure_bench_categories,
+    ensure_bench_users,
+    insert_rows,
+    reset_sequences,
+)
+from .diagnostics import query_shape
+
+
+# Fixture sizes (transactions); the pages hold 20 (list) and 50 (history) rows
+FIXTURE_SIZES = (5, 40, 150)
+
+
+def collapsed_shapes(statements):
+    """Query shapes with consecutive repeats folded into one ``[xN]`` line"""
+    lines = []
+    for shape, group in itertools.groupby(query_shape(sql) for sql in statements):
+        count = len(list(group))
+        lines.append(f"{shape}  [x{count}]" if count > 1 else shape)
+    return lines
+
+
+class QueryBudgetTestCase(TestCase):
+    """TestCase with a growable ledger fixture and assertQueryBudget"""
+    history_ratio = 2.0
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = ensure_bench_users(3)
+        cls.admin = cls.users[0]
+        cls.categories = ensure_bench_categories()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.baselines = {}
+
+    def grow_ledger(self, size):
+        """Add transactions (with history) until the ledger holds ``size`` of them"""
+        missing = size - Transaction.objects.count()
+        if missing <= 0:
+            return
+        generator = LedgerGenerator(self.users, self.categories, missing, history_ratio=self.history_ratio)
+        for transactions, history in generator.batches(missing):
+            insert_rows(Transaction, TRANSACTION_COLUMNS, transactions)
+            insert_rows(TransactionHistory, HISTORY_COLUMNS, history)
+        reset_sequences(Transaction, TransactionHistory)
+        CashBoxBalance.refresh()
+
+    def assertQueryBudget(self, budget, name, request, expected_status=200):
+        """
+        Run ``request()`` and fail unless it issues exactly ``budget`` queries.
+        The first call per ``name`` is the baseline the later ones are diffed with.
+        """
+        with CaptureQueriesContext(connection) as context:
+            response = request()
+        self.assertEqual(
+            response.status_code, expected_status,
+            f"{name}: HTTP {response.status_code} {getattr(response, 'data', '')}",
+        )
+        statements = [query["sql"] for query in context.captured_queries]
+        baseline = self.baselines.setdefault(name, statements)
+        if len(statements) != budget:
+            self.fail(self._budget_message(name, budget, statements, baseline))
+        return response
+
+    @staticmethod
+    def _budget_message(name, budget, statements, baseline):
+        lines = [
+            f"{name}: {len(statements)} queries, budget {budget}"
+            f" (smallest fixture: {len(baseline)})",
+        ]
+        lines += [f"  {index}. {sql}" for index, sql in enumerate(statements, 1)]
+        if statements is not baseline:
+            diff = difflib.unified_diff(
+                collapsed_shapes(baseline), collapsed_shapes(statements),
+                "smallest fixture", "this fixture", lineterm="", n=0,
+            )
+            lines += ["Query shapes compared with the smallest fixture:", *diff]
+        return "\n".join(lines)
@@ -0,0 +1,227 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import uuid
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO
+from types import SimpleNamespace
+import msgpack
+from django.contrib.auth.models import AnonymousUser
+from django.conf import settings
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.serializers import BaseSerializer
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import AccessToken
+from accounts.models import User
+from accounts.serializers import UserSerializer
+from . import diagnostics, metrics
+from .renderers import MessagePackRenderer, ORJSONParser, ORJSONRenderer
+
+
+class RendererTests(SimpleTestCase):
+    """orjson and MessagePack render what DRF's JSONRenderer renders"""
+    data = {
+        "amount": Decimal("1500.00"),
+        "created_at": datetime(2026, 3, 1, 8, 30, 15, 123456, tzinfo=dt_timezone.utc),
+        "day": date(2026, 3, 1),
+        "id": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+        "label": gettext_lazy("Caisse principale"),
+        "rows": [{"n": 1, "text": "sépar\u2028ateur"}, None, True],
+        7: "clé entière",
+    }
+
+    def test_orjson_output_matches_drf(self):
+        for indent in (None, "indent=4"):
+            with self.subTest(indent=indent):
+                media_type = f"application/json; {indent}" if indent else None
+                self.assertEqual(
+                    json.loads(ORJSONRenderer().render(self.data, media_type)),
+                    json.loads(JSONRenderer().render(self.data, media_type)),
+                )
+        rendered = ORJSONRenderer().render(self.data)
+        self.assertEqual(rendered, JSONRenderer().render(self.data))
+        self.assertIn(b'"created_at":"2026-03-01T08:30:15.123456Z"', rendered)
+        self.assertIn(b"\\u2028", rendered)
+        self.assertEqual(ORJSONRenderer().render(None), b"")
+
+    def test_parser_round_trip(self):
+        rendered = JSONRenderer().render(self.data)
+        self.assertEqual(ORJSONParser().parse(BytesIO(ORJSONRenderer().render(self.data))), json.loads(rendered))
+
+    def test_msgpack_matches_json(self):
+        unpacked = msgpack.unpackb(MessagePackRenderer().render(self.data), strict_map_key=False)
+        expected = json.loads(JSONRenderer().render(self.data))
+        self.assertEqual(unpacked.pop(7), expected.pop("7"))
+        self.assertEqual(unpacked, expected)
+
+
+class MetricsTests(TestCase):
+    """Prometheus endpoint access, per-request timings and worker snapshots"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user("admin", "admin@example.com", "Cash-Track-2026!", role="admin")
+        cls.staff = User.objects.create_user("staff", "staff@example.com", "Cash-Track-2026!", is_staff=True)
+
+    def scrape(self, user=None, authorization=None, session_user=None):
+        headers = {}
+        if user is not None:
+            headers["Authorization"] = f"Bearer {AccessToken.for_user(user)}"
+        if authorization is not None:
+            headers["Authorization"] = authorization
+        request = RequestFactory().get("/api/metrics", headers=headers)
+        request.user = session_user or AnonymousUser()
+        return metrics.metrics_view(request)
+
+    def test_endpoint_is_for_admins_by_default(self):
+        self.assertEqual(self.scrape().status_code, 403)
+        self.assertEqual(self.scrape(authorization="Bearer nope").status_code, 403)
+        # Access follows the role, like the other admin endpoints, not is_staff
+        self.assertEqual(self.scrape(self.staff).status_code, 403)
+        self.assertEqual(self.scrape(session_user=self.staff).status_code, 403)
+        self.assertEqual(self.scrape(session_user=self.admin).status_code, 200)
+        response = self.scrape(self.admin)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"# TYPE cashtrack_http_requests_total counter", response.content)
+
+    @override_settings(METRICS_TOKEN="scrape-me")
+    def test_endpoint_accepts_the_token(self):
+        self.assertEqual(self.scrape(authorization="Bearer scrape-me").status_code, 200)
+        self.assertEqual(self.scrape(authorization="Bearer scrape-you").status_code, 403)
+        self.assertEqual(self.scrape(self.admin).status_code, 200)
+
+    @override_settings(METRICS_ENABLED=True)
+    def test_middleware_records_sql_and_rendering(self):
+        serializer_data = BaseSerializer.data
+        render = metrics.timed_serialization(ORJSONRenderer().render)
+
+        def get_response(request):
+            return HttpResponse(render({"users": User.objects.count()}), content_type="application/json")
+
+        middleware = metrics.MetricsMiddleware(get_response)
+        request = RequestFactory().get("/")
+        request.resolver_match = SimpleNamespace(view_name="metrics-test")
+        response = middleware(request)
+
+        entry = metrics.registry.entries["metrics-test\tGET"]
+        self.assertEqual(entry["responses"], {"200": 1})
+        self.assertEqual(entry["queries"]["sum"], 1)
+        self.assertGreater(entry["serializer_seconds"], 0)
+        self.assertEqual(entry["size"]["sum"], len(response.content))
+        # Nothing outside the middleware and the timed functions is patched
+        self.assertIs(BaseSerializer.data, serializer_data)
+
+    def test_serializer_data_is_timed(self):
+        state = metrics.RequestState()
+        token = metrics.current_request.set(state)
+        try:
+            data = UserSerializer(User.objects.all(), many=True).data
+        finally:
+            metrics.current_request.reset(token)
+        self.assertEqual(len(data), 2)
+        self.assertGreater(state.serializer_seconds, 0)
+        self.assertEqual(state.serializer_depth, 0)
+
+    def test_exited_workers_keep_counters_not_gauges(self):
+        exited = subprocess.Popen([sys.executable, "-c", "pass"])
+        exited.wait()
+        snapshot = {"views": {"metrics-test\tGET": metrics._new_entry()}, "database": {}}
+        snapshot["views"]["metrics-test\tGET"]["responses"] = {"200": 3}
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            for pid, in_use in ((exited.pid, 4), (os.getppid(), 1)):
+                snapshot["database"] = {"other": {"connections_opened": 2, "pool_in_use": in_use}}
+                with open(os.path.join(directory, f"{pid}.json"), "w") as output:
+                    json.dump(snapshot, output)
+            merged = metrics.Registry().collect()
+
+        self.assertEqual(merged["views"]["metrics-test\tGET"]["responses"], {"200": 6})
+        self.assertEqual(merged["database"]["other"], {"connections_opened": 4, "pool_in_use": 1})
+
+
+class QueryDiagnosticsTests(TestCase):
+    """Slow and repeated statements are logged with their origin and aggregated for admins"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user("admin", "admin@example.com", "Cash-Track-2026!", role="admin")
+        cls.user = User.objects.create_user("user", "user@example.com", "Cash-Track-2026!")
+
+    def test_query_shape(self):
+        self.assertEqual(
+            diagnostics.query_shape('SELECT * FROM "users" WHERE "id" = 12 AND "role" IN (%s, %s, %s) LIMIT 21'),
+            'SELECT * FROM "users" WHERE "id" = ? AND "role" IN (%s, ...) LIMIT ?',
+        )
+
+    @override_settings(QUERY_DIAGNOSTICS=True, NPLUSONE_THRESHOLD=3, SLOW_QUERY_MS=0)
+    def test_middleware_logs_and_view_aggregates(self):
+        def per_row_lookups(request):
+            for user in (self.admin, self.user, self.admin, self.user):
+                User.objects.filter(pk=user.pk).exists()
+            return HttpResponse()
+
+        request = RequestFactory().get("/api/users/")
+        request.resolver_match = SimpleNamespace(view_name="diagnostics-test")
+        with self.assertLogs("cash_track_api.diagnostics", "WARNING") as logs:
+            diagnostics.QueryDiagnosticsMiddleware(per_row_lookups)(request)
+        events = [json.loads(record.getMessage()) for record in logs.records]
+
+        repeated = [event for event in events if event["type"] == "n_plus_one"]
+        self.assertEqual(len(repeated), 1)
+        self.assertEqual((repeated[0]["count"], repeated[0]["view"]), (4, "diagnostics-test"))
+        self.assertRegex(repeated[0]["stack"][0], r"^cash_track_api/tests\.py:\d+ in per_row_lookups$")
+        self.assertEqual(len([event for event in events if event["type"] == "slow_query"]), 4)
+
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl") as log:
+            log.write("".join(json.dumps(event) + "\n" for event in events) + "not json\n")
+            log.flush()
+            with override_settings(QUERY_DIAGNOSTICS_LOG=log.name):
+                responses = {}
+                for user in (self.admin, self.user):
+                    request = APIRequestFactory().get("/api/diagnostics/queries/", {"type": "slow_query"})
+                    force_authenticate(request, user)
+                    responses[user.role] = diagnostics.top_offenders_view(request)
+        self.assertEqual(responses["user"].status_code, 403)
+        results = responses["admin"].data["results"]
+        self.assertEqual([(group["type"], group["occurrences"], group["views"]) for group in results],
+                         [("slow_query", 4, ["diagnostics-test"])])
+
+
+class DatabaseSettingsTests(SimpleTestCase):
+    """PostgreSQL connections: persistent by default, a psycopg pool with DB_POOL, PgBouncer-safe with DB_PGBOUNCER"""
+
+    @staticmethod
+    def default_database(**env):
+        """DATABASES["default"] of the settings loaded in a fresh interpreter with ``env``"""
+        base = {name: value for name, value in os.environ.items() if not name.startswith(("DB_", "POSTGRES_"))}
+        script = "import json\nfrom cash_track_api import settings\nprint(json.dumps(settings.DATABASES['default'], default=str))"
+        output = subprocess.run(
+            [sys.executable, "-c", script], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+            env={**base, "POSTGRES_DB": "cashtrack", **env},
+        ).stdout
+        return json.loads(output)
+
+    def test_persistent_connections_by_default(self):
+        database = self.default_database()
+        self.assertEqual((database["CONN_MAX_AGE"], database["CONN_HEALTH_CHECKS"]), (60, True))
+        self.assertNotIn("OPTIONS", database)
+        self.assertEqual(self.default_database(DB_CONN_MAX_AGE="0")["CONN_MAX_AGE"], 0)
+
+    def test_pool(self):
+        database = self.default_database(DB_POOL="True", DB_POOL_MIN_SIZE="4", DB_POOL_MAX_SIZE="20", DB_POOL_TIMEOUT="2.5")
+        self.assertEqual(database["OPTIONS"], {"pool": {"min_size": 4, "max_size": 20, "timeout": 2.5}})
+        # Django refuses persistent connections together with a pool
+        self.assertNotIn("CONN_MAX_AGE", database)
+
+    def test_pgbouncer(self):
+        database = self.default_database(DB_PGBOUNCER="True")
+        self.assertTrue(database["DISABLE_SERVER_SIDE_CURSORS"])
+        self.assertEqual(database["OPTIONS"], {"prepare_threshold": None})
+        database = self.default_database(DB_PGBOUNCER="True", DB_POOL="True")
+        self.assertEqual(set(database["OPTIONS"]), {"pool", "prepare_threshold"})
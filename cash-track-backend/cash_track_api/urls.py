@@ -5,6 +5,8 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from .metrics import metrics_view
+from .diagnostics import top_offenders_view
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -13,6 +15,12 @@ urlpatterns = [
     path("api/transactions/", include("transactions.urls")),
 ]
 
+if settings.METRICS_ENABLED:
+    urlpatterns.append(path("api/metrics", metrics_view, name="metrics"))
+
+if settings.QUERY_DIAGNOSTICS:
+    urlpatterns.append(path("api/diagnostics/queries/", top_offenders_view, name="query-diagnostics"))
+
 # Serve media files in development
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
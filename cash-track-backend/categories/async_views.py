@@ -0,0 +1,46 @@
+"""
+Async version of the category statistics endpoint, served when
+ASYNC_READ_VIEWS is enabled (see categories/urls.py). Its two queries are
+awaited in turn: the async ORM runs them in Django's single thread-sensitive
+executor, one after the other, whether gathered or not.
+"""
+from django.db.models import Count, Q
+from cash_track_api.asyncapi import async_api_view, fetch_all
+from cash_track_api.diagnostics import explainable
+from transactions.models import Transaction
+from transactions.views import for_cash_box, selected_cash_box
+from .models import Category
+from .serializers import CategorySerializer
+
+
+@async_api_view
+@explainable
+async def category_stats_view(request):
+    """Get category statistics with transaction counts and percentages"""
+    # The LEFT JOIN of the annotation already lists categories without transactions
+    cash_box_id = selected_cash_box(request.query_params)
+    in_cash_box = None if cash_box_id is None else Q(transactions__cash_box_id=cash_box_id)
+    categories_query = Category.objects.annotate(
+        transaction_count=Count("transactions", filter=in_cash_box)
+    ).order_by("-transaction_count", "name")
+
+    categories = await fetch_all(categories_query)
+    total_transactions = await for_cash_box(Transaction.objects.all(), cash_box_id).acount()
+
+    categories_data = []
+    for category in categories:
+        count = category.transaction_count
+        percentage = 0
+        if total_transactions > 0:
+            percentage = round((count / total_transactions) * 100, 1)
+
+        category_data = CategorySerializer(category).data
+        category_data["transaction_count"] = count
+        category_data["percentage"] = percentage
+        categories_data.append(category_data)
+
+    return {
+        "count": len(categories_data),
+        "total_transactions": total_transactions,
+        "categories": categories_data,
+    }
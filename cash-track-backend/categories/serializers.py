@@ -1,8 +1,9 @@
 from rest_framework import serializers
+from cash_track_api.metrics import TimedSerializerMixin
 from .models import Category
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for Category model"""
     
     class Meta:
@@ -1,3 +1,20 @@
-from django.test import TestCase
+from django.urls import reverse
+from cash_track_api.testing import FIXTURE_SIZES, QueryBudgetTestCase
 
-# Create your tests here.
+
+class CategoryQueryBudgetTests(QueryBudgetTestCase):
+    """Query count of the category endpoints must not grow with the ledger"""
+
+    def test_list(self):
+        url = reverse("category-list-create")
+        for size in FIXTURE_SIZES:
+            self.grow_ledger(size)
+            with self.subTest(size=size):
+                self.assertQueryBudget(2, "list", lambda: self.client.get(url))
+
+    def test_stats(self):
+        url = reverse("category-stats")
+        for size in FIXTURE_SIZES:
+            self.grow_ledger(size)
+            with self.subTest(size=size):
+                self.assertQueryBudget(3, "stats", lambda: self.client.get(url))
@@ -1,13 +1,16 @@
+from django.conf import settings
 from django.urls import path
+from . import views, async_views
 from .views import (
     CategoryListCreateView,
     CategoryDetailView,
-    category_stats_view,
 )
 
+# Async version of the statistics endpoint under ASGI
+read_views = async_views if settings.ASYNC_READ_VIEWS else views
+
 urlpatterns = [
     path("", CategoryListCreateView.as_view(), name="category-list-create"),
     path("<int:pk>/", CategoryDetailView.as_view(), name="category-detail"),
-    path("stats/", category_stats_view, name="category-stats"),
+    path("stats/", read_views.category_stats_view, name="category-stats"),
 ]
-
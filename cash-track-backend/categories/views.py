@@ -2,11 +2,13 @@ from rest_framework import generics, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from django.db.models import Count
+from django.db.models import Count, Q
 from .models import Category
 from .serializers import CategorySerializer
 from .permissions import IsAdminRole
+from cash_track_api.diagnostics import explainable
 from transactions.models import Transaction
+from transactions.views import for_cash_box, selected_cash_box
 
 
 class CategoryListCreateView(generics.ListCreateAPIView):
@@ -43,15 +45,18 @@ class CategoryDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@explainable
 def category_stats_view(request):
     """Get category statistics with transaction counts and percentages"""
-    # Get all categories with transaction counts
+    # Get all categories with transaction counts (of one cash box with ?cash_box=)
+    cash_box_id = selected_cash_box(request.query_params)
+    in_cash_box = None if cash_box_id is None else Q(transactions__cash_box_id=cash_box_id)
     categories = Category.objects.annotate(
-        transaction_count=Count('transactions')
+        transaction_count=Count('transactions', filter=in_cash_box)
     ).order_by('-transaction_count', 'name')
     
     # Get total number of transactions
-    total_transactions = Transaction.objects.count()
+    total_transactions = for_cash_box(Transaction.objects.all(), cash_box_id).count()
     
     # Build response with stats
     categories_data = []
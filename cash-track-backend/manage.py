@@ -6,6 +6,11 @@ import sys
 
 def main():
     """Run administrative tasks."""
+    # The test suite has its own settings (stand-in replica database), even
+    # where DJANGO_SETTINGS_MODULE points at the regular ones; --settings
+    # still takes precedence
+    if sys.argv[1:2] == ["test"]:
+        os.environ["DJANGO_SETTINGS_MODULE"] = "cash_track_api.test_settings"
     os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cash_track_api.settings")
     try:
         from django.core.management import execute_from_command_line
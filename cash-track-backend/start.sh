@@ -1,17 +1,16 @@
 #!/bin/bash
 set -e
 
-# Run migrations (la base est déjà attendue via le healthcheck Docker)
-python manage.py migrate
+# Development server (DEBUG, the default, or DEV_SERVER=True): runserver also serves /static/
+if [ "${DEV_SERVER:-${DEBUG:-True}}" = "True" ]; then
+    # Pending migrations only (skipped when the schema is current), then the
+    # default data (users and categories)
+    python manage.py serve --setup-only --init-data
 
-# Initialize default data (users and categories)
-echo ""
-echo "=========================================="
-echo "Initializing default data..."
-echo "=========================================="
-python manage_data.py
-echo ""
-
-# Start server
-exec python manage.py runserver 0.0.0.0:8000
+    exec python manage.py runserver 0.0.0.0:8000
+fi
 
+# Production server: workers pré-forkés, application préchargée et caches chauds
+# (SERVER_MODE=wsgi|asgi, WEB_WORKERS). serve applique les migrations en attente
+# et crée les données par défaut dans le même processus, avant le fork.
+exec python manage.py serve --init-data
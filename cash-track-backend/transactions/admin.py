@@ -1,11 +1,18 @@
 from django.contrib import admin
-from .models import Transaction, TransactionHistory
+from .models import ArchiveSegment, BalanceSnapshot, CashBox, IdempotencyKey, Transaction, TransactionHistory
+
+
+@admin.register(CashBox)
+class CashBoxAdmin(admin.ModelAdmin):
+    list_display = ["id", "name", "is_default", "created_at"]
+    search_fields = ["name"]
+    readonly_fields = ["created_at", "updated_at"]
 
 
 @admin.register(Transaction)
 class TransactionAdmin(admin.ModelAdmin):
-    list_display = ["id", "ref", "type", "description", "amount", "category", "created_by", "created_at"]
-    list_filter = ["type", "category", "created_at"]
+    list_display = ["id", "ref", "type", "description", "amount", "category", "cash_box", "created_by", "created_at"]
+    list_filter = ["type", "category", "cash_box", "created_at"]
     search_fields = ["ref", "description", "exporter_fournisseur"]
     readonly_fields = ["created_at", "updated_at"]
     ordering = ["-created_at"]
@@ -14,10 +21,10 @@ class TransactionAdmin(admin.ModelAdmin):
 
 @admin.register(TransactionHistory)
 class TransactionHistoryAdmin(admin.ModelAdmin):
-    list_display = ["id", "transaction_id", "action", "performed_by", "created_at"]
+    list_display = ["id", "transaction_id", "cash_box_id", "action", "performed_by", "created_at"]
     list_filter = ["action", "created_at", "performed_by"]
     search_fields = ["transaction_id", "performed_by__name", "performed_by__email"]
-    readonly_fields = ["id", "transaction_id", "action", "transaction_data", "performed_by", "created_at", "changes"]
+    readonly_fields = ["id", "transaction_id", "cash_box_id", "action", "transaction_data", "performed_by", "created_at", "changes"]
     ordering = ["-created_at"]
     date_hierarchy = "created_at"
     
@@ -29,3 +36,46 @@ class TransactionHistoryAdmin(admin.ModelAdmin):
     
     def has_change_permission(self, request, obj=None):
         return False
+
+
+class BalanceSnapshotInline(admin.TabularInline):
+    model = BalanceSnapshot
+    fields = ["cash_box", "total_recettes", "total_depenses", "transaction_count", "closing_balance"]
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+
+@admin.register(ArchiveSegment)
+class ArchiveSegmentAdmin(admin.ModelAdmin):
+    """Read-only: segments are written by ``manage.py archive_ledger``"""
+    list_display = ["id", "period_start", "period_end", "transaction_count", "history_count", "created_at"]
+    readonly_fields = [
+        "period_start", "period_end", "transactions_file", "history_file",
+        "transaction_count", "history_count", "created_at",
+    ]
+    inlines = [BalanceSnapshotInline]
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    """Read-only: keys are written by the transaction write endpoints"""
+    list_display = ["key", "user", "status_code", "created_at", "expires_at"]
+    list_filter = ["status_code"]
+    search_fields = ["key", "user__email"]
+    readonly_fields = ["key", "user", "fingerprint", "status_code", "response", "created_at", "expires_at"]
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
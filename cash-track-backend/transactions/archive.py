@@ -0,0 +1,358 @@
+"""
+Cold archive of closed periods (see ``manage.py archive_ledger``).
+
+``archive_period`` moves a month of transactions and history entries out of
+the hot tables into zstd-compressed JSON Lines files under ARCHIVE_ROOT and
+records it as an ``ArchiveSegment``. The transactions of each cash box are
+summarized into a ``BalanceSnapshot``: running balances, balance refreshes
+and counts add the snapshots to the hot rows, so archiving changes no
+balance. Archived transaction rows keep the running balance they had.
+
+Months are archived oldest first, so every hot row is newer than the
+archive cutoff and day-to-day queries never open a file. Reads only look at
+the archive when a request asks for it (``?archived=true``, or a start date
+before the cutoff).
+"""
+import io
+import os
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from pathlib import Path
+import orjson
+import zstandard
+from django.conf import settings
+from django.db import connection, transaction as db_transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from . import partitioning
+from .models import ArchiveSegment, BalanceSnapshot, Transaction, TransactionHistory, whole_fcfa
+
+TRANSACTION_FIELDS = [field.attname for field in Transaction._meta.concrete_fields]
+HISTORY_FIELDS = [field.attname for field in TransactionHistory._meta.concrete_fields]
+DATETIME_FIELDS = ("created_at", "updated_at")
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def _encode(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError
+
+
+def write_rows(path, rows):
+    """Write dict rows to ``path`` as zstd-compressed JSON Lines; returns the row count"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(path.name + ".partial")
+    count = 0
+    compressor = zstandard.ZstdCompressor(level=settings.ARCHIVE_ZSTD_LEVEL)
+    with open(partial, "wb") as target, compressor.stream_writer(target, closefd=False) as writer:
+        for row in rows:
+            writer.write(orjson.dumps(row, default=_encode, option=orjson.OPT_APPEND_NEWLINE))
+            count += 1
+    os.replace(partial, path)
+    return count
+
+
+def read_rows(path):
+    """Rows of an archive file, in file (chronological) order"""
+    with open(path, "rb") as source:
+        reader = io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(source), encoding="utf-8")
+        for line in reader:
+            row = orjson.loads(line)
+            for name in DATETIME_FIELDS:
+                if row.get(name):
+                    row[name] = datetime.fromisoformat(row[name])
+            if isinstance(row.get("amount"), str):
+                # Files written before amounts became whole FCFA integers
+                row["amount"] = whole_fcfa(row["amount"])
+            yield row
+
+
+def _with_balances(rows, opening):
+    """
+    Add to each transaction row (ordered by created_at) the running balance of
+    its cash box, as ``TransactionSerializer.get_balance`` computes it: every
+    row up to its timestamp, plus its own amount once more. Returns the
+    closing totals per box.
+    """
+    running = {box: [recettes, depenses] for box, (recettes, depenses, _) in opening.items()}
+    index = 0
+    while index < len(rows):
+        stamp = rows[index]["created_at"]
+        group_end = index
+        while group_end < len(rows) and rows[group_end]["created_at"] == stamp:
+            row = rows[group_end]
+            totals = running.setdefault(row["cash_box_id"], [0, 0])
+            totals[0 if row["type"] == "recette" else 1] += row["amount"]
+            group_end += 1
+        for row in rows[index:group_end]:
+            recettes, depenses = running[row["cash_box_id"]]
+            total_recettes, total_depenses = float(recettes), float(abs(depenses))
+            if row["type"] == "recette":
+                total_recettes += float(row["amount"])
+            else:
+                total_depenses += abs(float(row["amount"]))
+            row["balance"] = float(total_recettes - total_depenses)
+        index = group_end
+    return running
+
+
+def _remove_rows(model, first_day, start, end):
+    """Delete the period's rows, dropping its whole partition when the table is partitioned by month"""
+    table = model._meta.db_table
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql" and partitioning.is_partitioned(model):
+            name = partitioning.partition_name(table, first_day, "month")
+            if any(part == name for part, _, _ in partitioning.partitions(model)):
+                cursor.execute(f"ALTER TABLE {quote(table)} DETACH PARTITION {quote(name)}")
+                cursor.execute(f"DROP TABLE {quote(name)}")
+                return
+        # Raw SQL: deleting archived rows must not fire the ledger signals
+        cursor.execute(f"DELETE FROM {quote(table)} WHERE created_at >= %s AND created_at < %s", [start, end])
+
+
+def archive_period(first_day):
+    """
+    Archive the month starting at ``first_day`` (a date): write its files,
+    record the segment and its balance snapshots and delete the hot rows, all
+    or nothing. Returns the ``ArchiveSegment``.
+    """
+    first_day = partitioning.period_start(first_day, "month")
+    start = partitioning.bound(first_day)
+    end = partitioning.bound(partitioning.next_period(first_day, "month"))
+    if end > timezone.now():
+        raise ArchiveError(f"La période {first_day:%Y-%m} n'est pas close")
+    if ArchiveSegment.objects.filter(period_end__gt=start).exists():
+        raise ArchiveError(f"La période {first_day:%Y-%m} est déjà archivée ou précède une période archivée")
+    if (Transaction.objects.filter(created_at__lt=start).exists()
+            or TransactionHistory.objects.filter(created_at__lt=start).exists()):
+        raise ArchiveError("Les périodes doivent être archivées de la plus ancienne à la plus récente")
+
+    root = Path(settings.ARCHIVE_ROOT)
+    transactions_file = f"transactions-{first_day:%Y-%m}.jsonl.zst"
+    history_file = f"history-{first_day:%Y-%m}.jsonl.zst"
+    written = []
+    try:
+        with db_transaction.atomic():
+            rows = list(
+                Transaction.objects.select_for_update()
+                .filter(created_at__gte=start, created_at__lt=end)
+                .order_by("created_at", "id")
+                .values(*TRANSACTION_FIELDS)
+            )
+            history = (
+                TransactionHistory.objects.filter(created_at__gte=start, created_at__lt=end)
+                .order_by("created_at", "id")
+                .values(*HISTORY_FIELDS)
+            )
+            opening = BalanceSnapshot.archived_totals()
+            closing = _with_balances(rows, opening)
+
+            written.append(root / transactions_file)
+            transaction_count = write_rows(root / transactions_file, rows)
+            written.append(root / history_file)
+            history_count = write_rows(root / history_file, history.iterator(chunk_size=2000))
+
+            segment = ArchiveSegment.objects.create(
+                period_start=start,
+                period_end=end,
+                transactions_file=transactions_file,
+                history_file=history_file,
+                transaction_count=transaction_count,
+                history_count=history_count,
+            )
+            period = {}
+            for row in rows:
+                totals = period.setdefault(row["cash_box_id"], [0, 0, 0])
+                totals[0 if row["type"] == "recette" else 1] += row["amount"]
+                totals[2] += 1
+            BalanceSnapshot.objects.bulk_create([
+                BalanceSnapshot(
+                    segment=segment,
+                    cash_box_id=box,
+                    total_recettes=recettes,
+                    total_depenses=depenses,
+                    transaction_count=count,
+                    closing_balance=closing[box][0] - abs(closing[box][1]),
+                )
+                for box, (recettes, depenses, count) in period.items()
+            ])
+
+            for model in partitioning.PARTITIONED_MODELS:
+                _remove_rows(model, first_day, start, end)
+    except BaseException:
+        for path in written:
+            path.unlink(missing_ok=True)
+        raise
+    return segment
+
+
+def archive_cutoff():
+    """End of the archived periods: every hot row is newer. None when nothing is archived"""
+    return ArchiveSegment.objects.aggregate(end=Max("period_end"))["end"]
+
+
+def parse_bound(value, end=False):
+    """Aware datetime of a date / datetime query param (a date ``end`` covers the whole day)"""
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+        moment = datetime.combine(day, time.max if end else time.min) if day else parse_datetime(value)
+    except ValueError:
+        return None
+    if moment is None:
+        return None
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+def archive_requested(params, date_from):
+    """
+    True when a read should include archived rows: ``?archived=true``, or a
+    ``date_from`` before the archive cutoff. Costs no query unless one of
+    them is given.
+    """
+    explicit = params.get("archived", "false").lower() == "true"
+    start = parse_bound(date_from)
+    if not explicit and start is None:
+        return False
+    cutoff = archive_cutoff()
+    return cutoff is not None and (explicit or start < cutoff)
+
+
+def overlapping_segments(start=None, end=None):
+    """Archive segments holding rows created within [start, end], newest first"""
+    segments = ArchiveSegment.objects.order_by("-period_start")
+    if start is not None:
+        segments = segments.filter(period_end__gt=start)
+    if end is not None:
+        segments = segments.filter(period_start__lte=end)
+    return segments
+
+
+def segment_rows(segment, kind, start=None, end=None):
+    """The "transactions" or "history" rows of one segment created within [start, end], newest first"""
+    path = Path(settings.ARCHIVE_ROOT) / (segment.transactions_file if kind == "transactions" else segment.history_file)
+    rows = [
+        row for row in read_rows(path)
+        if (start is None or row["created_at"] >= start) and (end is None or row["created_at"] <= end)
+    ]
+    rows.reverse()
+    return rows
+
+
+def archived_rows(kind, start=None, end=None):
+    """
+    Archived "transactions" or "history" rows with created_at within
+    [start, end], newest first, reading only the overlapping segments.
+    """
+    for segment in overlapping_segments(start, end):
+        yield from segment_rows(segment, kind, start, end)
+
+
+class ArchivedRows:
+    """
+    Archived rows of a list request (``archived_rows`` restricted by ``keep``)
+    as a sequence read lazily: segments are decompressed one at a time, newest
+    first, only as far as the rows asked for, so the first pages only open the
+    newest files. A request may cover at most ARCHIVE_MAX_SEGMENTS segments.
+    """
+
+    def __init__(self, kind, start=None, end=None, keep=None):
+        self.kind, self.start, self.end, self.keep = kind, start, end, keep
+        self.segments = list(overlapping_segments(start, end))
+        if len(self.segments) > settings.ARCHIVE_MAX_SEGMENTS:
+            raise ArchiveError(
+                f"La période demandée couvre {len(self.segments)} mois archivés, "
+                f"{settings.ARCHIVE_MAX_SEGMENTS} au plus : préciser date_from et date_to"
+            )
+        self.read = 0
+        self.rows = []
+
+    def read_until(self, count=None):
+        """Read segments until ``count`` rows are loaded (all of them by default)"""
+        while self.read < len(self.segments) and (count is None or len(self.rows) < count):
+            rows = segment_rows(self.segments[self.read], self.kind, self.start, self.end)
+            self.rows.extend(rows if self.keep is None else filter(self.keep, rows))
+            self.read += 1
+
+    def estimated_count(self):
+        """
+        (count, is_estimate) without reading more segments: the rows read so
+        far plus the stored row counts of the unread segments. Exact when no
+        filter applies and those segments lie within the date range.
+        """
+        unread = self.segments[self.read:]
+        field = "transaction_count" if self.kind == "transactions" else "history_count"
+        exact = self.keep is None and all(
+            (self.start is None or segment.period_start >= self.start)
+            # period_end is exclusive, end inclusive
+            and (self.end is None or segment.period_end <= self.end + timedelta(microseconds=1))
+            for segment in unread
+        )
+        return len(self.rows) + sum(getattr(segment, field) for segment in unread), not exact
+
+    def __len__(self):
+        self.read_until()
+        return len(self.rows)
+
+    def __iter__(self):
+        self.read_until()
+        return iter(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            self.read_until(index.stop)
+        else:
+            self.read_until(index + 1)
+        return self.rows[index]
+
+
+class WithArchive:
+    """
+    Hot rows followed by (older) archived rows, as one sequence the
+    paginators can count and slice: the hot queryset is counted and sliced
+    in SQL and only the archived rows of the requested page are read and
+    converted.
+    """
+
+    def __init__(self, hot, archived, convert=list):
+        self.hot = hot
+        self.archived = archived
+        self.convert = convert
+        self.hot_count = None
+
+    def count_hot(self):
+        if self.hot_count is None:
+            self.hot_count = self.hot.count()
+        return self.hot_count
+
+    def count(self):
+        return self.count_hot() + len(self.archived)
+
+    def count_rows(self, exact=False):
+        """(count, is_estimate) for EstimatedCountPaginator: archived rows are estimated unless ``exact``"""
+        if exact or not isinstance(self.archived, ArchivedRows):
+            return self.count(), False
+        archived, is_estimate = self.archived.estimated_count()
+        return self.count_hot() + archived, is_estimate
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        hot_count = self.count_hot()
+        start, stop = index.start or 0, index.stop
+        hot = list(self.hot[start:hot_count if stop is None else min(stop, hot_count)]) if start < hot_count else []
+        archived = self.archived[max(start - hot_count, 0):None if stop is None else max(stop - hot_count, 0)]
+        return hot + (self.convert(archived) if archived else [])
@@ -0,0 +1,239 @@
+"""
+Async versions of the read-only statistics endpoints, served when
+ASYNC_READ_VIEWS is enabled (see transactions/urls.py).
+
+The payloads are the same as the DRF views in views.py. The queries of a
+view are awaited one after the other: Django runs the async ORM in its single
+thread-sensitive executor, so gathering them with asyncio would not overlap
+them (each ASGI request has its own executor thread, so separate requests
+do). What saves round trips is merging the queries over the same rows: the
+totals per type and the row count come from one conditional aggregate.
+"""
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from cash_track_api.asyncapi import async_api_view, fetch_all
+from cash_track_api.db_router import reads_from_replica
+from cash_track_api.diagnostics import explainable
+from . import archive
+from .models import BalanceSnapshot, CashBoxBalance, Transaction
+from .pagination import wants_exact_count
+from .serializers import TransactionHistorySerializer
+from .views import (
+    HISTORY_COUNTS,
+    add_archived_history,
+    archived_analytics,
+    archived_history,
+    history_instances,
+    filter_history_queryset,
+    for_cash_box,
+    selected_cash_box,
+    history_amount_totals,
+    history_counts,
+    history_unique_users,
+    history_serializer_context,
+    history_page,
+    history_response_data,
+    wants_full_history,
+)
+
+
+def type_totals(queryset, within=None, **aggregates):
+    """
+    Awaitable of the {"recettes", "depenses"} sums of the queryset rows
+    matching ``within`` (all by default), and of ``aggregates``, in a single query
+    """
+    within = within or Q()
+    return queryset.aaggregate(
+        recettes=Sum("amount", filter=within & Q(type="recette")),
+        depenses=Sum("amount", filter=within & Q(type="depense")),
+        **aggregates,
+    )
+
+
+def balance_totals(cash_box_id):
+    """Awaitable of the same {"recettes", "depenses"} sums, read from the cash box balance rows"""
+    return for_cash_box(CashBoxBalance.objects.all(), cash_box_id).aaggregate(
+        recettes=Sum("total_recettes"),
+        depenses=Sum("total_depenses"),
+    )
+
+
+async def history_stats_counts(queryset, exact):
+    """Awaitable of ``views.history_counts``: the aggregate stays async unless estimates are enabled"""
+    if exact or not settings.COUNT_ESTIMATE_THRESHOLD:
+        return await queryset.aaggregate(**HISTORY_COUNTS), False
+    return await sync_to_async(history_counts)(queryset, exact)
+
+
+@async_api_view
+async def dashboard_stats_view(request):
+    """Get dashboard statistics"""
+    today_start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    today_end = timezone.now().replace(hour=23, minute=59, second=59, microsecond=999999)
+    cash_box_id = selected_cash_box(request.query_params)
+    transactions = for_cash_box(Transaction.objects.all(), cash_box_id)
+
+    # Today's sums and the count in one pass over the box's transactions
+    today = await type_totals(
+        transactions, Q(created_at__gte=today_start, created_at__lte=today_end), count=Count("pk")
+    )
+    overall = await balance_totals(cash_box_id)
+
+    total_recettes = overall["recettes"] or 0
+    total_depenses = abs(overall["depenses"] or 0)
+    transaction_count = today["count"] + await sync_to_async(BalanceSnapshot.archived_count)(cash_box_id)
+
+    return {
+        "current_balance": float(total_recettes - total_depenses),
+        "total_recettes": float(total_recettes),
+        "total_depenses": float(total_depenses),
+        "transaction_count": transaction_count,
+        "today_recettes": float(today["recettes"] or 0),
+        "today_depenses": float(abs(today["depenses"] or 0)),
+    }
+
+
+@async_api_view
+@reads_from_replica
+@explainable
+async def analytics_view(request):
+    """Get detailed analytics data for charts"""
+    date_from = request.query_params.get("date_from")
+    date_to = request.query_params.get("date_to")
+
+    # Default to last 30 days if no date range provided
+    if not date_from or not date_to:
+        end_date = timezone.now()
+        start_date = end_date - timedelta(days=30)
+        date_from = start_date.isoformat()
+        date_to = end_date.isoformat()
+
+    cash_box_id = selected_cash_box(request.query_params)
+    queryset = for_cash_box(Transaction.objects.all(), cash_box_id).filter(
+        created_at__gte=date_from, created_at__lte=date_to
+    )
+
+    transactions = await fetch_all(queryset.values("created_at", "type", "amount"))
+    category_stats = await fetch_all(
+        queryset.values("category__name", "category__color", "type").annotate(total=Sum("amount"))
+    )
+    totals = await type_totals(queryset, count=Count("pk"))
+    overall = await balance_totals(cash_box_id)
+    transaction_count = totals["count"]
+
+    # Archived transactions, only when the range reaches back into the archive
+    archived, archived_categories, archived_recettes, archived_depenses = await sync_to_async(archived_analytics)(
+        request.query_params, cash_box_id
+    )
+    transactions += archived
+    category_stats += archived_categories
+    transaction_count += len(archived)
+
+    # Daily data for area chart (grouped by created_at date)
+    daily_data = {}
+    for txn in transactions:
+        date_str = txn["created_at"].date().strftime("%Y-%m-%d")
+        if date_str not in daily_data:
+            daily_data[date_str] = {"date": date_str, "recettes": 0, "depenses": 0}
+
+        if txn["type"] == "recette":
+            daily_data[date_str]["recettes"] += float(txn["amount"])
+        else:
+            daily_data[date_str]["depenses"] += abs(float(txn["amount"]))
+
+    area_data = sorted(daily_data.values(), key=lambda x: x["date"])
+
+    # Category distribution for bar chart
+    category_data = {}
+    for stat in category_stats:
+        cat_name = stat["category__name"] or "Non catégorisé"
+        cat_color = stat["category__color"] or "#64748B"
+
+        if cat_name not in category_data:
+            category_data[cat_name] = {
+                "name": cat_name,
+                "color": cat_color,
+                "recettes": 0,
+                "depenses": 0,
+            }
+
+        if stat["type"] == "recette":
+            category_data[cat_name]["recettes"] += float(stat["total"] or 0)
+        else:
+            category_data[cat_name]["depenses"] += abs(float(stat["total"] or 0))
+
+    category_chart_data = []
+    for cat_name, data in category_data.items():
+        total = data["recettes"] + data["depenses"]
+        if total > 0:
+            category_chart_data.append({
+                "name": cat_name,
+                "value": total,
+                "color": data["color"],
+                "recettes": data["recettes"],
+                "depenses": data["depenses"],
+            })
+
+    category_chart_data.sort(key=lambda x: x["value"], reverse=True)
+
+    total_recettes = (totals["recettes"] or 0) + archived_recettes
+    total_depenses = abs((totals["depenses"] or 0) + archived_depenses)
+    current_balance = (overall["recettes"] or 0) - abs(overall["depenses"] or 0)
+
+    profit_margin = 0
+    if total_recettes > 0:
+        profit_margin = ((float(total_recettes) - float(total_depenses)) / float(total_recettes)) * 100
+
+    return {
+        "area_data": area_data,
+        "category_data": category_chart_data,
+        "total_recettes": float(total_recettes),
+        "total_depenses": float(total_depenses),
+        "current_balance": float(current_balance),
+        "transaction_count": transaction_count,
+        "profit_margin": round(profit_margin, 2),
+        "date_from": date_from,
+        "date_to": date_to,
+    }
+
+
+@async_api_view
+@reads_from_replica(when=wants_full_history)
+@explainable
+async def transaction_history_view(request):
+    """Get transaction history (all actions: create, update, delete)"""
+    queryset = filter_history_queryset(request.query_params)
+    serializer_context = history_serializer_context(request)
+
+    counts, count_is_estimate = await history_stats_counts(queryset, wants_exact_count(request.query_params))
+    snapshots = await fetch_all(queryset.values_list("transaction_data", flat=True))
+    unique_users = await fetch_all(history_unique_users(queryset))
+
+    totals = history_amount_totals(snapshots)
+
+    archived = await sync_to_async(archived_history)(request.query_params)
+    if archived is not None:
+        counts, totals, unique_users = await sync_to_async(add_archived_history)(
+            archived, counts, totals, unique_users
+        )
+
+    total_count = counts["total_actions"]
+    page, page_size, start, end = history_page(request.query_params, total_count)
+    history_items = TransactionHistorySerializer.narrow_queryset(
+        queryset, serializer_context["fields"], serializer_context["omit"]
+    )
+    if archived is None:
+        history_items = await fetch_all(history_items[start:end])
+    else:
+        # Archived entries are all older: they follow the hot ones
+        combined = archive.WithArchive(history_items, archived, history_instances)
+        history_items = await sync_to_async(lambda: combined[start:end])()
+    serializer = TransactionHistorySerializer(history_items, many=True, context=serializer_context)
+
+    return history_response_data(
+        serializer.data, total_count, page, page_size, end, counts,
+        totals, unique_users, serializer_context, count_is_estimate,
+    )
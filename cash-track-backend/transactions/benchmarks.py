@@ -0,0 +1,98 @@
+"""
+Helpers shared by the benchmark management commands.
+"""
+import math
+import random
+import time
+from datetime import timedelta
+from django.utils import timezone
+from accounts.models import User
+from categories.models import Category
+from .models import CashBox, CashBoxBalance, Transaction, TransactionHistory, amount_text
+
+
+def best_time(func, repeat):
+    """Return (result, best wall time in seconds) of ``func`` over ``repeat`` runs"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile ``p`` (0-100) of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def seed_synthetic_transactions(count, with_history=False, seed=0):
+    """
+    Insert ``count`` synthetic transactions spread over the past, created by a
+    few bench users in a few bench categories. With ``with_history`` each one
+    also gets its "created" history entry, as the post_save signal would write.
+
+    Meant to be called inside a transaction the caller rolls back.
+    """
+    rng = random.Random(seed)
+    users = [
+        User.objects.create_user(
+            username=f"bench-{i}", email=f"bench-{i}@example.com", password=None, name=f"Bench {i}"
+        )
+        for i in range(5)
+    ]
+    categories = [Category.objects.create(name=f"Bench {i}") for i in range(5)]
+    cash_box = CashBox.get_default()
+    Transaction.objects.bulk_create(
+        [
+            Transaction(
+                type=rng.choice(["recette", "depense"]),
+                amount=rng.randint(100, 1_000_000),
+                description=f"Transaction {i}",
+                category=rng.choice(categories + [None]),
+                cash_box=cash_box,
+                created_by=rng.choice(users),
+                modified_by=rng.choice(users + [None]),
+            )
+            for i in range(count)
+        ],
+        batch_size=1000,
+    )
+
+    # auto_now_add ignores explicit values: spread created_at afterwards
+    now = timezone.now()
+    transactions = list(Transaction.objects.select_related("category").order_by("id"))
+    for offset, txn in enumerate(transactions):
+        txn.created_at = now - timedelta(minutes=offset * 5)
+    Transaction.objects.bulk_update(transactions, ["created_at"], batch_size=1000)
+    # bulk_create sends no post_save: refresh the balance row
+    CashBoxBalance.refresh([cash_box.pk])
+
+    if with_history:
+        TransactionHistory.objects.bulk_create(
+            [
+                TransactionHistory(
+                    transaction_id=txn.id,
+                    cash_box_id=txn.cash_box_id,
+                    action="created",
+                    transaction_data={
+                        "type": txn.type,
+                        "description": txn.description,
+                        "amount": amount_text(txn.amount),
+                        "ref": txn.ref,
+                        "exporter_fournisseur": txn.exporter_fournisseur,
+                        "category_id": txn.category_id,
+                        "category_name": txn.category.name if txn.category else None,
+                    },
+                    performed_by_id=txn.created_by_id,
+                )
+                for txn in transactions
+            ],
+            batch_size=1000,
+        )
+    return transactions
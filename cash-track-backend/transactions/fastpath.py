@@ -0,0 +1,175 @@
+"""
+Read-only fast path for transaction lists.
+
+Builds exactly the same rows as ``TransactionSerializer`` straight from a
+``values()`` query. The field converters are taken from the serializers
+themselves and compiled once, so a page no longer goes through the
+per-instance ModelSerializer machinery, and balances are computed for the
+whole page with two queries instead of one aggregate per row.
+Archived rows (see archive.py) are rendered the same way by ``archived_values``.
+"""
+from django.contrib.auth import get_user_model
+from accounts.serializers import UserSerializer
+from cash_track_api.metrics import timed_serialization
+from categories.models import Category
+from categories.serializers import CategorySerializer
+from .models import page_balances
+from .serializers import TransactionSerializer
+
+# Nested fields and the converter set used to render them
+NESTED_FIELDS = {"category": "category", "created_by": "user", "modified_by": "user"}
+
+DELETED_USER = {
+    "id": None,
+    "email": None,
+    "name": None,
+    "role": None,
+    "status": None,
+    "created_at": None,
+    "is_superuser": False,
+}
+
+_compiled = None
+
+
+def _readable_converters(serializer):
+    """Return [(field_name, to_representation)] for the serializer's readable fields"""
+    return [
+        (name, field.to_representation)
+        for name, field in serializer.fields.items()
+        if not field.write_only
+    ]
+
+
+def compile_converters():
+    """Build (once) the per-field converters used by the fast path"""
+    global _compiled
+    if _compiled is None:
+        _compiled = {
+            "transaction": _readable_converters(TransactionSerializer()),
+            "category": _readable_converters(CategorySerializer()),
+            "user": _readable_converters(UserSerializer()),
+        }
+    return _compiled
+
+
+def _convert(row, prefix, converters):
+    """Render one nested object from prefixed ``values()`` columns"""
+    data = {}
+    for name, convert in converters:
+        value = row[prefix + name]
+        data[name] = None if value is None else convert(value)
+    return data
+
+
+def _value_columns(field_names, converters):
+    """Columns the ``values()`` query has to load for the selected fields"""
+    columns = ["id", "created_at", "type", "amount", "cash_box_id"]
+    for name in field_names:
+        if name in NESTED_FIELDS:
+            columns.extend(f"{name}__{nested}" for nested, _ in converters[NESTED_FIELDS[name]])
+        elif name != "balance":
+            columns.append(name)
+    return list(dict.fromkeys(columns))
+
+
+def _selected_plan(fields, omit):
+    """[(field_name, converter)] of the transaction fields to render, in serializer order"""
+    converters = compile_converters()
+    selected = TransactionSerializer.selected_field_names(fields, omit)
+    return [
+        (name, convert)
+        for name, convert in converters["transaction"]
+        if selected is None or name in selected
+    ]
+
+
+def values_queryset(queryset, fields=None, omit=None):
+    """Turn a transaction queryset into the ``values()`` query the fast path reads"""
+    field_names = [name for name, _ in _selected_plan(fields, omit)]
+    columns = _value_columns(field_names, compile_converters())
+    return queryset.select_related(None).values(*columns)
+
+
+@timed_serialization
+def serialize_rows(rows, fields=None, omit=None, included_users=None):
+    """
+    Render rows from ``values_queryset`` to the same list of dicts as
+    ``TransactionSerializer(..., many=True).data``.
+
+    ``fields`` / ``omit`` and ``included_users`` behave like the serializer
+    context keys of the same name.
+    """
+    converters = compile_converters()
+    plan = _selected_plan(fields, omit)
+    rows = list(rows)
+    # Archived rows carry their own balance
+    balances = page_balances([row for row in rows if "balance" not in row]) if any(name == "balance" for name, _ in plan) else {}
+
+    users = {}
+    results = []
+    for row in rows:
+        data = {}
+        for name, convert in plan:
+            if name == "category":
+                data[name] = None if row["category__id"] is None else _convert(row, "category__", converters["category"])
+            elif name in ("created_by", "modified_by"):
+                user_id = row[name + "__id"]
+                if user_id is None:
+                    data[name] = DELETED_USER.copy() if name == "created_by" and included_users is None else None
+                    continue
+                if user_id not in users:
+                    users[user_id] = _convert(row, name + "__", converters["user"])
+                if included_users is not None:
+                    included_users.setdefault(str(user_id), users[user_id])
+                    data[name] = user_id
+                else:
+                    data[name] = users[user_id]
+            elif name == "balance":
+                if "balance" in row:
+                    data[name] = row["balance"]
+                    continue
+                balance = balances[row["cash_box_id"], row["created_at"]]
+                if row["type"] == "recette":
+                    balance += row["amount"]
+                else:
+                    balance -= abs(row["amount"])
+                data[name] = float(balance)
+            else:
+                value = row[name]
+                data[name] = None if value is None else convert(value)
+        results.append(data)
+    return results
+
+
+def archived_values(rows, fields=None, omit=None):
+    """
+    Archived transaction rows (see archive.py) in the shape of
+    ``values_queryset`` rows, with their stored balance, for ``serialize_rows``.
+    Categories and users still in the database are loaded in two queries.
+    """
+    columns = _value_columns([name for name, _ in _selected_plan(fields, omit)], compile_converters())
+    categories = Category.objects.in_bulk({row["category_id"] for row in rows if row["category_id"]})
+    users = get_user_model().objects.in_bulk(
+        {row[key] for row in rows for key in ("created_by_id", "modified_by_id") if row[key]}
+    )
+    related = {"category": (categories, "category_id"), "created_by": (users, "created_by_id"),
+               "modified_by": (users, "modified_by_id")}
+    results = []
+    for row in rows:
+        data = {"balance": row["balance"]}
+        for column in columns:
+            relation, _, attribute = column.partition("__")
+            if not attribute:
+                data[column] = row[column]
+                continue
+            objects, key = related[relation]
+            instance = objects.get(row[key])
+            data[column] = None if instance is None else getattr(instance, attribute)
+        results.append(data)
+    return results
+
+
+def serialize_transactions(queryset, fields=None, omit=None, included_users=None):
+    """Fast-path equivalent of ``TransactionSerializer(queryset, many=True).data``"""
+    return serialize_rows(values_queryset(queryset, fields, omit), fields, omit, included_users)
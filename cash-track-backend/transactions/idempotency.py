@@ -0,0 +1,116 @@
+"""
+Idempotency keys for the transaction writes (create, update, delete).
+
+A client that may retry a write (timeout, dropped connection, 401 refresh)
+sends the same ``Idempotency-Key`` header with every attempt. The first
+attempt claims the key in the idempotency_keys table, in the same database
+transaction as the write, and stores the response once it succeeds. Later
+attempts with that key, for IDEMPOTENCY_KEY_TTL seconds, get the stored
+response back (``Idempotent-Replayed: true``) from a single lookup instead
+of writing again.
+
+The (user, key) unique constraint settles concurrent attempts: on
+PostgreSQL the second INSERT waits for the first transaction, then fails
+and replays its response (or claims the key if the first one rolled back).
+A key reused for another request (method, path or body) is refused with a
+422, an attempt still running elsewhere with a 409. Requests without the
+header are not affected.
+
+Expired keys of other requests are left in the table until
+``manage.py purge_idempotency_keys`` (cron) deletes them.
+"""
+import functools
+import hashlib
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field("key").max_length
+
+
+class IdempotencyKeyInProgress(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Une requête avec cette clé d'idempotence est en cours de traitement."
+    default_code = "idempotency_key_in_progress"
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "Cette clé d'idempotence a déjà été utilisée pour une autre requête."
+    default_code = "idempotency_key_reused"
+
+
+def request_fingerprint(request):
+    """sha256 of the method, path (with query string) and body of a request"""
+    digest = hashlib.sha256()
+    for part in (request.method.encode(), request.get_full_path().encode(), request.body):
+        digest.update(part)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def replay(stored, fingerprint):
+    """The stored response of a key, for a retry of the same request"""
+    if stored.fingerprint != fingerprint:
+        raise IdempotencyKeyReused()
+    if stored.status_code is None:
+        raise IdempotencyKeyInProgress()
+    return Response(stored.response, status=stored.status_code, headers={"Idempotent-Replayed": "true"})
+
+
+def purge_expired_keys():
+    """Delete every expired key; returns how many were deleted"""
+    return IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()[0]
+
+
+def idempotent(view_method):
+    """Honour the ``Idempotency-Key`` header on a write view method (see module docstring)"""
+
+    @functools.wraps(view_method)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view_method(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            raise ValidationError({"detail": f"L'en-tête {HEADER} ne doit pas dépasser {MAX_KEY_LENGTH} caractères."})
+
+        fingerprint = request_fingerprint(request)
+        now = timezone.now()
+        keys = IdempotencyKey.objects.filter(user=request.user, key=key)
+        # Retry of a completed request: one lookup, no write
+        stored = keys.filter(expires_at__gt=now).first()
+        if stored is not None:
+            return replay(stored, fingerprint)
+
+        with transaction.atomic():
+            # Frees this key if it had expired (purge_expired_keys removes the others)
+            keys.filter(expires_at__lte=now).delete()
+            try:
+                with transaction.atomic():
+                    claim = IdempotencyKey.objects.create(
+                        user=request.user, key=key, fingerprint=fingerprint,
+                        expires_at=now + timezone.timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+                    )
+            except IntegrityError:
+                # Claimed by a concurrent attempt, committed in the meantime
+                stored = keys.first()
+                if stored is None:
+                    raise IdempotencyKeyInProgress()
+                return replay(stored, fingerprint)
+
+            # An exception rolls the claim back with the write
+            response = view_method(request, *args, **kwargs)
+            if status.is_success(response.status_code):
+                claim.status_code = response.status_code
+                claim.response = response.data
+                claim.save(update_fields=["status_code", "response"])
+            else:
+                claim.delete()
+        return response
+
+    return wrapper
@@ -0,0 +1,92 @@
+"""
+Move closed months of transactions and history to the cold archive
+(see transactions/archive.py).
+
+    python manage.py archive_ledger --older-than 12     # cron, e.g. monthly
+    python manage.py archive_ledger --older-than 12 --dry-run
+    python manage.py archive_ledger --list
+
+Months are archived oldest first, one transaction per month, and only when
+they ended more than ``--older-than`` months before the current one.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, Min
+from django.utils import timezone
+from transactions import archive, partitioning
+from transactions.models import ArchiveSegment, Transaction, TransactionHistory
+
+
+class Command(BaseCommand):
+    help = "Archive the transactions and history of closed months into compressed files"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than", type=int, default=12,
+                            help="Keep this many months before the current one in the hot tables")
+        parser.add_argument("--dry-run", action="store_true", help="Only list the months that would be archived")
+        parser.add_argument("--list", action="store_true", help="Only list the archived periods")
+
+    def handle(self, *args, **options):
+        if options["list"]:
+            self.list_segments()
+            return
+
+        limit = partitioning.period_start(timezone.localdate(), "month")
+        for _ in range(max(options["older_than"], 0)):
+            limit = self.previous_month(limit)
+
+        month = self.oldest_month()
+        archived = 0
+        while month is not None and month < limit:
+            if options["dry_run"]:
+                self.stdout.write(f"{month:%Y-%m}: {self.month_counts(month)}")
+            else:
+                try:
+                    segment = archive.archive_period(month)
+                except archive.ArchiveError as error:
+                    raise CommandError(str(error))
+                self.stdout.write(
+                    f"{month:%Y-%m}: {segment.transaction_count} transactions, "
+                    f"{segment.history_count} entrées d'historique archivées"
+                )
+            archived += 1
+            month = partitioning.next_period(month, "month")
+        if not archived:
+            self.stdout.write(f"Rien à archiver avant {limit:%Y-%m}")
+
+    @staticmethod
+    def previous_month(start):
+        return start.replace(year=start.year - 1, month=12) if start.month == 1 else start.replace(month=start.month - 1)
+
+    @staticmethod
+    def oldest_month():
+        """First month holding hot rows, or None"""
+        oldest = [
+            model.objects.aggregate(oldest=Min("created_at"))["oldest"]
+            for model in partitioning.PARTITIONED_MODELS
+        ]
+        oldest = [moment for moment in oldest if moment is not None]
+        if not oldest:
+            return None
+        return partitioning.period_start(timezone.localtime(min(oldest)).date(), "month")
+
+    @staticmethod
+    def month_counts(month):
+        start = partitioning.bound(month)
+        end = partitioning.bound(partitioning.next_period(month, "month"))
+        transactions = Transaction.objects.filter(created_at__gte=start, created_at__lt=end).count()
+        history = TransactionHistory.objects.filter(created_at__gte=start, created_at__lt=end).count()
+        return f"{transactions} transactions, {history} entrées d'historique"
+
+    def list_segments(self):
+        root = settings.ARCHIVE_ROOT
+        for segment in ArchiveSegment.objects.annotate(boxes=Count("snapshots")):
+            size = sum(
+                (root / name).stat().st_size
+                for name in (segment.transactions_file, segment.history_file)
+                if (root / name).exists()
+            )
+            self.stdout.write(
+                f"{segment}: {segment.transaction_count} transactions, {segment.history_count} entrées"
+                f" d'historique, {segment.boxes} caisses, {size / 1024:.0f} Ko"
+            )
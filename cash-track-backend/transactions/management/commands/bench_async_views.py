@@ -0,0 +1,105 @@
+"""
+Benchmark the async statistics endpoints against their DRF (sync) versions.
+
+Every endpoint is called ``--requests`` times with ``--concurrency`` requests
+in flight, with a real bearer token so authentication is part of the
+measurement. Sync views are driven through sync_to_async, the way Django runs
+them under ASGI. Synthetic rows are created inside a transaction that is
+rolled back, so the command never changes the database.
+
+This runs in-process with a single database connection: it measures the
+per-request cost of each version, not the gain from overlapping I/O that a
+real ASGI server with a network database gets.
+"""
+import asyncio
+import time
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.management.base import BaseCommand
+from django.db import transaction as db_transaction
+from django.test import AsyncRequestFactory, RequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+from categories import views as category_views, async_views as category_async_views
+from transactions import views, async_views
+from transactions.benchmarks import percentile, seed_synthetic_transactions
+
+ENDPOINTS = [
+    ("dashboard-stats", views.dashboard_stats_view, async_views.dashboard_stats_view, "/api/transactions/dashboard-stats/"),
+    ("analytics", views.analytics_view, async_views.analytics_view, "/api/transactions/analytics/"),
+    ("category-stats", category_views.category_stats_view, category_async_views.category_stats_view, "/api/categories/stats/"),
+    ("history", views.transaction_history_view, async_views.transaction_history_view, "/api/transactions/history/"),
+]
+
+
+class Command(BaseCommand):
+    help = "Compare p50/p99 latency of the async statistics views with the sync DRF views"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=5000, help="Synthetic transactions (and history entries)")
+        parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint and mode")
+        parser.add_argument("--concurrency", type=int, default=10, help="Requests in flight")
+        parser.add_argument(
+            "--endpoints",
+            default=",".join(name for name, *_ in ENDPOINTS),
+            help="Comma-separated subset of: " + ", ".join(name for name, *_ in ENDPOINTS),
+        )
+
+    def handle(self, *args, **options):
+        selected = {name.strip() for name in options["endpoints"].split(",")}
+        with db_transaction.atomic():
+            transactions = seed_synthetic_transactions(options["rows"], with_history=True)
+            headers = {"Authorization": f"Bearer {AccessToken.for_user(transactions[0].created_by)}"}
+
+            self.stdout.write(f"{'endpoint':<16} {'mode':<6} {'p50 ms':>8} {'p99 ms':>8} {'req/s':>8}")
+            for name, sync_view, async_view, url in ENDPOINTS:
+                if name not in selected:
+                    continue
+                for mode, call in (
+                    ("sync", self.sync_caller(sync_view, url, headers)),
+                    ("async", self.async_caller(async_view, url, headers)),
+                ):
+                    latencies, elapsed = async_to_sync(self.run_load)(
+                        call, options["requests"], options["concurrency"]
+                    )
+                    self.stdout.write(
+                        f"{name:<16} {mode:<6} {percentile(latencies, 50) * 1000:>8.2f} "
+                        f"{percentile(latencies, 99) * 1000:>8.2f} {len(latencies) / elapsed:>8.1f}"
+                    )
+            db_transaction.set_rollback(True)
+
+    @staticmethod
+    def sync_caller(view, url, headers):
+        factory = RequestFactory()
+
+        def call():
+            response = view(factory.get(url, headers=headers))
+            response.render()
+            return response
+
+        return sync_to_async(call)
+
+    @staticmethod
+    def async_caller(view, url, headers):
+        factory = AsyncRequestFactory()
+
+        async def call():
+            return await view(factory.get(url, headers=headers))
+
+        return call
+
+    @staticmethod
+    async def run_load(call, requests, concurrency):
+        """Return (sorted latencies, total wall time) of ``requests`` calls"""
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def one():
+            async with semaphore:
+                start = time.perf_counter()
+                response = await call()
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    raise RuntimeError(f"HTTP {response.status_code}: {response.content[:200]!r}")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        return sorted(latencies), time.perf_counter() - start
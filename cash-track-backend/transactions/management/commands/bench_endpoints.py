@@ -0,0 +1,278 @@
+"""
+Benchmark every API endpoint of transactions/urls.py, categories/urls.py and
+accounts/urls.py against the current database and write the results as JSON.
+
+Run ``manage.py seed_bench`` first: requests are made as the bench admin, in
+process, through Django's test client. Everything runs inside a transaction
+that is rolled back, so creates, updates and deletes leave no trace.
+
+    python manage.py bench_endpoints --iterations 50 --output run.json
+    python manage.py bench_endpoints --compare run.json
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction as db_transaction
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.module_loading import import_module
+from rest_framework_simplejwt.tokens import RefreshToken
+from accounts.models import User
+from categories.models import Category
+from transactions.benchmarks import percentile
+from transactions.models import CashBox, Transaction, TransactionHistory
+from transactions.seeding import BENCH_PASSWORD, bench_email, bench_users
+
+URLCONFS = ["transactions.urls", "categories.urls", "accounts.urls"]
+NEW_PASSWORD = "Bench-Password-2024!"
+
+
+class Scenario:
+    """One request type; kwargs/query/body/auth are values or ``f(ctx, i)``"""
+
+    def __init__(self, name, url_name, method="GET", kwargs=None, query="", body=None, auth="admin"):
+        self.name = name
+        self.url_name = url_name
+        self.method = method
+        self.kwargs = kwargs
+        self.query = query
+        self.body = body
+        self.auth = auth
+
+    @staticmethod
+    def _value(value, ctx, i):
+        return value(ctx, i) if callable(value) else value
+
+    def request(self, client, ctx, i):
+        path = reverse(self.url_name, kwargs=self._value(self.kwargs, ctx, i))
+        query = self._value(self.query, ctx, i)
+        if query:
+            path = f"{path}?{query}"
+        body = self._value(self.body, ctx, i)
+        headers = {}
+        auth = self._value(self.auth, ctx, i)
+        if auth:
+            headers["Authorization"] = f"Bearer {ctx['access'] if auth == 'admin' else auth}"
+        return client.generic(
+            self.method, path,
+            json.dumps(body) if body is not None else "",
+            content_type="application/json",
+            headers=headers,
+        )
+
+
+SCENARIOS = [
+    # transactions/urls.py
+    Scenario("transactions list", "transaction-list-create", query=lambda ctx, i: f"page={i % 5 + 1}"),
+    Scenario("transactions list filtered", "transaction-list-create",
+             query=lambda ctx, i: f"type=depense&category={ctx['category']}&amount_min=10000"),
+    Scenario("transaction create", "transaction-list-create", "POST",
+             body=lambda ctx, i: {"type": "depense", "amount": "1500.00", "category_id": ctx["category"],
+                                  "description": f"Bench {i}"}),
+    Scenario("transaction detail", "transaction-detail", kwargs=lambda ctx, i: {"pk": ctx["transactions"][0]}),
+    Scenario("transaction update", "transaction-detail", "PATCH",
+             kwargs=lambda ctx, i: {"pk": ctx["transactions"][0]}, body=lambda ctx, i: {"amount": f"{1000 + i}.00"}),
+    Scenario("transaction delete", "transaction-detail", "DELETE",
+             kwargs=lambda ctx, i: {"pk": ctx["transactions"][i + 1]}),
+    Scenario("transaction stats", "transaction-stats"),
+    Scenario("dashboard stats", "dashboard-stats"),
+    Scenario("analytics", "transaction-analytics"),
+    Scenario("history", "transaction-history"),
+    Scenario("cash boxes list", "cash-box-list-create"),
+    Scenario("cash box create", "cash-box-list-create", "POST", body=lambda ctx, i: {"name": f"Caisse {ctx['run']}-{i}"}),
+    Scenario("cash box detail", "cash-box-detail", kwargs=lambda ctx, i: {"pk": ctx["cash_box"]}),
+    Scenario("cash box update", "cash-box-detail", "PATCH",
+             kwargs=lambda ctx, i: {"pk": ctx["cash_box"]}, body=lambda ctx, i: {"description": f"Bench {i}"}),
+    Scenario("cash box delete", "cash-box-detail", "DELETE", kwargs=lambda ctx, i: {"pk": ctx["spare_cash_boxes"][i]}),
+    # categories/urls.py
+    Scenario("categories list", "category-list-create"),
+    Scenario("category create", "category-list-create", "POST", body=lambda ctx, i: {"name": f"Bench run {ctx['run']}-{i}"}),
+    Scenario("category detail", "category-detail", kwargs=lambda ctx, i: {"pk": ctx["category"]}),
+    Scenario("category update", "category-detail", "PATCH",
+             kwargs=lambda ctx, i: {"pk": ctx["category"]}, body=lambda ctx, i: {"icon": f"Icon{i}"}),
+    Scenario("category delete", "category-detail", "DELETE", kwargs=lambda ctx, i: {"pk": ctx["spare_categories"][i]}),
+    Scenario("category stats", "category-stats"),
+    # accounts/urls.py
+    Scenario("login", "login", "POST", body={"email": bench_email(2), "password": BENCH_PASSWORD}, auth=None),
+    Scenario("refresh", "refresh", "POST", body=lambda ctx, i: {"refresh": ctx["refresh_tokens"][i]}, auth=None),
+    Scenario("logout", "logout", "POST", body=lambda ctx, i: {"refresh": ctx["logout_tokens"][i][0]},
+             auth=lambda ctx, i: ctx["logout_tokens"][i][1]),
+    Scenario("current user", "current-user"),
+    Scenario("users list", "user-list-create"),
+    Scenario("user create", "user-list-create", "POST",
+             body=lambda ctx, i: {"email": f"new-{ctx['run']}-{i}@bench.cashtrack", "password": NEW_PASSWORD,
+                                  "name": f"New {i}", "role": "user"}),
+    Scenario("user detail", "user-detail", kwargs=lambda ctx, i: {"pk": ctx["user"]}),
+    Scenario("user update", "user-detail", "PATCH",
+             kwargs=lambda ctx, i: {"pk": ctx["user"]}, body=lambda ctx, i: {"name": f"Bench {i}"}),
+    Scenario("user delete", "user-detail", "DELETE", kwargs=lambda ctx, i: {"pk": ctx["spare_users"][i]}),
+    Scenario("change password", "user-change-password", "POST",
+             kwargs=lambda ctx, i: {"pk": ctx["user"]}, body={"password": NEW_PASSWORD}),
+    Scenario("toggle status", "user-toggle-status", "POST", kwargs=lambda ctx, i: {"pk": ctx["user"]}),
+]
+
+
+class Command(BaseCommand):
+    help = "Measure latency and throughput of every API endpoint on the seeded dataset, as JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20, help="Measured requests per endpoint")
+        parser.add_argument("--warmup", type=int, default=2, help="Unmeasured requests per endpoint")
+        parser.add_argument("--only", default="", help="Only scenarios whose name contains this text")
+        parser.add_argument("--output", help="JSON results file (default: bench_results/endpoints-<time>.json)")
+        parser.add_argument("--compare", help="Previous results file to compare p50 latencies with")
+
+    def handle(self, *args, **options):
+        admin = bench_users().filter(role="admin").first()
+        if admin is None:
+            raise CommandError("Aucune donnée de benchmark : lancer d'abord `manage.py seed_bench`")
+
+        self.check_coverage()
+        scenarios = [scenario for scenario in SCENARIOS if options["only"] in scenario.name]
+        runs = options["warmup"] + options["iterations"]
+        results = []
+        with db_transaction.atomic():
+            ctx = self.prepare(admin, runs)
+            client = Client()
+            self.stdout.write(f"{'endpoint':<28} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'req/s':>8} {'errors':>7}")
+            for scenario in scenarios:
+                result = self.run_scenario(client, scenario, ctx, options["warmup"], options["iterations"])
+                results.append(result)
+                self.stdout.write(
+                    f"{scenario.name:<28} {result['p50_ms']:>8.2f} {result['p90_ms']:>8.2f} "
+                    f"{result['p99_ms']:>8.2f} {result['throughput_rps']:>8.1f} {result['errors']:>7}"
+                )
+            db_transaction.set_rollback(True)
+
+        report = {
+            "started_at": ctx["started_at"],
+            "git_commit": self.git_commit(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "settings": {
+                "TRANSACTIONS_FAST_LIST": settings.TRANSACTIONS_FAST_LIST,
+                "ASYNC_READ_VIEWS": settings.ASYNC_READ_VIEWS,
+                "PASSWORD_HASHER": settings.PASSWORD_HASHERS[0],
+            },
+            "dataset": ctx["dataset"],
+            "iterations": options["iterations"],
+            "endpoints": results,
+        }
+        output = options["output"] or os.path.join(
+            "bench_results", f"endpoints-{timezone.now():%Y%m%d-%H%M%S}.json"
+        )
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        with open(output, "w") as target:
+            json.dump(report, target, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
+
+        if options["compare"]:
+            self.compare(options["compare"], results)
+
+    def check_coverage(self):
+        """Warn about URL names of the benchmarked URLconfs that no scenario exercises"""
+        covered = {scenario.url_name for scenario in SCENARIOS}
+        for module in URLCONFS:
+            for pattern in import_module(module).urlpatterns:
+                if pattern.name and pattern.name not in covered:
+                    self.stderr.write(self.style.WARNING(f"{module}: aucun scénario pour {pattern.name}"))
+
+    @staticmethod
+    def prepare(admin, runs):
+        """Ids and tokens the scenarios need, created inside the rolled-back transaction"""
+        run = timezone.now().strftime("%H%M%S")
+        spare_categories = Category.objects.bulk_create([Category(name=f"Spare {run}-{i}") for i in range(runs)])
+        # One by one: each box gets its balance row from the post_save signal
+        spare_cash_boxes = [CashBox.objects.create(name=f"Spare {run}-{i}") for i in range(runs)]
+        spare_users = User.objects.bulk_create([
+            User(username=f"spare-{run}-{i}", email=f"spare-{run}-{i}@bench.cashtrack") for i in range(runs)
+        ])
+        writer = bench_users().filter(role="user").order_by("id").first()
+        logout_tokens = []
+        for _ in range(runs):
+            refresh = RefreshToken.for_user(admin)
+            logout_tokens.append((str(refresh), str(refresh.access_token)))
+        return {
+            "run": run,
+            "started_at": timezone.now().isoformat(),
+            "access": str(RefreshToken.for_user(admin).access_token),
+            "transactions": list(
+                Transaction.objects.order_by("-id").values_list("id", flat=True)[:runs + 1]
+            ),
+            "category": Category.objects.filter(name__endswith="(bench)").order_by("id").first().id,
+            "spare_categories": [category.id for category in spare_categories],
+            "cash_box": CashBox.get_default().pk,
+            "spare_cash_boxes": [box.id for box in spare_cash_boxes],
+            "user": writer.id,
+            "spare_users": [user.id for user in spare_users],
+            "refresh_tokens": [str(RefreshToken.for_user(admin)) for _ in range(runs)],
+            "logout_tokens": logout_tokens,
+            "dataset": {
+                "transactions": Transaction.objects.count(),
+                "history": TransactionHistory.objects.count(),
+                "categories": Category.objects.count() - runs,
+                "users": User.objects.count() - runs,
+            },
+        }
+
+    @staticmethod
+    def run_scenario(client, scenario, ctx, warmup, iterations):
+        latencies = []
+        statuses = {}
+        errors = 0
+        first_error = None
+        for i in range(warmup + iterations):
+            start = time.perf_counter()
+            response = scenario.request(client, ctx, i)
+            elapsed = time.perf_counter() - start
+            if i < warmup:
+                continue
+            latencies.append(elapsed)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+            if response.status_code >= 400:
+                errors += 1
+                first_error = first_error or response.content[:300].decode(errors="replace")
+        latencies.sort()
+        return {
+            "name": scenario.name,
+            "url_name": scenario.url_name,
+            "method": scenario.method,
+            "requests": len(latencies),
+            "errors": errors,
+            "first_error": first_error,
+            "statuses": statuses,
+            "mean_ms": statistics.mean(latencies) * 1000,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p90_ms": percentile(latencies, 90) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "max_ms": latencies[-1] * 1000,
+            "throughput_rps": len(latencies) / sum(latencies),
+        }
+
+    def compare(self, path, results):
+        with open(path) as source:
+            previous = {entry["name"]: entry for entry in json.load(source)["endpoints"]}
+        self.stdout.write(f"\n{'endpoint':<28} {'before':>8} {'after':>8} {'change':>8}")
+        for result in results:
+            before = previous.get(result["name"])
+            if before is None:
+                continue
+            change = (result["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100
+            self.stdout.write(f"{result['name']:<28} {before['p50_ms']:>8.2f} {result['p50_ms']:>8.2f} {change:>+7.1f}%")
+
+    @staticmethod
+    def git_commit():
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,47 @@
+"""
+Benchmark the transaction list serialization: TransactionSerializer vs the
+values()-based fast path, in rows/sec per page size.
+
+Synthetic rows are created inside a transaction that is rolled back, so the
+command never changes the database.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction as db_transaction
+from rest_framework.renderers import JSONRenderer
+from transactions.models import Transaction
+from transactions.serializers import TransactionSerializer
+from transactions.benchmarks import best_time, seed_synthetic_transactions
+from transactions import fastpath
+
+
+class Command(BaseCommand):
+    help = "Compare rows/sec of TransactionSerializer and the list fast path"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=5000, help="Synthetic transactions in the table")
+        parser.add_argument("--page-sizes", default="20,100,1000", help="Comma-separated page sizes")
+        parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (best is kept)")
+        parser.add_argument("--omit", default="", help="Comma-separated fields to leave out, e.g. balance")
+
+    def handle(self, *args, **options):
+        page_sizes = [int(size) for size in options["page_sizes"].split(",")]
+        omit = {name for name in options["omit"].split(",") if name} or None
+        with db_transaction.atomic():
+            seed_synthetic_transactions(options["rows"])
+            self.stdout.write(f"{'page size':>10} {'serializer rows/s':>18} {'fast path rows/s':>17} {'speedup':>8}")
+            for size in page_sizes:
+                queryset = Transaction.objects.select_related("category", "created_by", "modified_by")[:size]
+                before_data, before = best_time(
+                    lambda: TransactionSerializer(queryset, many=True, context={"omit": omit}).data,
+                    options["repeat"],
+                )
+                after_data, after = best_time(
+                    lambda: fastpath.serialize_transactions(queryset, omit=omit), options["repeat"]
+                )
+                if JSONRenderer().render(before_data) != JSONRenderer().render(after_data):
+                    self.stderr.write(self.style.ERROR(f"Output mismatch at page size {size}"))
+                rows = len(queryset)
+                self.stdout.write(
+                    f"{size:>10} {rows / before:>18,.0f} {rows / after:>17,.0f} {before / after:>7.1f}x"
+                )
+            db_transaction.set_rollback(True)
@@ -0,0 +1,62 @@
+"""
+Benchmark response encoding: DRF's JSONRenderer vs ORJSONRenderer vs
+MessagePackRenderer on the transaction list and ``history?all=true`` payloads.
+
+Synthetic rows are created inside a transaction that is rolled back, so the
+command never changes the database.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction as db_transaction
+from rest_framework.renderers import JSONRenderer
+from cash_track_api.renderers import ORJSONRenderer, MessagePackRenderer
+from transactions.models import Transaction, TransactionHistory
+from transactions.serializers import TransactionHistorySerializer
+from transactions.benchmarks import best_time, seed_synthetic_transactions
+from transactions import fastpath
+
+
+class Command(BaseCommand):
+    help = "Compare encoding time and size of the JSON, orjson and MessagePack renderers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=5000, help="Synthetic transactions (and history entries)")
+        parser.add_argument("--page-size", type=int, default=100, help="Transaction list page size")
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement (best is kept)")
+
+    def handle(self, *args, **options):
+        with db_transaction.atomic():
+            seed_synthetic_transactions(options["rows"], with_history=True)
+            page = Transaction.objects.all()[:options["page_size"]]
+            payloads = {
+                f"transactions (page of {options['page_size']})": {
+                    "count": Transaction.objects.count(),
+                    "next": None,
+                    "previous": None,
+                    "results": fastpath.serialize_transactions(page),
+                },
+                "history?all=true": {
+                    "results": TransactionHistorySerializer(
+                        TransactionHistory.objects.select_related("performed_by"), many=True
+                    ).data,
+                },
+            }
+            db_transaction.set_rollback(True)
+
+        renderers = [
+            ("json", JSONRenderer()),
+            ("orjson", ORJSONRenderer()),
+            ("msgpack", MessagePackRenderer()),
+        ]
+        self.stdout.write(f"{'payload':<28} {'renderer':<8} {'encode ms':>10} {'bytes':>11} {'speedup':>8}")
+        for name, data in payloads.items():
+            baseline = None
+            for renderer_name, renderer in renderers:
+                body, elapsed = best_time(lambda: renderer.render(data), options["repeat"])
+                if baseline is None:
+                    baseline = (body, elapsed)
+                elif renderer_name == "orjson" and body != baseline[0]:
+                    self.stderr.write(self.style.ERROR(f"orjson output differs from JSONRenderer on {name}"))
+                self.stdout.write(
+                    f"{name:<28} {renderer_name:<8} {elapsed * 1000:>10.2f} {len(body):>11,} "
+                    f"{baseline[1] / elapsed:>7.1f}x"
+                )
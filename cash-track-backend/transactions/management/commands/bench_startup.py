@@ -0,0 +1,87 @@
+"""
+Benchmark the startup of a bare worker: import time (``python -X importtime``)
+and resident memory of a fresh interpreter that loads the WSGI application
+and its URLconf, like a server worker before its first request.
+
+Each scenario runs in its own subprocess:
+- worker: the application as served,
+- + reports module: also imports transactions.reports,
+- + report libraries: also loads ReportLab and openpyxl, i.e. what every
+  worker paid while reports.py imported them at module level.
+"""
+import re
+import statistics
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+SCENARIOS = [
+    ("worker", []),
+    ("+ reports module", ["transactions.reports"]),
+    ("+ report libraries", ["transactions.reports", "reportlab.platypus", "reportlab.lib.styles", "openpyxl", "openpyxl.styles"]),
+]
+
+CHILD_SCRIPT = """
+import importlib, os, resource, sys, time
+start = time.perf_counter()
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cash_track_api.settings")
+from django.core.wsgi import get_wsgi_application
+from django.urls import get_resolver
+application = get_wsgi_application()
+get_resolver().reverse_dict
+for name in sys.argv[1:]:
+    importlib.import_module(name)
+elapsed = time.perf_counter() - start
+print(f"{elapsed:.6f} {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}")
+"""
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)")
+
+
+class Command(BaseCommand):
+    help = "Measure import time and RSS of a bare worker, with and without the report libraries"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per scenario (median is kept)")
+        parser.add_argument("--top", type=int, default=10, help="Heaviest top-level imports to list")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'scenario':<20} {'startup ms':>11} {'imports ms':>11} {'RSS MiB':>8}")
+        heaviest = None
+        for name, modules in SCENARIOS:
+            runs = [self.run_child(modules) for _ in range(options["repeat"])]
+            startup = statistics.median(run[0] for run in runs)
+            imports = statistics.median(run[1] for run in runs)
+            rss = statistics.median(run[2] for run in runs)
+            self.stdout.write(f"{name:<20} {startup * 1000:>11.1f} {imports / 1000:>11.1f} {rss / 1024:>8.1f}")
+            heaviest = runs[-1][3]
+
+        self.stdout.write(f"\nHeaviest top-level imports ({SCENARIOS[-1][0]}, cumulative ms):")
+        for module, cumulative in heaviest[:options["top"]]:
+            self.stdout.write(f"  {cumulative / 1000:>8.1f}  {module}")
+
+    @staticmethod
+    def run_child(modules):
+        """Return (startup seconds, total import µs, max RSS KiB, [(top-level module, cumulative µs)])"""
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", CHILD_SCRIPT, *modules],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        elapsed, rss = result.stdout.split()[-2:]
+
+        total = 0
+        top_level = []
+        for line in result.stderr.splitlines():
+            match = IMPORTTIME_LINE.match(line)
+            if not match:
+                continue
+            total += int(match.group(1))
+            # Top-level imports are indented by a single space
+            if len(match.group(3)) == 1:
+                top_level.append((match.group(4), int(match.group(2))))
+        top_level.sort(key=lambda item: item[1], reverse=True)
+        return float(elapsed), total, int(rss), top_level
@@ -0,0 +1,47 @@
+"""
+EXPLAIN the statements of the key read endpoints on the current database
+and fail when one falls back to a sequential scan of the ledger tables
+(see cash_track_api/queryplans.py). Run it on a large dataset:
+
+    python manage.py seed_bench --transactions 200000
+    python manage.py check_query_plans
+    python manage.py check_query_plans --verbose     # print every plan
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.test import APIClient
+from accounts.models import User
+from cash_track_api import queryplans
+from transactions.models import Transaction
+
+
+class Command(BaseCommand):
+    help = "Check that the key endpoint queries use indexes instead of sequential scans (PostgreSQL)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verbose", action="store_true", help="Print the plan of every statement")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Les plans d'exécution nécessitent PostgreSQL")
+        sample = Transaction.objects.exclude(category=None).select_related("category").order_by("-id").first()
+        admin = User.objects.filter(role="admin").order_by("id").first()
+        if sample is None or admin is None:
+            raise CommandError("Base vide : lancer d'abord seed_bench")
+
+        client = APIClient()
+        client.force_authenticate(admin)
+        failures = 0
+        for name, url, params in queryplans.key_requests(sample.category.name, sample.created_by_id, sample.pk):
+            status, plans = queryplans.endpoint_plans(client, url, params)
+            if status != 200:
+                raise CommandError(f"{name}: HTTP {status}")
+            scans = [(sql, plan, queryplans.sequential_scans(plan)) for sql, plan in plans]
+            flagged = [entry for entry in scans if entry[2]]
+            failures += len(flagged)
+            self.stdout.write(f"{name}: {len(plans)} requêtes, {len(flagged)} parcours séquentiels")
+            for sql, plan, found in scans if options["verbose"] else flagged:
+                self.stdout.write(f"  {sql}")
+                self.stdout.write("\n".join(f"    {line}" for line in queryplans.format_plan(plan)))
+        if failures:
+            raise CommandError(f"{failures} requêtes font un parcours séquentiel évitable")
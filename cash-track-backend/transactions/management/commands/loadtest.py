@@ -0,0 +1,382 @@
+"""
+Load generator for capacity planning: drives a running instance (``serve``,
+``runserver`` or a deployed URL) over HTTP with virtual users issuing a
+realistic mix of requests.
+
+Each virtual user logs in as one of the ``seed_bench`` accounts, then loops
+over weighted actions (dashboard polling, list paging with filters, creates,
+updates, history, analytics, category stats, new logins) on its own
+keep-alive connection. The load is applied in stages of increasing
+concurrency; every stage reports throughput, error rate and latency
+percentiles per endpoint, and the first saturated stage is detected:
+errors above ``--max-error-rate``, p99 above ``--max-p99`` or throughput
+no longer growing with concurrency.
+
+    python manage.py seed_bench
+    python manage.py serve &
+    python manage.py loadtest --concurrency 1,4,16,64 --duration 30
+
+Creates and updates are real writes to the target database.
+"""
+import asyncio
+import json
+import random
+import ssl
+import time
+from urllib.parse import urlencode, urlsplit
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from transactions.benchmarks import percentile
+from transactions.seeding import BENCH_PASSWORD, bench_email
+
+# Throughput gain below which a higher concurrency counts as saturated
+MIN_SCALING = 0.10
+
+
+class HttpClient:
+    """Minimal HTTP/1.1 client on asyncio streams: one keep-alive connection, one request at a time"""
+
+    def __init__(self, base_url, timeout):
+        parts = urlsplit(base_url)
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.https else 80)
+        self.host_header = parts.netloc
+        self.prefix = parts.path.rstrip("/")
+        self.timeout = timeout
+        self.reader = self.writer = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, ssl.SSLError):
+                pass
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=None, token=None):
+        """Return (status, parsed JSON or None)"""
+        payload = json.dumps(body).encode() if body is not None else b""
+        lines = [
+            f"{method} {self.prefix}{path} HTTP/1.1",
+            f"Host: {self.host_header}",
+            "Accept: application/json",
+            f"Content-Length: {len(payload)}",
+        ]
+        if body is not None:
+            lines.append("Content-Type: application/json")
+        if token:
+            lines.append(f"Authorization: Bearer {token}")
+        message = ("\r\n".join(lines) + "\r\n\r\n").encode() + payload
+
+        # A reused connection may have been closed by the server: retry once on a new one
+        for attempt in range(2):
+            reused = self.writer is not None
+            if not reused:
+                self.reader, self.writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port, ssl=self.https or None), self.timeout,
+                )
+            try:
+                self.writer.write(message)
+                await self.writer.drain()
+                status, headers, content = await asyncio.wait_for(self._read_response(), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                await self.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            except asyncio.TimeoutError:
+                await self.close()
+                raise
+            if headers.get("connection", "").lower() == "close":
+                await self.close()
+            try:
+                return status, json.loads(content) if content else None
+            except ValueError:
+                return status, None
+
+    async def _read_response(self):
+        status_line = await self.reader.readuntil(b"\r\n")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                if size == 0:
+                    await self.reader.readuntil(b"\r\n")
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readexactly(2)
+            return status, headers, b"".join(chunks)
+        if "content-length" in headers:
+            return status, headers, await self.reader.readexactly(int(headers["content-length"]))
+        headers["connection"] = "close"
+        return status, headers, await self.reader.read()
+
+
+class StageStats:
+    """Latencies and outcomes per endpoint, recorded only while the stage clock runs"""
+
+    def __init__(self):
+        self.recording = False
+        self.latencies = {}
+        self.statuses = {}
+        self.errors = {}
+        self.started = self.stopped = None
+
+    def start(self):
+        self.recording = True
+        self.started = time.perf_counter()
+
+    def stop(self):
+        self.recording = False
+        self.stopped = time.perf_counter()
+
+    def record(self, name, seconds, outcome):
+        if not self.recording:
+            return
+        self.latencies.setdefault(name, []).append(seconds)
+        statuses = self.statuses.setdefault(name, {})
+        statuses[str(outcome)] = statuses.get(str(outcome), 0) + 1
+        if not isinstance(outcome, int) or outcome >= 400:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def summary(self, concurrency):
+        elapsed = self.stopped - self.started
+        endpoints = {}
+        for name, values in sorted(self.latencies.items()):
+            values.sort()
+            endpoints[name] = self._figures(values, self.errors.get(name, 0), elapsed)
+            endpoints[name]["statuses"] = self.statuses[name]
+        every = sorted(value for values in self.latencies.values() for value in values)
+        return {
+            "concurrency": concurrency,
+            "duration_s": round(elapsed, 3),
+            **self._figures(every, sum(self.errors.values()), elapsed),
+            "endpoints": endpoints,
+        }
+
+    @staticmethod
+    def _figures(values, errors, elapsed):
+        return {
+            "requests": len(values),
+            "throughput_rps": round(len(values) / elapsed, 2) if elapsed else 0.0,
+            "error_rate": round(errors / len(values), 4) if values else 0.0,
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p90_ms": round(percentile(values, 90) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+        }
+
+
+class VirtualUser:
+    """One logged-in client looping over the weighted action mix"""
+
+    def __init__(self, client, email, password, stats, rng, think_time):
+        self.client = client
+        self.email = email
+        self.password = password
+        self.stats = stats
+        self.rng = rng
+        self.think_time = think_time
+        self.access = None
+        self.created = []
+        self.actions, self.weights = zip(*[
+            (self.login, 2),
+            (self.dashboard, 25),
+            (self.list_page, 30),
+            (self.create, 8),
+            (self.update, 5),
+            (self.history, 10),
+            (self.analytics, 10),
+            (self.category_stats, 10),
+        ])
+
+    async def call(self, name, method, path, body=None, auth=True):
+        start = time.perf_counter()
+        try:
+            status, data = await self.client.request(method, path, body, self.access if auth else None)
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError) as exc:
+            self.stats.record(name, time.perf_counter() - start, type(exc).__name__)
+            return None, None
+        self.stats.record(name, time.perf_counter() - start, status)
+        if status == 401 and auth:
+            self.access = None
+        return status, data
+
+    async def run(self, deadline):
+        loop = asyncio.get_running_loop()
+        while loop.time() < deadline:
+            if self.access is None:
+                await self.login()
+            else:
+                await self.rng.choices(self.actions, self.weights)[0]()
+            if self.think_time:
+                await asyncio.sleep(self.rng.expovariate(1 / self.think_time))
+
+    async def login(self):
+        status, data = await self.call(
+            "login", "POST", reverse("login"), {"email": self.email, "password": self.password}, auth=False,
+        )
+        if status == 200:
+            self.access = data["access"]
+
+    async def dashboard(self):
+        await self.call("dashboard-stats", "GET", reverse("dashboard-stats"))
+
+    async def list_page(self):
+        params = {"page": self.rng.randint(1, 5)}
+        if self.rng.random() < 0.5:
+            params["type"] = self.rng.choice(["recette", "depense"])
+        if self.rng.random() < 0.3:
+            params["amount_min"] = self.rng.choice([1000, 10000, 100000])
+        await self.call("transactions", "GET", f"{reverse('transaction-list-create')}?{urlencode(params)}")
+
+    async def create(self):
+        # Receipts only: expenses may be refused for insufficient balance
+        status, data = await self.call("transaction-create", "POST", reverse("transaction-list-create"), {
+            "type": "recette",
+            "amount": f"{self.rng.randint(10, 500) * 100}.00",
+            "description": "Load test",
+        })
+        if status == 201:
+            self.created.append(data["id"])
+
+    async def update(self):
+        if not self.created:
+            return await self.create()
+        pk = self.rng.choice(self.created)
+        await self.call(
+            "transaction-update", "PATCH", reverse("transaction-detail", args=[pk]),
+            {"description": f"Load test {self.rng.randint(0, 9999)}"},
+        )
+
+    async def history(self):
+        query = urlencode({"page": self.rng.randint(1, 3), "page_size": 50})
+        await self.call("history", "GET", f"{reverse('transaction-history')}?{query}")
+
+    async def analytics(self):
+        await self.call("analytics", "GET", reverse("transaction-analytics"))
+
+    async def category_stats(self):
+        await self.call("category-stats", "GET", reverse("category-stats"))
+
+
+class Command(BaseCommand):
+    help = "Drive a running instance with a realistic request mix and find its saturation point"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000", help="Base URL of the running instance")
+        parser.add_argument("--concurrency", default="1,2,4,8,16,32", help="Virtual users per stage, comma-separated")
+        parser.add_argument("--duration", type=float, default=20, help="Seconds per stage")
+        parser.add_argument("--think-time", type=float, default=0, help="Mean pause between actions of a user (s)")
+        parser.add_argument("--timeout", type=float, default=30, help="Seconds before a request counts as failed")
+        parser.add_argument("--users", type=int, default=20, help="seed_bench accounts to log in with")
+        parser.add_argument("--email", help="Log every virtual user in with this account instead")
+        parser.add_argument("--password", default=BENCH_PASSWORD)
+        parser.add_argument("--max-error-rate", type=float, default=0.01, help="Saturation: error rate above this")
+        parser.add_argument("--max-p99", type=float, default=2000, help="Saturation: overall p99 above this (ms)")
+        parser.add_argument("--keep-going", action="store_true", help="Run every stage even after saturation")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed of the action mix")
+        parser.add_argument("--output", help="Write every stage as JSON to this file")
+
+    def handle(self, *args, **options):
+        try:
+            stages = [int(value) for value in options["concurrency"].split(",")]
+        except ValueError:
+            raise CommandError("--concurrency attend des entiers séparés par des virgules")
+        if options["email"]:
+            accounts = [options["email"]]
+        else:
+            # bench-1 is read-only and cannot write
+            accounts = [bench_email(index) for index in range(max(options["users"], 3)) if index != 1]
+
+        results = []
+        saturation = None
+        for concurrency in stages:
+            stage = asyncio.run(self.run_stage(concurrency, accounts, options))
+            results.append(stage)
+            self.print_stage(stage)
+            reason = self.saturation_reason(stage, results[-2] if len(results) > 1 else None, options)
+            if reason:
+                saturation = {"concurrency": concurrency, "reason": reason}
+                self.stdout.write(self.style.WARNING(f"Saturated at {concurrency} users: {reason}"))
+                if not options["keep_going"]:
+                    break
+
+        healthy = [stage for stage in results if saturation is None or stage["concurrency"] < saturation["concurrency"]]
+        if healthy:
+            best = max(healthy, key=lambda stage: stage["throughput_rps"])
+            self.stdout.write(self.style.SUCCESS(
+                f"Capacity: {best['throughput_rps']:.1f} req/s at {best['concurrency']} users "
+                f"(p99 {best['p99_ms']:.0f} ms, errors {best['error_rate']:.2%})"
+            ))
+        elif saturation:
+            self.stdout.write(self.style.ERROR("Saturated from the first stage"))
+        if not saturation:
+            self.stdout.write("No saturation reached: add stages with more users")
+
+        if options["output"]:
+            with open(options["output"], "w") as target:
+                json.dump({"url": options["url"], "stages": results, "saturation": saturation}, target, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    @staticmethod
+    async def run_stage(concurrency, accounts, options):
+        stats = StageStats()
+        clients = [HttpClient(options["url"], options["timeout"]) for _ in range(concurrency)]
+        users = [
+            VirtualUser(
+                client, accounts[index % len(accounts)], options["password"], stats,
+                random.Random(options["seed"] * 1000 + index), options["think_time"],
+            )
+            for index, client in enumerate(clients)
+        ]
+        try:
+            # Initial logins are not part of the measurement
+            await asyncio.gather(*(user.login() for user in users))
+            if not any(user.access for user in users):
+                raise CommandError(
+                    f"Connexion impossible sur {options['url']} (instance lancée ? `manage.py seed_bench` exécuté ?)"
+                )
+            stats.start()
+            deadline = asyncio.get_running_loop().time() + options["duration"]
+            await asyncio.gather(*(user.run(deadline) for user in users))
+            stats.stop()
+        finally:
+            await asyncio.gather(*(client.close() for client in clients))
+        return stats.summary(concurrency)
+
+    @staticmethod
+    def saturation_reason(stage, previous, options):
+        if stage["error_rate"] > options["max_error_rate"]:
+            return f"error rate {stage['error_rate']:.2%}"
+        if stage["p99_ms"] > options["max_p99"]:
+            return f"p99 {stage['p99_ms']:.0f} ms"
+        if previous and stage["concurrency"] > previous["concurrency"]:
+            gain = stage["throughput_rps"] / previous["throughput_rps"] - 1 if previous["throughput_rps"] else 0
+            if gain < MIN_SCALING:
+                return f"throughput {gain:+.0%} over {previous['concurrency']} users"
+        return None
+
+    def print_stage(self, stage):
+        self.stdout.write(
+            f"\n{stage['concurrency']} users: {stage['requests']} requests, {stage['throughput_rps']:.1f} req/s, "
+            f"errors {stage['error_rate']:.2%}, p50 {stage['p50_ms']:.1f} ms, p99 {stage['p99_ms']:.1f} ms"
+        )
+        self.stdout.write(
+            f"  {'endpoint':<20} {'requests':>8} {'req/s':>8} {'errors':>7} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8}"
+        )
+        for name, figures in stage["endpoints"].items():
+            self.stdout.write(
+                f"  {name:<20} {figures['requests']:>8} {figures['throughput_rps']:>8.1f} "
+                f"{figures['error_rate']:>7.1%} {figures['p50_ms']:>8.1f} {figures['p90_ms']:>8.1f} {figures['p99_ms']:>8.1f}"
+            )
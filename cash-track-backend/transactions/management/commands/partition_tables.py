@@ -0,0 +1,90 @@
+"""
+Range-partition ``transactions`` and ``transaction_history`` by
+``created_at`` on PostgreSQL (see transactions/partitioning.py).
+
+    python manage.py partition_tables --convert --interval month
+    python manage.py partition_tables --ahead 3          # cron, e.g. monthly
+    python manage.py partition_tables --detach-before 2024-01-01
+
+``--convert`` rewrites the plain tables once, copying their rows (the
+tables are locked meanwhile: run it in a maintenance window). Later runs
+only create the partitions of the coming periods, plus those needed by
+rows that landed in the default partition.
+"""
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction as db_transaction
+from django.utils import timezone
+from transactions import partitioning
+
+
+class Command(BaseCommand):
+    help = "Partition the transaction and history tables by month or year (PostgreSQL)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--convert", action="store_true", help="Convert the plain tables, copying their rows")
+        parser.add_argument("--interval", choices=partitioning.INTERVALS, default="month",
+                            help="Partition size for --convert (later runs keep the existing one)")
+        parser.add_argument("--ahead", type=int, default=3, help="Future periods to create in advance")
+        parser.add_argument("--detach-before", type=date.fromisoformat, metavar="YYYY-MM-DD",
+                            help="Detach the partitions older than this date (kept as plain tables)")
+        parser.add_argument("--list", action="store_true", help="Only list the partitions")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Le partitionnement nécessite PostgreSQL")
+
+        if options["list"]:
+            self.list_partitions()
+            return
+
+        try:
+            with db_transaction.atomic():
+                for model in partitioning.PARTITIONED_MODELS:
+                    self.partition(model, options)
+        except partitioning.PartitioningError as error:
+            raise CommandError(str(error))
+
+    def partition(self, model, options):
+        table = model._meta.db_table
+        if not partitioning.is_partitioned(model):
+            if not options["convert"]:
+                self.stdout.write(f"{table}: non partitionnée (utiliser --convert)")
+                return
+            interval = options["interval"]
+            created = partitioning.convert(model, interval, self.horizon(interval, options["ahead"]))
+            self.stdout.write(f"{table}: convertie, {len(created)} partitions ({interval})")
+        else:
+            interval = partitioning.current_interval(model, options["interval"])
+            created = partitioning.ensure_partitions(
+                model, timezone.localdate(), self.horizon(interval, options["ahead"]), interval
+            )
+            span = partitioning.default_partition_span(model)
+            if span:
+                created += partitioning.ensure_partitions(model, *span, interval)
+            for name in created:
+                self.stdout.write(f"{table}: {name} créée")
+
+        if options["detach_before"]:
+            for name in partitioning.detach_before(model, options["detach_before"]):
+                self.stdout.write(f"{table}: {name} détachée")
+
+    @staticmethod
+    def horizon(interval, ahead):
+        """Start date of the last period to create"""
+        start = partitioning.period_start(timezone.localdate(), interval)
+        for _ in range(max(ahead, 0)):
+            start = partitioning.next_period(start, interval)
+        return start
+
+    def list_partitions(self):
+        with connection.cursor() as cursor:
+            for model in partitioning.PARTITIONED_MODELS:
+                table = model._meta.db_table
+                if not partitioning.is_partitioned(model):
+                    self.stdout.write(f"{table}: non partitionnée")
+                    continue
+                self.stdout.write(f"{table}:")
+                for name, _, _ in partitioning.partitions(model):
+                    cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)", [name])
+                    self.stdout.write(f"  {name:<40} ~{max(cursor.fetchone()[0], 0):,} lignes")
@@ -0,0 +1,17 @@
+"""
+Delete the expired idempotency keys (see transactions/idempotency.py).
+
+    python manage.py purge_idempotency_keys     # cron, e.g. hourly
+
+A write only frees its own key when it has expired, so without this command
+the keys of requests that are never retried stay in the table.
+"""
+from django.core.management.base import BaseCommand
+from transactions.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = "Delete the expired idempotency keys"
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{purge_expired_keys()} clé(s) d'idempotence expirée(s) supprimée(s)")
@@ -0,0 +1,75 @@
+"""
+Generate a large synthetic dataset for benchmarks: bench users (password
+``BENCH_PASSWORD``), bench categories, and a chronological ledger of
+transactions with their history entries.
+
+Unlike the other bench commands, the data is committed; ``--clear`` removes
+everything a previous run created (and only that).
+"""
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction as db_transaction
+from transactions.models import CashBoxBalance, Transaction, TransactionHistory
+from transactions.seeding import (
+    BENCH_PASSWORD,
+    HISTORY_COLUMNS,
+    TRANSACTION_COLUMNS,
+    LedgerGenerator,
+    analyze,
+    bench_email,
+    clear_bench_data,
+    ensure_bench_cash_boxes,
+    ensure_bench_categories,
+    ensure_bench_users,
+    insert_rows,
+    reset_sequences,
+)
+
+
+class Command(BaseCommand):
+    help = "Seed bench users, categories and a large synthetic ledger (COPY on PostgreSQL)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--transactions", type=int, default=100_000, help="Transactions to generate")
+        parser.add_argument("--history-ratio", type=float, default=1.0, help="History entries per transaction (>= 1)")
+        parser.add_argument("--users", type=int, default=20, help="Bench users")
+        parser.add_argument("--cash-boxes", type=int, default=1, help="Cash boxes the ledger is spread over")
+        parser.add_argument("--days", type=int, default=730, help="Time span of the ledger, ending now")
+        parser.add_argument("--batch-size", type=int, default=10_000, help="Rows generated and written per batch")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed")
+        parser.add_argument("--clear", action="store_true", help="Delete previous bench data first")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options["clear"]:
+            with db_transaction.atomic():
+                clear_bench_data()
+            self.stdout.write("Previous bench data deleted")
+
+        with db_transaction.atomic():
+            users = ensure_bench_users(max(options["users"], 2))
+            categories = ensure_bench_categories()
+            cash_boxes = ensure_bench_cash_boxes(max(options["cash_boxes"], 1))
+            generator = LedgerGenerator(
+                users, categories, options["transactions"],
+                history_ratio=options["history_ratio"], days=options["days"], seed=options["seed"],
+                cash_boxes=cash_boxes,
+            )
+            written = history_written = 0
+            for transactions, history in generator.batches(options["batch_size"]):
+                insert_rows(Transaction, TRANSACTION_COLUMNS, transactions)
+                insert_rows(TransactionHistory, HISTORY_COLUMNS, history)
+                written += len(transactions)
+                history_written += len(history)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"  {written:,} transactions, {history_written:,} history entries ({written / elapsed:,.0f} tx/s)")
+            reset_sequences(Transaction, TransactionHistory)
+            # COPY bypasses the signals that maintain the balance rows
+            CashBoxBalance.refresh([box.pk for box in cash_boxes])
+
+        analyze(Transaction, TransactionHistory, CashBoxBalance)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {written:,} transactions and {history_written:,} history entries in {elapsed:.1f}s"
+        ))
+        self.stdout.write(f"Bench admin: {bench_email(0)} / {BENCH_PASSWORD}")
@@ -0,0 +1,58 @@
+# Generated manually
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0008_transactionhistory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CashBox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('description', models.TextField(blank=True, null=True)),
+                ('is_default', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Caisse',
+                'verbose_name_plural': 'Caisses',
+                'db_table': 'cash_boxes',
+                'ordering': ['name'],
+                'constraints': [
+                    models.UniqueConstraint(condition=models.Q(('is_default', True)), fields=('is_default',), name='cash_boxes_single_default'),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name='CashBoxBalance',
+            fields=[
+                ('cash_box', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='balance', serialize=False, to='transactions.cashbox')),
+                ('total_recettes', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('total_depenses', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Solde de caisse',
+                'verbose_name_plural': 'Soldes des caisses',
+                'db_table': 'cash_box_balances',
+            },
+        ),
+        # Nullable until 0010 has moved the existing rows to the default box
+        migrations.AddField(
+            model_name='transaction',
+            name='cash_box',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='transactions', to='transactions.cashbox'),
+        ),
+        migrations.AddField(
+            model_name='transactionhistory',
+            name='cash_box_id',
+            field=models.IntegerField(blank=True, help_text="ID of the transaction's cash box", null=True),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated manually
+from django.db import migrations
+from django.db.models import Q, Sum
+
+
+def create_default_cash_box(apps, schema_editor):
+    """Put the existing ledger in a default cash box and compute its balance row"""
+    CashBox = apps.get_model('transactions', 'CashBox')
+    CashBoxBalance = apps.get_model('transactions', 'CashBoxBalance')
+    Transaction = apps.get_model('transactions', 'Transaction')
+    TransactionHistory = apps.get_model('transactions', 'TransactionHistory')
+
+    box, _ = CashBox.objects.get_or_create(name='Caisse principale', defaults={'is_default': True})
+    Transaction.objects.filter(cash_box__isnull=True).update(cash_box=box)
+    TransactionHistory.objects.filter(cash_box_id__isnull=True).update(cash_box_id=box.pk)
+
+    totals = Transaction.objects.filter(cash_box=box).aggregate(
+        recettes=Sum('amount', filter=Q(type='recette')),
+        depenses=Sum('amount', filter=Q(type='depense')),
+    )
+    CashBoxBalance.objects.update_or_create(cash_box=box, defaults={
+        'total_recettes': totals['recettes'] or 0,
+        'total_depenses': totals['depenses'] or 0,
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0009_cashbox'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_default_cash_box, migrations.RunPython.noop),
+    ]
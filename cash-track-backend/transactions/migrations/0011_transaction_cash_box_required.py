@@ -0,0 +1,26 @@
+# Generated manually
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0010_default_cashbox'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaction',
+            name='cash_box',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='transactions', to='transactions.cashbox'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['cash_box', '-created_at'], name='transactions_box_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transactionhistory',
+            index=models.Index(fields=['cash_box_id', '-created_at'], name='history_box_created_idx'),
+        ),
+    ]
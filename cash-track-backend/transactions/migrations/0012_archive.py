@@ -0,0 +1,50 @@
+# Generated manually
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0011_transaction_cash_box_required'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateTimeField(unique=True)),
+                ('period_end', models.DateTimeField(unique=True)),
+                ('transactions_file', models.CharField(max_length=255)),
+                ('history_file', models.CharField(max_length=255)),
+                ('transaction_count', models.PositiveIntegerField(default=0)),
+                ('history_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Période archivée',
+                'verbose_name_plural': 'Périodes archivées',
+                'db_table': 'archive_segments',
+                'ordering': ['period_start'],
+            },
+        ),
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_recettes', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('total_depenses', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('transaction_count', models.PositiveIntegerField(default=0)),
+                ('closing_balance', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('cash_box', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='snapshots', to='transactions.cashbox')),
+                ('segment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='transactions.archivesegment')),
+            ],
+            options={
+                'verbose_name': 'Solde archivé',
+                'verbose_name_plural': 'Soldes archivés',
+                'db_table': 'balance_snapshots',
+                'constraints': [models.UniqueConstraint(fields=('segment', 'cash_box'), name='balance_snapshots_segment_box')],
+            },
+        ),
+    ]
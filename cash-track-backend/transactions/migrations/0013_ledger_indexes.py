@@ -0,0 +1,81 @@
+# Generated by Django 6.0 on 2026-10-19 03:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0001_initial'),
+        ('transactions', '0012_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaction',
+            name='category',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transactions', to='categories.category'),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='created_by',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='created_transactions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='modified_by',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='modified_transactions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='transactionhistory',
+            name='performed_by',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transaction_history_actions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['-created_at', '-updated_at'], name='transactions_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['type', '-created_at'], name='transactions_type_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['category', '-created_at'], name='transactions_cat_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['created_by', '-created_at'], name='transactions_by_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['amount'], name='transactions_amount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['updated_at'], name='transactions_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('modified_by__isnull', False)), fields=['modified_by'], name='transactions_modified_by_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transactionhistory',
+            index=models.Index(fields=['-created_at'], name='history_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transactionhistory',
+            index=models.Index(fields=['transaction_id', '-created_at'], name='history_txn_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transactionhistory',
+            index=models.Index(fields=['action', '-created_at'], name='history_action_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transactionhistory',
+            index=models.Index(fields=['performed_by', '-created_at'], name='history_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,146 @@
+# Generated by Django 6.0 on 2026-10-19 03:29
+
+import io
+import json
+from decimal import Decimal, ROUND_HALF_UP
+from pathlib import Path
+import zstandard
+import django.db.models.expressions
+import django.db.models.functions.math
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q, Sum
+
+# FCFA has no minor unit: round any fractional amount before the integer cast
+# (PostgreSQL would round in the cast, SQLite would keep a REAL value). Only
+# the transactions are rounded: a sum of rounded rows is not the rounded sum,
+# so the stored totals are recomputed from the rounded rows afterwards
+ROUND_AMOUNTS = "UPDATE transactions SET amount = ROUND(amount) WHERE amount <> ROUND(amount)"
+
+
+# The helpers below are copies of the application code as of this migration
+# (transactions.models.whole_fcfa, transactions.archive.read_rows and
+# transactions.models.refresh_box_balances), so later changes to it do not
+# change what the migration does.
+
+def whole_fcfa(amount):
+    """A fractional amount rounded half up to whole FCFA, as ROUND() does in SQL"""
+    return int(Decimal(str(amount)).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def archived_amounts(path):
+    """(cash_box_id, type, whole FCFA amount) of the rows of an archive file"""
+    with open(path, "rb") as source:
+        reader = io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(source), encoding="utf-8")
+        for line in reader:
+            row = json.loads(line)
+            yield row["cash_box_id"], row["type"], whole_fcfa(row["amount"])
+
+
+def recompute_totals(apps, schema_editor):
+    """
+    Rebuild the archive snapshots from the rounded rows of their files (or,
+    if a file is not available here, round their stored totals), then the
+    balance rows from the transactions and snapshots, as CashBoxBalance.refresh does.
+    """
+    ArchiveSegment = apps.get_model("transactions", "ArchiveSegment")
+    BalanceSnapshot = apps.get_model("transactions", "BalanceSnapshot")
+    CashBox = apps.get_model("transactions", "CashBox")
+    CashBoxBalance = apps.get_model("transactions", "CashBoxBalance")
+    Transaction = apps.get_model("transactions", "Transaction")
+    root = Path(settings.ARCHIVE_ROOT)
+    cumulative = {}
+    for segment in ArchiveSegment.objects.order_by("period_start"):
+        snapshots = {snapshot.cash_box_id: snapshot for snapshot in BalanceSnapshot.objects.filter(segment=segment)}
+        path = root / segment.transactions_file
+        if path.exists():
+            period = {}
+            for box, kind, amount in archived_amounts(path):
+                totals = period.setdefault(box, [0, 0])
+                totals[0 if kind == "recette" else 1] += amount
+        else:
+            period = {
+                box: [whole_fcfa(snapshot.total_recettes), whole_fcfa(snapshot.total_depenses)]
+                for box, snapshot in snapshots.items()
+            }
+        for box, snapshot in snapshots.items():
+            recettes, depenses = period.get(box, (0, 0))
+            totals = cumulative.setdefault(box, [0, 0])
+            totals[0] += recettes
+            totals[1] += depenses
+            snapshot.total_recettes, snapshot.total_depenses = recettes, depenses
+            snapshot.closing_balance = totals[0] - abs(totals[1])
+            snapshot.save(update_fields=["total_recettes", "total_depenses", "closing_balance"])
+
+    by_type = {
+        "recettes": Sum("amount", filter=Q(type="recette")),
+        "depenses": Sum("amount", filter=Q(type="depense")),
+    }
+    sums = {row["cash_box_id"]: row for row in Transaction.objects.values("cash_box_id").annotate(**by_type).order_by()}
+    archived = {
+        row["cash_box_id"]: row
+        for row in BalanceSnapshot.objects.values("cash_box_id").annotate(
+            recettes=Sum("total_recettes"), depenses=Sum("total_depenses"),
+        ).order_by()
+    }
+    for box_id in CashBox.objects.values_list("pk", flat=True):
+        row, snapshots = sums.get(box_id, {}), archived.get(box_id, {})
+        CashBoxBalance.objects.update_or_create(cash_box_id=box_id, defaults={
+            "total_recettes": (row.get("recettes") or 0) + (snapshots.get("recettes") or 0),
+            "total_depenses": (row.get("depenses") or 0) + (snapshots.get("depenses") or 0),
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0013_ledger_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(ROUND_AMOUNTS, migrations.RunSQL.noop),
+        migrations.AlterField(
+            model_name='transaction',
+            name='amount',
+            field=models.BigIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name='cashboxbalance',
+            name='total_recettes',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='cashboxbalance',
+            name='total_depenses',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='balancesnapshot',
+            name='total_recettes',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='balancesnapshot',
+            name='total_depenses',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='balancesnapshot',
+            name='closing_balance',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(recompute_totals, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='transaction',
+            name='signed_amount',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(then=django.db.models.expressions.CombinedExpression(django.db.models.functions.math.Abs('amount'), '*', models.Value(-1)), type='depense'), default=models.F('amount'), output_field=models.BigIntegerField()), output_field=models.BigIntegerField()),
+        ),
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='transactions_box_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['cash_box', '-created_at', 'signed_amount'], name='transactions_box_created_idx'),
+        ),
+    ]
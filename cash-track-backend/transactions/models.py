@@ -1,14 +1,132 @@
-from django.db import models
-from django.db.models import Sum, Q
+from django.db import connections, models
+from django.db.models import Case, F, Sum, Q, When, Window
+from django.db.models.functions import Abs
 from django.utils import timezone
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db.models.signals import post_save, pre_delete
 from django.dispatch import receiver
 import json
+from decimal import Decimal, ROUND_HALF_UP
 from accounts.models import User
 from categories.models import Category
 
 
+class CashBox(models.Model):
+    """Cash box (caisse): each box has its own ledger and balance"""
+    DEFAULT_NAME = "Caisse principale"
+
+    name = models.CharField(max_length=255, unique=True)
+    description = models.TextField(blank=True, null=True)
+    is_default = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "cash_boxes"
+        verbose_name = "Caisse"
+        verbose_name_plural = "Caisses"
+        ordering = ["name"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["is_default"], condition=Q(is_default=True), name="cash_boxes_single_default"
+            ),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def get_default(cls):
+        """The box used when a transaction does not name one"""
+        box = cls.objects.filter(is_default=True).first()
+        if box is None:
+            box, _ = cls.objects.get_or_create(name=cls.DEFAULT_NAME, defaults={"is_default": True})
+        return box
+
+
+def amount_text(amount):
+    """An amount as the API writes it ("1500.00"), for the history snapshots"""
+    return f"{amount:.2f}"
+
+
+def signed_amount(type, amount):
+    """+amount for a recette, -amount for a dépense, as the signed_amount column"""
+    return amount if type == "recette" else -abs(amount)
+
+
+def whole_fcfa(amount):
+    """A legacy fractional amount rounded half up to whole FCFA, as ROUND() does in SQL"""
+    return int(Decimal(str(amount)).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+class CashBoxBalance(models.Model):
+    """
+    Running totals of one cash box, kept up to date by the transaction
+    signals. Writers lock only the row of their own box, so writes to
+    different boxes never wait on each other.
+    """
+    cash_box = models.OneToOneField(CashBox, on_delete=models.CASCADE, primary_key=True, related_name="balance")
+    # Sum("amount") of the box's recettes / dépenses, as the aggregates return them
+    total_recettes = models.BigIntegerField(default=0)
+    total_depenses = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "cash_box_balances"
+        verbose_name = "Solde de caisse"
+        verbose_name_plural = "Soldes des caisses"
+
+    @property
+    def current_balance(self):
+        return float(self.total_recettes - abs(self.total_depenses))
+
+    @classmethod
+    def lock(cls, *cash_box_ids):
+        """Lock the balance rows of the given boxes (in id order) until the end of the transaction"""
+        rows = cls.objects.select_for_update().filter(cash_box_id__in=cash_box_ids).order_by("cash_box_id")
+        return {row.cash_box_id: row for row in rows}
+
+    @classmethod
+    def apply(cls, cash_box_id, type, amount, sign=1):
+        """Add (sign=1) or remove (sign=-1) one transaction from its box totals"""
+        column = "total_recettes" if type == "recette" else "total_depenses"
+        cls.objects.filter(cash_box_id=cash_box_id).update(
+            **{column: F(column) + sign * amount, "updated_at": timezone.now()}
+        )
+
+    @classmethod
+    def totals(cls, cash_box_id=None):
+        """(total_recettes, total_depenses) of one box, or of all boxes"""
+        queryset = cls.objects.all()
+        if cash_box_id is not None:
+            queryset = queryset.filter(cash_box_id=cash_box_id)
+        totals = queryset.aggregate(recettes=Sum("total_recettes"), depenses=Sum("total_depenses"))
+        return totals["recettes"] or 0, abs(totals["depenses"] or 0)
+
+    @classmethod
+    def refresh(cls, cash_box_ids=None):
+        """Recompute the totals from the transactions (and archive snapshots), after writes that bypass the signals"""
+        boxes = CashBox.objects.all()
+        if cash_box_ids is not None:
+            boxes = boxes.filter(pk__in=cash_box_ids)
+        sums = {
+            row["cash_box_id"]: row
+            for row in Transaction.objects.filter(cash_box__in=boxes).values("cash_box_id").annotate(
+                recettes=Sum("amount", filter=Q(type="recette")),
+                depenses=Sum("amount", filter=Q(type="depense")),
+            ).order_by()
+        }
+        archived = BalanceSnapshot.archived_totals(cash_box_ids)
+        for box_id in boxes.values_list("pk", flat=True):
+            row = sums.get(box_id, {})
+            archived_recettes, archived_depenses, _ = archived.get(box_id, (0, 0, 0))
+            cls.objects.update_or_create(cash_box_id=box_id, defaults={
+                "total_recettes": (row.get("recettes") or 0) + archived_recettes,
+                "total_depenses": (row.get("depenses") or 0) + archived_depenses,
+            })
+
+
 class Transaction(models.Model):
     """Transaction model"""
     TYPE_CHOICES = [
@@ -18,17 +136,29 @@ class Transaction(models.Model):
 
     type = models.CharField(max_length=20, choices=TYPE_CHOICES)
     description = models.TextField(blank=True, null=True)
-    amount = models.DecimalField(max_digits=15, decimal_places=2)
+    # Whole FCFA: the franc CFA has no minor unit
+    amount = models.BigIntegerField()
+    # +amount for a recette, -amount for a dépense: a balance is a single SUM
+    signed_amount = models.GeneratedField(
+        expression=Case(
+            When(type="depense", then=-Abs("amount")), default=F("amount"), output_field=models.BigIntegerField()
+        ),
+        output_field=models.BigIntegerField(),
+        db_persist=True,
+    )
     ref = models.CharField(max_length=255, blank=True, null=True)
     exporter_fournisseur = models.CharField(max_length=255, blank=True, null=True)
+    # The foreign keys are indexed by the composite / partial indexes below
     category = models.ForeignKey(
-        Category, on_delete=models.SET_NULL, null=True, blank=True, related_name="transactions"
+        Category, on_delete=models.SET_NULL, null=True, blank=True, related_name="transactions", db_index=False
     )
+    # No model default: the API puts transactions without a box in CashBox.get_default()
+    cash_box = models.ForeignKey(CashBox, on_delete=models.PROTECT, related_name="transactions", db_index=False)
     created_by = models.ForeignKey(
-        User, on_delete=models.SET_NULL, null=True, related_name="created_transactions"
+        User, on_delete=models.SET_NULL, null=True, related_name="created_transactions", db_index=False
     )
     modified_by = models.ForeignKey(
-        User, on_delete=models.SET_NULL, null=True, blank=True, related_name="modified_transactions"
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name="modified_transactions", db_index=False
     )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -38,38 +168,52 @@ class Transaction(models.Model):
         verbose_name = "Transaction"
         verbose_name_plural = "Transactions"
         ordering = ["-created_at"]
+        # Each filter of the list view, followed by its ordering (check_query_plans)
+        indexes = [
+            models.Index(fields=["-created_at", "-updated_at"], name="transactions_created_idx"),
+            # signed_amount makes the balance of a box up to a date an index-only scan
+            models.Index(fields=["cash_box", "-created_at", "signed_amount"], name="transactions_box_created_idx"),
+            models.Index(fields=["type", "-created_at"], name="transactions_type_created_idx"),
+            models.Index(fields=["category", "-created_at"], name="transactions_cat_created_idx"),
+            models.Index(fields=["created_by", "-created_at"], name="transactions_by_created_idx"),
+            models.Index(fields=["amount"], name="transactions_amount_idx"),
+            models.Index(fields=["updated_at"], name="transactions_updated_idx"),
+            # Most transactions are never modified
+            models.Index(
+                fields=["modified_by"], name="transactions_modified_by_idx", condition=models.Q(modified_by__isnull=False)
+            ),
+        ]
 
     def __str__(self):
         return f"{self.type} - {self.amount} FCFA - {self.created_at.strftime('%Y-%m-%d')}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_ledger_entry()
+        return instance
+
+    def remember_ledger_entry(self):
+        """Keep (cash_box_id, type, amount) as stored, to move the box totals on update"""
+        loaded = self.__dict__
+        if all(name in loaded for name in ("cash_box_id", "type", "amount")):
+            self._ledger_entry = (self.cash_box_id, self.type, self.amount)
     
     @classmethod
-    def get_current_balance(cls):
-        """Calculate the current balance from all transactions"""
-        total_recettes = cls.objects.filter(type="recette").aggregate(
-            total=Sum("amount")
-        )["total"] or 0
-        
-        total_depenses = abs(cls.objects.filter(type="depense").aggregate(
-            total=Sum("amount")
-        )["total"] or 0)
-        
+    def get_current_balance(cls, cash_box_id=None):
+        """Current balance of one cash box, or of all of them, from the balance rows"""
+        total_recettes, total_depenses = CashBoxBalance.totals(cash_box_id)
         return float(total_recettes - total_depenses)
     
     @classmethod
-    def get_total_recettes(cls):
-        """Get total recettes from all transactions"""
-        total = cls.objects.filter(type="recette").aggregate(
-            total=Sum("amount")
-        )["total"] or 0
-        return float(total)
+    def get_total_recettes(cls, cash_box_id=None):
+        """Get total recettes of one cash box, or of all of them"""
+        return float(CashBoxBalance.totals(cash_box_id)[0])
     
     @classmethod
-    def get_total_depenses(cls):
-        """Get total depenses from all transactions"""
-        total = abs(cls.objects.filter(type="depense").aggregate(
-            total=Sum("amount")
-        )["total"] or 0)
-        return float(total)
+    def get_total_depenses(cls, cash_box_id=None):
+        """Get total depenses of one cash box, or of all of them"""
+        return float(CashBoxBalance.totals(cash_box_id)[1])
 
 
 class TransactionHistory(models.Model):
@@ -81,6 +225,7 @@ class TransactionHistory(models.Model):
     ]
 
     transaction_id = models.IntegerField(help_text="ID of the transaction (may not exist if deleted)")
+    cash_box_id = models.IntegerField(null=True, blank=True, help_text="ID of the transaction's cash box")
     action = models.CharField(max_length=20, choices=ACTION_CHOICES)
     
     # Store transaction data as JSON for deleted transactions
@@ -95,7 +240,8 @@ class TransactionHistory(models.Model):
         User, 
         on_delete=models.SET_NULL, 
         null=True, 
-        related_name="transaction_history_actions"
+        related_name="transaction_history_actions",
+        db_index=False,  # see history_user_created_idx
     )
     
     # Timestamp
@@ -113,7 +259,139 @@ class TransactionHistory(models.Model):
         verbose_name = "Historique de transaction"
         verbose_name_plural = "Historique des transactions"
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["-created_at"], name="history_created_idx"),
+            models.Index(fields=["cash_box_id", "-created_at"], name="history_box_created_idx"),
+            models.Index(fields=["transaction_id", "-created_at"], name="history_txn_created_idx"),
+            models.Index(fields=["action", "-created_at"], name="history_action_created_idx"),
+            models.Index(fields=["performed_by", "-created_at"], name="history_user_created_idx"),
+        ]
 
     def __str__(self):
         return f"{self.get_action_display()} - Transaction #{self.transaction_id} - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
 
+
+class ArchiveSegment(models.Model):
+    """A closed period moved out of the hot tables into compressed files (see transactions/archive.py)"""
+    period_start = models.DateTimeField(unique=True)
+    period_end = models.DateTimeField(unique=True)
+    # Paths relative to ARCHIVE_ROOT
+    transactions_file = models.CharField(max_length=255)
+    history_file = models.CharField(max_length=255)
+    transaction_count = models.PositiveIntegerField(default=0)
+    history_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "archive_segments"
+        verbose_name = "Période archivée"
+        verbose_name_plural = "Périodes archivées"
+        ordering = ["period_start"]
+
+    def __str__(self):
+        return f"{self.period_start:%Y-%m-%d} - {self.period_end:%Y-%m-%d}"
+
+
+class BalanceSnapshot(models.Model):
+    """Totals of one cash box's transactions in an archived period"""
+    segment = models.ForeignKey(ArchiveSegment, on_delete=models.CASCADE, related_name="snapshots")
+    cash_box = models.ForeignKey(CashBox, on_delete=models.PROTECT, related_name="snapshots")
+    total_recettes = models.BigIntegerField(default=0)
+    total_depenses = models.BigIntegerField(default=0)
+    transaction_count = models.PositiveIntegerField(default=0)
+    # Balance of the box at the end of the period
+    closing_balance = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = "balance_snapshots"
+        verbose_name = "Solde archivé"
+        verbose_name_plural = "Soldes archivés"
+        constraints = [
+            models.UniqueConstraint(fields=["segment", "cash_box"], name="balance_snapshots_segment_box"),
+        ]
+
+    @classmethod
+    def archived_totals(cls, cash_box_ids=None):
+        """{cash_box_id: (total_recettes, total_depenses, transaction_count)} of the archived periods"""
+        queryset = cls.objects.all()
+        if cash_box_ids is not None:
+            queryset = queryset.filter(cash_box_id__in=cash_box_ids)
+        rows = queryset.values("cash_box_id").annotate(
+            recettes=Sum("total_recettes"), depenses=Sum("total_depenses"), count=Sum("transaction_count"),
+        ).order_by()
+        return {row["cash_box_id"]: (row["recettes"], row["depenses"], row["count"]) for row in rows}
+
+    @classmethod
+    def archived_count(cls, cash_box_id=None):
+        """Number of archived transactions, of one cash box or of all of them"""
+        queryset = cls.objects.all()
+        if cash_box_id is not None:
+            queryset = queryset.filter(cash_box_id=cash_box_id)
+        return queryset.aggregate(count=Sum("transaction_count"))["count"] or 0
+
+
+def page_balances(rows):
+    """
+    Cumulative balance of its cash box for each distinct (cash_box_id,
+    created_at) of the page, as ``TransactionSerializer.get_balance`` reports it,
+    in two queries whatever the list filters:
+    - one SUM of the signed amounts per box before the page, archive snapshots included,
+    - ``SUM(signed_amount) OVER (PARTITION BY cash_box_id ORDER BY created_at)``
+      over the page's time span, keeping only the rows at the page's timestamps.
+    """
+    keys = {(row["cash_box_id"], row["created_at"]) for row in rows}
+    if not keys:
+        return {}
+    boxes = {box for box, _ in keys}
+    stamps = sorted({stamp for _, stamp in keys})
+    ledger = Transaction.objects.filter(cash_box_id__in=boxes)
+
+    opening = dict.fromkeys(boxes, 0)
+    before = ledger.filter(created_at__lt=stamps[0]).values("cash_box_id").annotate(
+        balance=Sum("signed_amount"),
+    ).order_by()
+    archived = BalanceSnapshot.objects.filter(cash_box_id__in=boxes).values("cash_box_id").annotate(
+        balance=Sum(F("total_recettes") - F("total_depenses")),
+    ).order_by()
+    for row in before.union(archived, all=True):
+        opening[row["cash_box_id"]] += row["balance"] or 0
+
+    # Rows sharing a created_at are peers: each one's running sum includes all of them
+    span = ledger.filter(created_at__gte=stamps[0], created_at__lte=stamps[-1]).annotate(
+        running=Window(Sum("signed_amount"), partition_by=F("cash_box_id"), order_by=F("created_at").asc()),
+    ).values("id", "cash_box_id", "created_at", "running")
+    sql, params = span.query.sql_with_params()
+    adapt = connections[span.db].ops.adapt_datetimefield_value
+    at_stamps = Transaction.objects.using(span.db).raw(
+        f"SELECT * FROM ({sql}) span WHERE created_at IN ({', '.join(['%s'] * len(stamps))})",
+        [*params, *(adapt(stamp) for stamp in stamps)],
+    )
+    running = {(row.cash_box_id, row.created_at): row.running for row in at_stamps}
+    return {(box, stamp): opening[box] + (running.get((box, stamp)) or 0) for box, stamp in keys}
+
+
+class IdempotencyKey(models.Model):
+    """
+    Response of a write sent with an ``Idempotency-Key`` header, replayed to
+    the retries of the same request until expires_at (see transactions/idempotency.py).
+    """
+    key = models.CharField(max_length=255)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="idempotency_keys")
+    # Hash of the method, path and body: a key cannot be reused for another request
+    fingerprint = models.CharField(max_length=64)
+    # Both null while the first request is still running
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = "idempotency_keys"
+        verbose_name = "Clé d'idempotence"
+        verbose_name_plural = "Clés d'idempotence"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="idempotency_keys_user_key"),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.user})"
@@ -1,4 +1,121 @@
+"""
+Pagination of the transactions and history lists.
+
+An exact ``COUNT(*)`` reads every matching row. With COUNT_ESTIMATE_THRESHOLD
+set, large lists are counted from the PostgreSQL planner estimate instead
+(``EXPLAIN``: ``reltuples`` scaled by the table size, times the selectivity
+of the filters), and the response flags ``count_is_estimate``. Below the
+threshold, on SQLite, or with ``?exact_count=true`` the count stays exact.
+Lists that include archived rows read the archive only up to the requested
+page and count the rest from the segments' stored row counts, flagged as an
+estimate when filters apply.
+"""
+import json
+from django.conf import settings
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+
+
+def wants_exact_count(params):
+    """?exact_count=true: always run the exact COUNT(*)"""
+    return params.get("exact_count", "false").lower() == "true"
+
+
+def positive_int(value, default):
+    """``value`` as a strictly positive integer, else ``default`` (like PageNumberPagination.get_page_size)"""
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return default
+    return number if number > 0 else default
+
+
+def planner_estimate(queryset):
+    """Rows the PostgreSQL planner expects the queryset to return, or None on other databases"""
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    sql, params = queryset.order_by().values("pk").query.get_compiler(queryset.db).as_sql()
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def large_estimate(queryset):
+    """The planner estimate when estimates are enabled and it reaches the threshold, else None"""
+    threshold = settings.COUNT_ESTIMATE_THRESHOLD
+    if not threshold:
+        return None
+    estimate = planner_estimate(queryset)
+    return estimate if estimate is not None and estimate >= threshold else None
+
+
+def count_rows(queryset, exact=False):
+    """(count, is_estimate) of a queryset"""
+    estimate = None if exact else large_estimate(queryset)
+    if estimate is not None:
+        return estimate, True
+    return queryset.count(), False
+
+
+class EstimatedPage(Page):
+    def has_next(self):
+        if self.paginator.count_is_estimate:
+            # The estimate can be off either way: a full page may have a next one
+            return len(self) == self.paginator.per_page
+        return super().has_next()
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator counting querysets with ``count_rows``"""
+    # True: always run the exact COUNT(*), set before the first page is read
+    exact = False
+
+    @cached_property
+    def counted(self):
+        if isinstance(self.object_list, QuerySet):
+            return count_rows(self.object_list, self.exact)
+        if hasattr(self.object_list, "count_rows"):
+            # Hot and archived rows (archive.WithArchive): the archive part is estimated
+            return self.object_list.count_rows(self.exact)
+        return super().count, False
+
+    @property
+    def count(self):
+        return self.counted[0]
+
+    @property
+    def count_is_estimate(self):
+        return self.counted[1]
+
+    def validate_number(self, number):
+        if not self.count_is_estimate:
+            return super().validate_number(number)
+        # Pages past the estimate may still hold rows
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages["invalid_page"])
+        if number < 1:
+            raise EmptyPage(self.error_messages["min_page"])
+        return number
+
+    def page(self, number):
+        if not self.count_is_estimate:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(self.object_list[bottom:bottom + self.per_page], number, self)
+
+    def _get_page(self, *args, **kwargs):
+        return EstimatedPage(*args, **kwargs)
 
 
 class TransactionPagination(PageNumberPagination):
@@ -7,4 +124,18 @@ class TransactionPagination(PageNumberPagination):
     page_size_query_param = 'page_size'
     max_page_size = 100
 
+    django_paginator_class = EstimatedCountPaginator
+
+    def get_page_number(self, request, paginator):
+        # paginate_queryset asks for the page number right before counting
+        paginator.exact = wants_exact_count(request.query_params)
+        return super().get_page_number(request, paginator)
 
+    def get_paginated_response(self, data):
+        return Response({
+            "count": self.page.paginator.count,
+            "count_is_estimate": self.page.paginator.count_is_estimate,
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
@@ -0,0 +1,236 @@
+"""
+Declarative range partitioning of ``transactions`` and ``transaction_history``
+by ``created_at`` (PostgreSQL only, optional: see ``manage.py partition_tables``).
+
+A partitioned table's primary key has to include the partition key, so the
+physical key becomes (id, created_at). Ids still come from the table's own
+sequence and stay unique; the models keep ``id`` as their primary key.
+Rows outside every range land in the ``<table>_default`` partition, and
+creating a partition later moves its rows out of it.
+
+Partitions are named ``<table>_y2025m03`` (monthly) or ``<table>_y2025``
+(yearly). A detached partition is an ordinary table that can be archived
+and dropped without touching the live ones.
+"""
+import re
+from datetime import date, datetime
+from django.db import connection
+from django.utils import timezone
+from .models import Transaction, TransactionHistory
+
+PARTITIONED_MODELS = (Transaction, TransactionHistory)
+INTERVALS = ("month", "year")
+
+_NAME_PATTERN = re.compile(r"_y(?P<year>\d{4})(?:m(?P<month>\d{2}))?$")
+
+
+class PartitioningError(Exception):
+    pass
+
+
+def _quote(name):
+    return connection.ops.quote_name(name)
+
+
+def _columns(model):
+    """Column list for copying rows: generated columns are computed by the target table"""
+    return ", ".join(_quote(field.column) for field in model._meta.concrete_fields if not field.generated)
+
+
+def _literal(moment):
+    return f"'{moment.isoformat()}'"
+
+
+def period_start(day, interval):
+    """First day of the month (or year) containing ``day``"""
+    return date(day.year, day.month if interval == "month" else 1, 1)
+
+
+def next_period(start, interval):
+    if interval == "year":
+        return date(start.year + 1, 1, 1)
+    return date(start.year + start.month // 12, start.month % 12 + 1, 1)
+
+
+def partition_name(table, start, interval):
+    suffix = f"y{start:%Y}m{start:%m}" if interval == "month" else f"y{start:%Y}"
+    return f"{table}_{suffix}"
+
+
+def bound(day):
+    """Partition bound: midnight of ``day`` in the project time zone"""
+    return timezone.make_aware(datetime(day.year, day.month, day.day))
+
+
+def is_partitioned(model):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    return row is not None and row[0] == "p"
+
+
+def partitions(model):
+    """[(name, start date or None, interval or None)] of the range partitions, oldest first"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits"
+            " JOIN pg_class child ON child.oid = pg_inherits.inhrelid"
+            " WHERE pg_inherits.inhparent = to_regclass(%s)",
+            [model._meta.db_table],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    found = []
+    for name in names:
+        match = _NAME_PATTERN.search(name)
+        if match is None:
+            found.append((name, None, None))
+            continue
+        month = match["month"]
+        found.append((name, date(int(match["year"]), int(month or 1), 1), "month" if month else "year"))
+    return sorted(found, key=lambda part: (part[1] is None, part[1] or date.min))
+
+
+def current_interval(model, default="month"):
+    """Interval of the existing partitions, so later runs keep the same layout"""
+    for _, start, interval in partitions(model):
+        if interval:
+            return interval
+    return default
+
+
+def ensure_partition(model, start, interval):
+    """
+    Create the partition starting at ``start`` if missing, taking over the
+    rows of the default partition that belong to it. Returns its name if created.
+    """
+    table = model._meta.db_table
+    name = partition_name(table, start, interval)
+    lower, upper = _literal(bound(start)), _literal(bound(next_period(start, interval)))
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", [name])
+        if cursor.fetchone()[0] is not None:
+            return None
+        cursor.execute(
+            f"CREATE TABLE {_quote(name)} (LIKE {_quote(table)}"
+            " INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED)"
+        )
+        default = f"{table}_default"
+        cursor.execute("SELECT to_regclass(%s)", [default])
+        if cursor.fetchone()[0] is not None:
+            # Attaching fails while the default partition holds rows of the new range
+            columns = _columns(model)
+            cursor.execute(
+                f"WITH moved AS (DELETE FROM {_quote(default)}"
+                f" WHERE created_at >= {lower} AND created_at < {upper} RETURNING *)"
+                f" INSERT INTO {_quote(name)} ({columns}) SELECT {columns} FROM moved"
+            )
+        cursor.execute(
+            f"ALTER TABLE {_quote(table)} ATTACH PARTITION {_quote(name)} FOR VALUES FROM ({lower}) TO ({upper})"
+        )
+    return name
+
+
+def ensure_partitions(model, first, last, interval):
+    """Create the partitions covering ``first`` .. ``last`` (dates); returns the created names"""
+    created = []
+    start = period_start(first, interval)
+    while start <= last:
+        name = ensure_partition(model, start, interval)
+        if name:
+            created.append(name)
+        start = next_period(start, interval)
+    return created
+
+
+def default_partition_span(model):
+    """(first, last) dates of the rows waiting in the default partition, or None"""
+    default = f"{model._meta.db_table}_default"
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", [default])
+        if cursor.fetchone()[0] is None:
+            return None
+        cursor.execute(f"SELECT min(created_at), max(created_at) FROM {_quote(default)}")
+        first, last = cursor.fetchone()
+    if first is None:
+        return None
+    return timezone.localtime(first).date(), timezone.localtime(last).date()
+
+
+def convert(model, interval, ahead_until):
+    """
+    Replace the plain table of ``model`` by a partitioned one with the same
+    columns, indexes and foreign keys, and copy its rows over. Runs inside
+    the caller's transaction and locks the table for its whole duration.
+    """
+    table = model._meta.db_table
+    legacy = f"{table}_unpartitioned"
+    sequence = f"{table}_id_seq"
+    with connection.cursor() as cursor:
+        # Deferred FK checks of earlier writes would block the DROP TABLE below
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        cursor.execute(f"LOCK TABLE {_quote(table)} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(
+            "SELECT conname FROM pg_constraint WHERE confrelid = to_regclass(%s)", [table]
+        )
+        referencing = [row[0] for row in cursor.fetchall()]
+        if referencing:
+            raise PartitioningError(
+                f"{table} est référencée par des clés étrangères ({', '.join(referencing)})"
+            )
+        cursor.execute(
+            "SELECT pg_get_indexdef(indexrelid) FROM pg_index"
+            " WHERE indrelid = to_regclass(%s) AND NOT indisprimary",
+            [table],
+        )
+        index_definitions = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint"
+            " WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+            [table],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f"SELECT min(created_at) FROM {_quote(table)}")
+        oldest = cursor.fetchone()[0]
+
+        cursor.execute(f"ALTER TABLE {_quote(table)} RENAME TO {_quote(legacy)}")
+        cursor.execute(
+            f"CREATE TABLE {_quote(table)} (LIKE {_quote(legacy)}"
+            " INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED) PARTITION BY RANGE (created_at)"
+        )
+        cursor.execute(f"CREATE TABLE {_quote(table + '_default')} PARTITION OF {_quote(table)} DEFAULT")
+
+    first = timezone.localtime(oldest).date() if oldest else timezone.localdate()
+    created = ensure_partitions(model, first, ahead_until, interval)
+
+    with connection.cursor() as cursor:
+        columns = _columns(model)
+        cursor.execute(f"INSERT INTO {_quote(table)} ({columns}) SELECT {columns} FROM {_quote(legacy)}")
+        # Drops the identity sequence with it; the new one takes over its name
+        cursor.execute(f"DROP TABLE {_quote(legacy)}")
+        cursor.execute(f"CREATE SEQUENCE {_quote(sequence)} OWNED BY {_quote(table)}.id")
+        cursor.execute(f"ALTER TABLE {_quote(table)} ALTER COLUMN id SET DEFAULT nextval('{sequence}')")
+        cursor.execute(
+            f"SELECT setval('{sequence}', COALESCE(max(id), 1), max(id) IS NOT NULL) FROM {_quote(table)}"
+        )
+        cursor.execute(f"ALTER TABLE {_quote(table)} ADD CONSTRAINT {_quote(table + '_pkey')} PRIMARY KEY (id, created_at)")
+        for definition in index_definitions:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {_quote(table)} ADD CONSTRAINT {_quote(name)} {definition}")
+        cursor.execute(f"ANALYZE {_quote(table)}")
+    return created
+
+
+def detach_before(model, cutoff):
+    """Detach the partitions entirely older than ``cutoff`` (date); returns their names"""
+    table = model._meta.db_table
+    detached = []
+    with connection.cursor() as cursor:
+        for name, start, interval in partitions(model):
+            if start is None or next_period(start, interval) > cutoff:
+                continue
+            cursor.execute(f"ALTER TABLE {_quote(table)} DETACH PARTITION {_quote(name)}")
+            detached.append(name)
+    return detached
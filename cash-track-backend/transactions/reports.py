@@ -1,20 +1,13 @@
 """
 Report generation utilities for PDF and XLSX formats
+
+ReportLab and openpyxl are imported inside the generators: reports are rare,
+so a worker only pays their import time and memory on the first report.
 """
 from io import BytesIO
 from datetime import datetime
 from django.http import HttpResponse
 from django.db.models import Sum, Q
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.utils import get_column_letter
 from .models import Transaction
 
 
@@ -26,6 +19,12 @@ def hex_to_rgb(hex_color):
 
 def generate_pdf_report(transactions, report_type, period, start_date, end_date, user_name):
     """Generate a PDF report with beautiful design"""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
     story = []
@@ -244,6 +243,10 @@ def generate_pdf_report(transactions, report_type, period, start_date, end_date,
 
 def generate_xlsx_report(transactions, report_type, period, start_date, end_date, user_name):
     """Generate an XLSX report with the same format as frontend"""
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+    from openpyxl.utils import get_column_letter
+
     wb = Workbook()
     ws = wb.active
     ws.title = "Rapport"
@@ -353,7 +356,7 @@ def generate_xlsx_report(transactions, report_type, period, start_date, end_date
             cell.fill = PatternFill(start_color=fill_color, end_color=fill_color, fill_type="solid")
             cell.alignment = Alignment(
                 horizontal='left' if col_idx == 1 else 'center',
-                vertical='middle',
+                vertical='center',
                 wrap_text=True
             )
             
@@ -385,7 +388,7 @@ def generate_xlsx_report(transactions, report_type, period, start_date, end_date
             cell.fill = PatternFill(start_color=primary_blue, end_color=primary_blue, fill_type="solid")
             cell.alignment = Alignment(
                 horizontal='left' if col_idx == 1 else 'center',
-                vertical='middle',
+                vertical='center',
                 wrap_text=True
             )
             
@@ -434,7 +437,7 @@ def generate_xlsx_report(transactions, report_type, period, start_date, end_date
         label_cell = ws.cell(row=row, column=1)
         label_cell.value = label
         label_cell.font = Font(bold=True, size=11, color=primary_blue)
-        label_cell.alignment = Alignment(horizontal='left', vertical='middle')
+        label_cell.alignment = Alignment(horizontal='left', vertical='center')
         fill_color = white if idx % 2 == 0 else light_gray
         label_cell.fill = PatternFill(start_color=fill_color, end_color=fill_color, fill_type="solid")
         label_cell.border = Border(
@@ -448,7 +451,7 @@ def generate_xlsx_report(transactions, report_type, period, start_date, end_date
         value_cell = ws.cell(row=row, column=2)
         value_cell.value = value
         value_cell.font = Font(bold=True, size=11, color=primary_blue)
-        value_cell.alignment = Alignment(horizontal='left', vertical='middle')
+        value_cell.alignment = Alignment(horizontal='left', vertical='center')
         value_cell.fill = PatternFill(start_color=fill_color, end_color=fill_color, fill_type="solid")
         value_cell.border = Border(
             left=Side(style='thin', color=gray),
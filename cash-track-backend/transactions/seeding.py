@@ -0,0 +1,266 @@
+"""
+Synthetic ledger generator for ``manage.py seed_bench``.
+
+Rows are generated in batches and written with raw multi-row inserts (COPY on
+PostgreSQL), bypassing model signals and ``auto_now`` so the timestamps, the
+history entries and their snapshots are exactly those generated here.
+"""
+import csv
+import io
+import json
+import random
+from datetime import timedelta
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+from accounts.models import User
+from categories.models import Category
+from .models import CashBox, CashBoxBalance, Transaction, TransactionHistory, amount_text
+
+BENCH_EMAIL_DOMAIN = "bench.cashtrack"
+BENCH_PASSWORD = "bench-password-2024"
+
+BENCH_CATEGORIES = [
+    ("Ventes", "recette", "#10B981", "ShoppingCart"),
+    ("Prestations de services", "recette", "#0B74FF", "Briefcase"),
+    ("Subventions", "recette", "#8B5CF6", "Gift"),
+    ("Loyer", "depense", "#EF4444", "Home"),
+    ("Salaires", "depense", "#F59E0B", "Users"),
+    ("Fournitures", "depense", "#64748B", "Package"),
+    ("Transport", "depense", "#0EA5E9", "Truck"),
+    ("Électricité", "depense", "#EAB308", "Zap"),
+    ("Télécommunications", "depense", "#14B8A6", "Phone"),
+    ("Maintenance", "depense", "#F97316", "Wrench"),
+    ("Divers", "both", "#94A3B8", "FolderOpen"),
+]
+CLIENTS = ["Société Ivoire Distribution", "Orange CI", "Banque Atlantique", "Groupe Sifca", "Client comptoir"]
+SUPPLIERS = ["CIE", "Sodeci", "Total Energies", "Librairie de France", "Garage Central", "Bolloré Logistics"]
+
+TRANSACTION_COLUMNS = [
+    "id", "type", "description", "amount", "ref", "exporter_fournisseur",
+    "category_id", "cash_box_id", "created_by_id", "modified_by_id", "created_at", "updated_at",
+]
+HISTORY_COLUMNS = [
+    "transaction_id", "cash_box_id", "action", "transaction_data", "performed_by_id", "created_at", "changes",
+]
+
+
+def bench_email(index):
+    return f"bench-{index}@{BENCH_EMAIL_DOMAIN}"
+
+
+def bench_users():
+    return User.objects.filter(email__endswith=f"@{BENCH_EMAIL_DOMAIN}")
+
+
+def bench_category_name(name):
+    return f"{name} (bench)"
+
+
+def ensure_bench_users(count):
+    """Bench users sharing BENCH_PASSWORD: #0 is admin, #1 read-only, the others users"""
+    existing = set(bench_users().values_list("email", flat=True))
+    password = make_password(BENCH_PASSWORD)
+    User.objects.bulk_create([
+        User(
+            username=f"bench-{index}",
+            email=bench_email(index),
+            name=f"Bench {index}",
+            role="admin" if index == 0 else "readonly" if index == 1 else "user",
+            password=password,
+        )
+        for index in range(count)
+        if bench_email(index) not in existing
+    ])
+    return list(bench_users().order_by("id"))
+
+
+def ensure_bench_categories():
+    existing = set(Category.objects.values_list("name", flat=True))
+    Category.objects.bulk_create([
+        Category(name=bench_category_name(name), type=type_, color=color, icon=icon)
+        for name, type_, color, icon in BENCH_CATEGORIES
+        if bench_category_name(name) not in existing
+    ])
+    return list(Category.objects.filter(name__in=[bench_category_name(name) for name, *_ in BENCH_CATEGORIES]))
+
+
+def bench_cash_box_name(index):
+    return f"Caisse bench {index}"
+
+
+def ensure_bench_cash_boxes(count):
+    """The default box plus ``count - 1`` bench boxes"""
+    boxes = [CashBox.get_default()]
+    for index in range(1, count):
+        box, _ = CashBox.objects.get_or_create(name=bench_cash_box_name(index))
+        boxes.append(box)
+    return boxes
+
+
+def _quote(name):
+    return connection.ops.quote_name(name)
+
+
+def insert_rows(model, columns, rows):
+    """Insert raw value tuples: COPY on PostgreSQL, batched INSERT elsewhere"""
+    if not rows:
+        return
+    table = _quote(model._meta.db_table)
+    column_list = ", ".join(_quote(column) for column in columns)
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            sql = f"COPY {table} ({column_list}) FROM STDIN WITH (FORMAT csv)"
+            raw_cursor = cursor.cursor
+            if hasattr(raw_cursor, "copy_expert"):
+                buffer.seek(0)
+                raw_cursor.copy_expert(sql, buffer)
+            else:
+                with raw_cursor.copy(sql) as copy:
+                    copy.write(buffer.getvalue())
+        else:
+            placeholders = ", ".join(["%s"] * len(columns))
+            cursor.executemany(f"INSERT INTO {table} ({column_list}) VALUES ({placeholders})", rows)
+
+
+class LedgerGenerator:
+    """
+    Append-only ledger: ``count`` transactions spread over the last ``days``
+    days in chronological (id) order, each with a "created" history entry and
+    on average ``history_ratio - 1`` "updated" ones.
+    """
+
+    def __init__(self, users, categories, count, history_ratio=1.0, days=730, seed=0, cash_boxes=None):
+        self.rng = random.Random(seed)
+        self.writers = [user for user in users if user.role != "readonly"] or users
+        self.categories = {
+            kind: [category for category in categories if category.type in (kind, "both")]
+            for kind in ("recette", "depense")
+        }
+        self.cash_box_ids = [box.pk for box in cash_boxes or [CashBox.get_default()]]
+        self.count = count
+        self.extra_updates = max(0.0, history_ratio - 1)
+        self.now = timezone.now()
+        self.start = self.now - timedelta(days=days)
+        self.step = timedelta(days=days).total_seconds() / max(count, 1)
+        self.index = 0
+        self.next_id = (Transaction.objects.aggregate(top=Max("id"))["top"] or 0) + 1
+        self.adapt_datetime = connection.ops.adapt_datetimefield_value
+        self.postgres = connection.vendor == "postgresql"
+
+    def _row(self, values):
+        """Adapt Python values for insert_rows (JSON text, database datetimes)"""
+        row = []
+        for value in values:
+            if isinstance(value, dict):
+                value = json.dumps(value)
+            elif hasattr(value, "tzinfo"):
+                value = value.isoformat() if self.postgres else self.adapt_datetime(value)
+            row.append(value)
+        return row
+
+    def _amount(self, kind):
+        # Log-normal amounts in whole FCFA, receipts larger than expenses
+        mu = 12.0 if kind == "recette" else 10.5
+        return max(100, int(round(self.rng.lognormvariate(mu, 1.1), -2)))
+
+    def batches(self, batch_size):
+        """Yield (transaction rows, history rows) batches ready for insert_rows"""
+        produced = 0
+        while produced < self.count:
+            size = min(batch_size, self.count - produced)
+            transactions, history = [], []
+            for _ in range(size):
+                self._generate(transactions, history)
+            produced += size
+            yield transactions, history
+
+    def _generate(self, transactions, history):
+        rng = self.rng
+        # One random instant per time slot: chronological and within the span
+        created_at = self.start + timedelta(seconds=(self.index + rng.random()) * self.step)
+        self.index += 1
+        txn_id = self.next_id
+        self.next_id += 1
+
+        kind = "recette" if rng.random() < 0.35 else "depense"
+        category = rng.choice(self.categories[kind]) if self.categories[kind] and rng.random() < 0.95 else None
+        amount = self._amount(kind)
+        counterpart = rng.choice(CLIENTS if kind == "recette" else SUPPLIERS)
+        ref = f"REF-{created_at:%Y}-{txn_id:07d}" if rng.random() < 0.7 else None
+        description = f"{category.name if category else 'Opération'} - {counterpart}"
+        author = rng.choice(self.writers)
+        # Single box: no draw, so a seed keeps generating the same ledger
+        box_id = rng.choice(self.cash_box_ids) if len(self.cash_box_ids) > 1 else self.cash_box_ids[0]
+
+        def snapshot():
+            return {
+                "type": kind,
+                "description": description,
+                "amount": amount_text(amount),
+                "ref": ref,
+                "exporter_fournisseur": counterpart,
+                "category_id": category.id if category else None,
+                "category_name": category.name if category else None,
+            }
+
+        history.append(self._row([txn_id, box_id, "created", snapshot(), author.id, created_at, None]))
+
+        updates = int(self.extra_updates) + (1 if rng.random() < self.extra_updates % 1 else 0)
+        modified_by, updated_at = None, created_at
+        for _ in range(updates):
+            updated_at = min(updated_at + timedelta(hours=rng.uniform(0.1, 72)), self.now)
+            old_amount = amount
+            amount = self._amount(kind)
+            modified_by = rng.choice(self.writers)
+            history.append(self._row([
+                txn_id, box_id, "updated", snapshot(), modified_by.id, updated_at,
+                {"amount": {"old": amount_text(old_amount), "new": amount_text(amount)}},
+            ]))
+
+        transactions.append(self._row([
+            txn_id, kind, description, amount, ref, counterpart,
+            category.id if category else None, box_id, author.id,
+            modified_by.id if modified_by else None, created_at, updated_at,
+        ]))
+
+
+def reset_sequences(*models):
+    """Move the id sequences past explicitly inserted ids (PostgreSQL)"""
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), list(models)):
+            cursor.execute(sql)
+
+
+def analyze(*models):
+    """Refresh planner statistics after a bulk load"""
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("ANALYZE " + ", ".join(_quote(model._meta.db_table) for model in models))
+        elif connection.vendor == "sqlite":
+            cursor.execute("ANALYZE")
+
+
+def clear_bench_data():
+    """Delete the bench users, their transactions and history, the bench categories and cash boxes"""
+    user_ids = list(bench_users().values_list("id", flat=True))
+    if user_ids:
+        placeholders = ", ".join(["%s"] * len(user_ids))
+        with connection.cursor() as cursor:
+            # Raw deletes: no per-row signals on millions of rows
+            cursor.execute(
+                f"DELETE FROM {_quote(TransactionHistory._meta.db_table)} WHERE performed_by_id IN ({placeholders})",
+                user_ids,
+            )
+            cursor.execute(
+                f"DELETE FROM {_quote(Transaction._meta.db_table)} WHERE created_by_id IN ({placeholders})",
+                user_ids,
+            )
+        bench_users().delete()
+    CashBox.objects.filter(name__startswith=bench_cash_box_name(""), transactions__isnull=True).delete()
+    CashBoxBalance.refresh()
+    Category.objects.filter(name__in=[bench_category_name(name) for name, *_ in BENCH_CATEGORIES]).delete()
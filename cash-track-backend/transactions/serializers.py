@@ -1,19 +1,157 @@
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
-from .models import Transaction, TransactionHistory
+from django.db import transaction as db_transaction
+from .models import CashBox, CashBoxBalance, Transaction, TransactionHistory, page_balances, signed_amount
 from categories.serializers import CategorySerializer
 from accounts.serializers import UserSerializer
+from cash_track_api.metrics import TimedSerializerMixin
 
 
-class TransactionSerializer(serializers.ModelSerializer):
+class IncludedUsersMixin:
+    """
+    Compact user representation: when the serializer context carries an
+    ``included_users`` dict, user fields are rendered as plain IDs and each
+    distinct user is serialized once into that dict.
+    """
+
+    def user_reference(self, user):
+        """Return the user ID and register the user in the included map"""
+        included = self.context["included_users"]
+        key = str(user.pk)
+        if key not in included:
+            included[key] = UserSerializer(user).data
+        return user.pk
+
+    @property
+    def compact_users(self):
+        return self.context.get("included_users") is not None
+
+
+class SparseFieldsetMixin:
+    """
+    Sparse fieldsets: ``fields`` / ``omit`` sets in the serializer context
+    drop the other read fields, so their values are never computed.
+
+    ``field_columns`` maps a field to the model columns it reads (defaults to
+    the field name) and ``field_relations`` to the relation it needs joined,
+    which lets views narrow the SQL with ``only()`` and ``select_related()``.
+    """
+    field_columns = {}
+    field_relations = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        selected = self.selected_field_names(
+            self.context.get("fields"), self.context.get("omit")
+        )
+        if selected is not None:
+            for name in list(self.fields):
+                if name not in selected and not self.fields[name].write_only:
+                    self.fields.pop(name)
+
+    @classmethod
+    def selected_field_names(cls, fields=None, omit=None):
+        """Return the field names to render, or None for all of them"""
+        if not fields and not omit:
+            return None
+        selected = list(cls.Meta.fields)
+        if fields:
+            selected = [name for name in selected if name in fields]
+        if omit:
+            selected = [name for name in selected if name not in omit]
+        return selected
+
+    @classmethod
+    def narrow_queryset(cls, queryset, fields=None, omit=None):
+        """Restrict loaded columns and joins to what the selected fields need"""
+        selected = cls.selected_field_names(fields, omit)
+        if selected is None:
+            return queryset
+        columns = {"id"}
+        relations = []
+        for name in selected:
+            columns.update(cls.field_columns.get(name, (name,)))
+            if name in cls.field_relations:
+                relations.append(cls.field_relations[name])
+        queryset = queryset.select_related(None)
+        if relations:
+            queryset = queryset.select_related(*relations)
+        return queryset.only(*sorted(columns))
+
+
+class AmountField(serializers.DecimalField):
+    """
+    Whole FCFA amount, stored as an integer but read and written as before
+    ("1500.00"). Amounts with a fractional part are refused.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(max_digits=15, decimal_places=2, **kwargs)
+
+    def to_internal_value(self, data):
+        value = super().to_internal_value(data)
+        if value != value.to_integral_value():
+            raise ValidationError("Le montant doit être un nombre entier de FCFA.")
+        return int(value)
+
+
+class CashBoxSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Serializer for CashBox model, with the totals of its balance row"""
+    current_balance = serializers.SerializerMethodField()
+    total_recettes = serializers.SerializerMethodField()
+    total_depenses = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = CashBox
+        fields = [
+            "id",
+            "name",
+            "description",
+            "is_default",
+            "current_balance",
+            "total_recettes",
+            "total_depenses",
+            "created_at",
+            "updated_at",
+        ]
+        read_only_fields = ["id", "created_at", "updated_at"]
+    
+    def get_current_balance(self, obj):
+        return obj.balance.current_balance
+    
+    def get_total_recettes(self, obj):
+        return float(obj.balance.total_recettes)
+    
+    def get_total_depenses(self, obj):
+        return float(abs(obj.balance.total_depenses))
+    
+    def validate_is_default(self, value):
+        if not value and self.instance is not None and self.instance.is_default:
+            raise ValidationError("Désignez une autre caisse par défaut plutôt que de retirer celle-ci.")
+        return value
+    
+    @db_transaction.atomic
+    def save(self, **kwargs):
+        # A single default box: the new default replaces the previous one
+        if self.validated_data.get("is_default"):
+            others = CashBox.objects.filter(is_default=True)
+            if self.instance is not None:
+                others = others.exclude(pk=self.instance.pk)
+            others.update(is_default=False)
+        return super().save(**kwargs)
+
+
+class TransactionSerializer(TimedSerializerMixin, SparseFieldsetMixin, IncludedUsersMixin, serializers.ModelSerializer):
     """Serializer for Transaction model"""
     category = CategorySerializer(read_only=True)
     category_id = serializers.IntegerField(write_only=True, required=False, allow_null=True)
+    cash_box_id = serializers.IntegerField(required=False)
     created_by = serializers.SerializerMethodField()
     modified_by = serializers.SerializerMethodField()
     description = serializers.CharField(required=False, allow_blank=True, allow_null=True)
     ref = serializers.CharField(required=False, allow_blank=True, allow_null=True)
     exporter_fournisseur = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    amount = AmountField()
     balance = serializers.SerializerMethodField()
     
     class Meta:
@@ -27,6 +165,7 @@ class TransactionSerializer(serializers.ModelSerializer):
             "exporter_fournisseur",
             "category",
             "category_id",
+            "cash_box_id",
             "balance",
             "created_by",
             "created_at",
@@ -35,9 +174,22 @@ class TransactionSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ["id", "balance", "created_by", "created_at", "modified_by", "updated_at"]
     
+    field_columns = {
+        "category_id": (),
+        "cash_box_id": ("cash_box",),
+        "balance": ("created_at", "type", "amount", "cash_box"),
+    }
+    field_relations = {
+        "category": "category",
+        "created_by": "created_by",
+        "modified_by": "modified_by",
+    }
+    
     def get_created_by(self, obj):
         """Return user info or 'Utilisateur supprimé' if null"""
         if obj.created_by is None:
+            if self.compact_users:
+                return None
             return {
                 "id": None,
                 "email": None,
@@ -47,52 +199,55 @@ class TransactionSerializer(serializers.ModelSerializer):
                 "created_at": None,
                 "is_superuser": False
             }
+        if self.compact_users:
+            return self.user_reference(obj.created_by)
         return UserSerializer(obj.created_by).data
     
     def get_modified_by(self, obj):
         """Return user info or 'Utilisateur supprimé' if null"""
         if obj.modified_by is None:
             return None
+        if self.compact_users:
+            return self.user_reference(obj.modified_by)
         return UserSerializer(obj.modified_by).data
     
+    def validate_cash_box_id(self, value):
+        if not CashBox.objects.filter(pk=value).exists():
+            raise ValidationError("Caisse introuvable.")
+        return value
+    
     def get_balance(self, obj):
-        """Calculate cumulative balance up to this transaction"""
-        from django.db.models import Sum, Q
-        from decimal import Decimal
-        
-        # Calculate balance from all transactions up to and including this one
-        # Order by created_at to ensure consistent ordering
-        transactions_up_to = Transaction.objects.filter(
-            created_at__lte=obj.created_at
-        )
-        
-        total_recettes = transactions_up_to.filter(type="recette").aggregate(
-            total=Sum("amount")
-        )["total"] or Decimal('0')
-        
-        total_depenses = abs(transactions_up_to.filter(type="depense").aggregate(
-            total=Sum("amount")
-        )["total"] or Decimal('0'))
-        
-        # Convert to float for calculations
-        total_recettes = float(total_recettes)
-        total_depenses = float(total_depenses)
+        """Cumulative balance of the transaction's cash box up to this transaction"""
+        # Computed once for the whole page (archive snapshots included), kept in
+        # the serializer context shared by the rows of a list
+        key = (obj.cash_box_id, obj.created_at)
+        balances = self.context.get("page_balances")
+        if balances is None or key not in balances:
+            page = self.parent.instance if isinstance(self.parent, serializers.ListSerializer) else [obj]
+            balances = page_balances([{"cash_box_id": item.cash_box_id, "created_at": item.created_at} for item in page])
+            self.context["page_balances"] = balances
+        balance = balances[key]
         
         # Add current transaction amount
         if obj.type == "recette":
-            total_recettes += float(obj.amount)
+            balance += obj.amount
         else:
-            total_depenses += abs(float(obj.amount))
+            balance -= abs(obj.amount)
         
-        return float(total_recettes - total_depenses)
+        return float(balance)
     
+    @db_transaction.atomic
     def create(self, validated_data):
         category_id = validated_data.pop("category_id", None)
         request = self.context.get("request")
+        if "cash_box_id" not in validated_data:
+            validated_data["cash_box_id"] = CashBox.get_default().pk
         
-        # Validate that a dépense doesn't exceed current balance
+        # Validate that a dépense doesn't exceed the balance of its cash box.
+        # The box's balance row stays locked until the transaction is saved.
         if validated_data.get("type") == "depense":
-            current_balance = Transaction.get_current_balance()
+            box_id = validated_data["cash_box_id"]
+            current_balance = CashBoxBalance.lock(box_id)[box_id].current_balance
             expense_amount = float(validated_data.get("amount", 0))
             
             if expense_amount > current_balance:
@@ -112,39 +267,47 @@ class TransactionSerializer(serializers.ModelSerializer):
         
         return super().create(validated_data)
     
+    @db_transaction.atomic
     def update(self, instance, validated_data):
         category_id = validated_data.pop("category_id", None)
         request = self.context.get("request")
         
-        # Validate that a dépense doesn't exceed current balance
-        # Check if type is being changed to dépense or amount is being increased
+        # Validate that the update leaves neither the transaction's old box
+        # nor its new box with a negative balance
         new_type = validated_data.get("type", instance.type)
         new_amount = validated_data.get("amount", instance.amount)
+        new_box_id = validated_data.get("cash_box_id", instance.cash_box_id)
         
-        if new_type == "depense":
-            # Calculate current balance excluding the current transaction being updated
-            from django.db.models import Sum
-            from decimal import Decimal
-            
-            # Get all transactions except the one being updated
-            all_transactions = Transaction.objects.exclude(id=instance.id)
-            total_recettes = all_transactions.filter(type="recette").aggregate(
-                total=Sum("amount")
-            )["total"] or Decimal('0')
+        if (new_type, new_amount, new_box_id) != (instance.type, instance.amount, instance.cash_box_id):
+            # Lock the balance rows the update will move (old and new box)
+            balances = CashBoxBalance.lock(instance.cash_box_id, new_box_id)
+            old_signed = signed_amount(instance.type, instance.amount)
+            new_signed = signed_amount(new_type, new_amount)
+            moved = new_box_id != instance.cash_box_id
             
-            total_depenses = abs(all_transactions.filter(type="depense").aggregate(
-                total=Sum("amount")
-            )["total"] or Decimal('0'))
+            # A recette taken out of its box lowers that box's balance
+            if moved and old_signed > 0:
+                remaining = balances[instance.cash_box_id].current_balance - old_signed
+                if remaining < 0:
+                    raise ValidationError({
+                        "cash_box_id": f"Retirer cette recette ({old_signed:,.0f} FCFA) de sa caisse rendrait son solde négatif ({remaining:,.0f} FCFA). Solde insuffisant."
+                    })
             
-            # Calculate balance without the current transaction
-            balance_without_current = float(total_recettes - total_depenses)
+            # Take the transaction being updated out of its box's balance
+            balance_without_current = balances[new_box_id].current_balance
+            if not moved:
+                balance_without_current -= old_signed
             
-            # Add the new expense amount
-            new_expense_amount = float(new_amount)
-            
-            if new_expense_amount > balance_without_current:
+            if new_type == "depense":
+                new_expense_amount = float(new_amount)
+                if new_expense_amount > balance_without_current:
+                    raise ValidationError({
+                        "amount": f"Le montant de la dépense ({new_expense_amount:,.0f} FCFA) dépasse le solde disponible ({balance_without_current:,.0f} FCFA). Solde insuffisant."
+                    })
+            elif not moved and new_signed < old_signed and balance_without_current + new_signed < 0:
+                # A smaller recette in the same box
                 raise ValidationError({
-                    "amount": f"Le montant de la dépense ({new_expense_amount:,.0f} FCFA) dépasse le solde disponible ({balance_without_current:,.0f} FCFA). Solde insuffisant."
+                    "amount": f"Avec cette recette ({new_signed:,.0f} FCFA), le solde de la caisse deviendrait négatif ({balance_without_current + new_signed:,.0f} FCFA). Solde insuffisant."
                 })
         
         if category_id is not None:
@@ -163,7 +326,7 @@ class TransactionSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
 
-class TransactionHistorySerializer(serializers.ModelSerializer):
+class TransactionHistorySerializer(TimedSerializerMixin, SparseFieldsetMixin, IncludedUsersMixin, serializers.ModelSerializer):
     """Serializer for TransactionHistory model"""
     performed_by = serializers.SerializerMethodField()
     action_display = serializers.CharField(source='get_action_display', read_only=True)
@@ -182,9 +345,18 @@ class TransactionHistorySerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ["id", "created_at"]
     
+    field_columns = {
+        "action_display": ("action",),
+    }
+    field_relations = {
+        "performed_by": "performed_by",
+    }
+    
     def get_performed_by(self, obj):
         """Return user info or None if null"""
         if obj.performed_by is None:
             return None
+        if self.compact_users:
+            return self.user_reference(obj.performed_by)
         return UserSerializer(obj.performed_by).data
 
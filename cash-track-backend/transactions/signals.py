@@ -1,7 +1,48 @@
-from django.db.models.signals import post_save, pre_delete
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 from django.db import transaction as db_transaction
-from .models import Transaction, TransactionHistory
+from .models import CashBox, CashBoxBalance, Transaction, TransactionHistory, amount_text
+
+
+@receiver(post_save, sender=CashBox)
+def create_cash_box_balance(sender, instance, created, raw=False, **kwargs):
+    """Every cash box gets its balance row"""
+    if created and not raw:
+        CashBoxBalance.objects.get_or_create(cash_box=instance)
+
+
+@receiver(pre_save, sender=Transaction)
+def load_ledger_entry(sender, instance, raw=False, **kwargs):
+    """Stored values of an updated transaction not loaded with all of them (e.g. ``only()``)"""
+    if raw or instance._state.adding or hasattr(instance, "_ledger_entry"):
+        return
+    stored = Transaction.objects.filter(pk=instance.pk).values_list("cash_box_id", "type", "amount").first()
+    if stored is not None:
+        instance._ledger_entry = stored
+
+
+@receiver(post_save, sender=Transaction)
+def update_cash_box_balance(sender, instance, created, raw=False, **kwargs):
+    """Move the cash box totals by the difference between the stored and the saved transaction"""
+    if raw:
+        return
+    entry = (instance.cash_box_id, instance.type, instance.amount)
+    previous = None if created else getattr(instance, "_ledger_entry", None)
+    if previous is None:
+        CashBoxBalance.apply(*entry)
+    elif previous[:2] == entry[:2]:
+        # Same box and type: one update by the amount difference
+        if previous[2] != entry[2]:
+            CashBoxBalance.apply(*entry[:2], entry[2] - previous[2])
+    else:
+        CashBoxBalance.apply(*previous, sign=-1)
+        CashBoxBalance.apply(*entry)
+    instance._ledger_entry = entry
+
+
+@receiver(post_delete, sender=Transaction)
+def remove_from_cash_box_balance(sender, instance, **kwargs):
+    CashBoxBalance.apply(instance.cash_box_id, instance.type, instance.amount, sign=-1)
 
 
 @receiver(post_save, sender=Transaction)
@@ -17,11 +58,12 @@ def create_transaction_history(sender, instance, created, **kwargs):
             # Transaction was created
             TransactionHistory.objects.create(
                 transaction_id=instance.id,
+                cash_box_id=instance.cash_box_id,
                 action="created",
                 transaction_data={
                     "type": instance.type,
                     "description": instance.description,
-                    "amount": str(instance.amount),
+                    "amount": amount_text(instance.amount),
                     "ref": instance.ref,
                     "exporter_fournisseur": instance.exporter_fournisseur,
                     "category_id": instance.category_id,
@@ -40,11 +82,18 @@ def create_transaction_history(sender, instance, created, **kwargs):
                 old_val = old_values.get(field)
                 new_val = getattr(instance, field)
                 if old_val != new_val:
+                    if field == "amount":
+                        old_val = None if old_val is None else amount_text(old_val)
+                        new_val = amount_text(new_val)
                     changes[field] = {
                         "old": str(old_val) if old_val is not None else None,
                         "new": str(new_val) if new_val is not None else None,
                     }
             
+            old_cash_box_id = old_values.get('cash_box_id', instance.cash_box_id)
+            if old_cash_box_id != instance.cash_box_id:
+                changes['cash_box_id'] = {"old": old_cash_box_id, "new": instance.cash_box_id}
+            
             # Track category changes
             old_category_id = old_values.get('category_id')
             if old_category_id != instance.category_id:
@@ -64,11 +113,12 @@ def create_transaction_history(sender, instance, created, **kwargs):
             if changes:  # Only create history if something actually changed
                 TransactionHistory.objects.create(
                     transaction_id=instance.id,
+                    cash_box_id=instance.cash_box_id,
                     action="updated",
                     transaction_data={
                         "type": instance.type,
                         "description": instance.description,
-                        "amount": str(instance.amount),
+                        "amount": amount_text(instance.amount),
                         "ref": instance.ref,
                         "exporter_fournisseur": instance.exporter_fournisseur,
                         "category_id": instance.category_id,
@@ -89,11 +139,12 @@ def delete_transaction_history(sender, instance, **kwargs):
     with db_transaction.atomic():
         TransactionHistory.objects.create(
             transaction_id=instance.id,
+            cash_box_id=instance.cash_box_id,
             action="deleted",
             transaction_data={
                 "type": instance.type,
                 "description": instance.description,
-                "amount": str(instance.amount),
+                "amount": amount_text(instance.amount),
                 "ref": instance.ref,
                 "exporter_fournisseur": instance.exporter_fournisseur,
                 "category_id": instance.category_id,
@@ -1,3 +1,805 @@
-from django.test import TestCase
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from asgiref.sync import async_to_sync
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from inspect import iscoroutinefunction
+from pathlib import Path
+from unittest import skipUnless
+from unittest.mock import patch
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncRequestFactory, LiveServerTestCase, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework.throttling import UserRateThrottle
+from rest_framework_simplejwt.tokens import AccessToken
+from cash_track_api import queryplans
+from cash_track_api.db_router import ReplicaRouter, replica_reads
+from cash_track_api.testing import FIXTURE_SIZES, QueryBudgetTestCase
+from . import archive, async_views, partitioning, reports, views
+from .models import ArchiveSegment, CashBox, CashBoxBalance, IdempotencyKey, Transaction, TransactionHistory
+from .management.commands import loadtest
+from .seeding import analyze, ensure_bench_users
+from .serializers import TransactionSerializer
 
-# Create your tests here.
+# Queries per request, whatever the number of rows
+BUDGETS = {
+    "list": 4,
+    "list filtered": 4,
+    "list without fast path": 4,
+    "detail": 4,
+    "create": 11,
+    "update": 12,
+    "delete": 7,
+    "stats": 3,
+    "dashboard stats": 4,
+    "analytics": 5,
+    "history": 4,
+    "cash boxes list": 2,
+}
+
+
+class TransactionQueryBudgetTests(QueryBudgetTestCase):
+    """Query count of each transactions endpoint must not grow with the ledger"""
+
+    def check_each_size(self, name, request, expected_status=200):
+        for size in FIXTURE_SIZES:
+            self.grow_ledger(size)
+            with self.subTest(size=size):
+                self.assertQueryBudget(BUDGETS[name], name, request, expected_status)
+
+    def latest_id(self, **filters):
+        return Transaction.objects.filter(**filters).order_by("-id").values_list("id", flat=True).first()
+
+    def test_list(self):
+        url = reverse("transaction-list-create")
+        self.check_each_size("list", lambda: self.client.get(url))
+
+    def test_list_filtered(self):
+        url = reverse("transaction-list-create")
+        self.check_each_size(
+            "list filtered", lambda: self.client.get(url, {"type": "depense", "amount_min": 100}),
+        )
+
+    @override_settings(TRANSACTIONS_FAST_LIST=False)
+    def test_list_without_fast_path(self):
+        url = reverse("transaction-list-create")
+        self.check_each_size("list without fast path", lambda: self.client.get(url))
+
+    def test_detail(self):
+        self.check_each_size(
+            "detail", lambda: self.client.get(reverse("transaction-detail", args=[self.latest_id()])),
+        )
+
+    def test_create(self):
+        url = reverse("transaction-list-create")
+        # Receipts: an expense could be refused for insufficient balance
+        category = next(category for category in self.categories if category.type == "recette")
+        body = {"type": "recette", "amount": "1500.00", "category_id": category.id, "description": "Test"}
+        self.check_each_size("create", lambda: self.client.post(url, body, format="json"), 201)
+
+    def test_update(self):
+        # A larger receipt: lowering one could be refused, the bench ledger may be overdrawn
+        self.check_each_size("update", lambda: self.client.patch(
+            reverse("transaction-detail", args=[self.latest_id(type="recette")]), {"amount": "900000.00"}, format="json",
+        ))
+
+    def test_delete(self):
+        self.check_each_size(
+            "delete", lambda: self.client.delete(reverse("transaction-detail", args=[self.latest_id()])), 204,
+        )
+
+    def test_stats(self):
+        url = reverse("transaction-stats")
+        self.check_each_size("stats", lambda: self.client.get(url))
+
+    def test_dashboard_stats(self):
+        url = reverse("dashboard-stats")
+        self.check_each_size("dashboard stats", lambda: self.client.get(url))
+
+    def test_analytics(self):
+        url = reverse("transaction-analytics")
+        self.check_each_size("analytics", lambda: self.client.get(url))
+
+    def test_history(self):
+        url = reverse("transaction-history")
+        self.check_each_size("history", lambda: self.client.get(url))
+
+    def test_cash_boxes_list(self):
+        url = reverse("cash-box-list-create")
+        self.check_each_size("cash boxes list", lambda: self.client.get(url))
+
+
+@skipUnless(connection.vendor == "postgresql", "query plans need PostgreSQL")
+class QueryPlanTests(QueryBudgetTestCase):
+    """On a large ledger, the key endpoints read the ledger tables through indexes"""
+    size = 20_000
+
+    def test_no_sequential_scans(self):
+        self.grow_ledger(self.size)
+        analyze(Transaction, TransactionHistory)
+        sample = Transaction.objects.exclude(category=None).select_related("category").latest("id")
+        for name, url, params in queryplans.key_requests(sample.category.name, sample.created_by_id, sample.pk):
+            with self.subTest(name):
+                status, plans = queryplans.endpoint_plans(self.client, url, params)
+                self.assertEqual(status, 200)
+                for sql, plan in plans:
+                    self.assertEqual(
+                        queryplans.sequential_scans(plan), [], "\n".join([sql, *queryplans.format_plan(plan)]),
+                    )
+
+
+class CountEstimateTests(QueryBudgetTestCase):
+    """Large lists report the planner estimate as their count, unless ?exact_count=true"""
+
+    def setUp(self):
+        super().setUp()
+        self.grow_ledger(150)
+        analyze(Transaction, TransactionHistory)
+
+    def test_exact_count_by_default(self):
+        response = self.client.get(reverse("transaction-list-create"))
+        self.assertEqual(response.data["count"], 150)
+        self.assertFalse(response.data["count_is_estimate"])
+        response = self.client.get(reverse("transaction-history"))
+        self.assertEqual(response.data["count"], TransactionHistory.objects.count())
+        self.assertFalse(response.data["count_is_estimate"])
+
+    @skipUnless(connection.vendor == "postgresql", "count estimates need PostgreSQL")
+    @override_settings(COUNT_ESTIMATE_THRESHOLD=100)
+    def test_estimate_above_threshold(self):
+        for name, exact in (("transaction-list-create", 150), ("transaction-history", TransactionHistory.objects.count())):
+            with self.subTest(name):
+                response = self.client.get(reverse(name))
+                self.assertTrue(response.data["count_is_estimate"])
+                self.assertAlmostEqual(response.data["count"], exact, delta=exact * 0.2)
+                self.assertIsNotNone(response.data["next"])
+                response = self.client.get(reverse(name), {"exact_count": "true"})
+                self.assertFalse(response.data["count_is_estimate"])
+                self.assertEqual(response.data["count"], exact)
+        response = self.client.get(reverse("transaction-list-create"), {"type": "nothing", "category": "missing"})
+        self.assertFalse(response.data["count_is_estimate"])
+        self.assertEqual(response.data["count"], 0)
+
+    def test_bad_page_parameters(self):
+        for name, default in (("transaction-list-create", 20), ("transaction-history", 50)):
+            with self.subTest(name):
+                for page_size in ("abc", "0", "-5"):
+                    response = self.client.get(reverse(name), {"page_size": page_size})
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(len(response.data["results"]), default)
+                self.assertEqual(self.client.get(reverse(name), {"page": "abc"}).status_code, 404)
+
+
+class ExplainTests(QueryBudgetTestCase):
+    """?explain=1 returns the statements and plans of a read endpoint, to admins only"""
+
+    def test_admin_gets_plans_instead_of_data(self):
+        self.grow_ledger(5)
+        for name in ("transaction-list-create", "transaction-history", "transaction-analytics", "category-stats"):
+            with self.subTest(name):
+                response = self.client.get(reverse(name), {"explain": "1"})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(set(response.data), {"duration_ms", "sql_ms", "query_count", "queries"})
+                self.assertEqual(response.data["query_count"], len(response.data["queries"]))
+                self.assertTrue(all(query["plan"] for query in response.data["queries"] if "plan" in query))
+                self.assertTrue(any("plan" in query for query in response.data["queries"]))
+
+    def test_non_admin_is_refused(self):
+        self.client.force_authenticate(self.users[1])
+        response = self.client.get(reverse("transaction-list-create"), {"explain": "1"})
+        self.assertEqual(response.status_code, 403)
+
+
+class CashBoxLedgerTests(TestCase):
+    """Each cash box has its own balance, overdraft check and scoped statistics"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = ensure_bench_users(1)[0]
+        cls.main = CashBox.get_default()
+        cls.annex = CashBox.objects.create(name="Annexe")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def post(self, **body):
+        return self.client.post(reverse("transaction-list-create"), body, format="json")
+
+    def balance(self, box):
+        return CashBoxBalance.objects.get(cash_box=box).current_balance
+
+    def test_balance_rows_follow_writes(self):
+        created = self.post(type="recette", amount="5000.00", cash_box_id=self.annex.pk).data
+        self.post(type="recette", amount="700.00")
+        self.assertEqual(self.balance(self.annex), 5000)
+        self.assertEqual(self.balance(self.main), 700)
+
+        url = reverse("transaction-detail", args=[created["id"]])
+        self.client.patch(url, {"amount": "4000.00"}, format="json")
+        self.assertEqual(self.balance(self.annex), 4000)
+        self.client.patch(url, {"cash_box_id": self.main.pk}, format="json")
+        self.assertEqual((self.balance(self.annex), self.balance(self.main)), (0, 4700))
+        self.client.delete(url)
+        self.assertEqual(self.balance(self.main), 700)
+
+    def test_overdraft_is_checked_per_box(self):
+        self.post(type="recette", amount="1000.00", cash_box_id=self.annex.pk)
+        refused = self.post(type="depense", amount="500.00")
+        self.assertEqual(refused.status_code, 400)
+        accepted = self.post(type="depense", amount="500.00", cash_box_id=self.annex.pk)
+        self.assertEqual(accepted.status_code, 201)
+        self.assertEqual(self.balance(self.annex), 500)
+
+    def test_default_box_is_resolved_by_the_api(self):
+        # Building a transaction touches no table
+        with self.assertNumQueries(0):
+            Transaction(type="recette", amount=100)
+        created = self.post(type="recette", amount="100.00").data
+        self.assertEqual(created["cash_box_id"], self.main.pk)
+
+    def test_updates_check_the_old_box_too(self):
+        income = self.post(type="recette", amount="1000.00", cash_box_id=self.annex.pk).data
+        self.post(type="depense", amount="800.00", cash_box_id=self.annex.pk)
+        url = reverse("transaction-detail", args=[income["id"]])
+        for change in ({"cash_box_id": self.main.pk}, {"type": "depense", "cash_box_id": self.main.pk}, {"amount": "500.00"}):
+            with self.subTest(change=change):
+                self.assertEqual(self.client.patch(url, change, format="json").status_code, 400)
+        self.assertEqual((self.balance(self.annex), self.balance(self.main)), (200, 0))
+        self.assertEqual(self.client.patch(url, {"amount": "900.00"}, format="json").status_code, 200)
+        self.assertEqual(self.balance(self.annex), 100)
+
+    def test_serializer_and_fast_path_render_the_same_balances(self):
+        for box, type_, amount in ((self.annex, "recette", "1000.00"), (self.main, "recette", "700.00"),
+                                   (self.annex, "depense", "300.00"), (self.main, "depense", "200.00")):
+            self.post(type=type_, amount=amount, cash_box_id=box.pk)
+        url = reverse("transaction-list-create")
+        for params in ({}, {"type": "depense"}, {"cash_box": self.annex.pk}):
+            with self.subTest(params=params):
+                fast = self.client.get(url, params).data["results"]
+                with override_settings(TRANSACTIONS_FAST_LIST=False):
+                    self.assertEqual(self.client.get(url, params).data["results"], fast)
+
+    def test_amounts_are_whole_fcfa(self):
+        created = self.post(type="recette", amount="5000.00", cash_box_id=self.annex.pk)
+        self.assertEqual(created.data["amount"], "5000.00")
+        self.assertEqual(self.post(type="recette", amount="10.50").status_code, 400)
+        spent = self.post(type="depense", amount=1200, cash_box_id=self.annex.pk).data
+        self.assertEqual(spent["amount"], "1200.00")
+        self.assertEqual(Transaction.objects.get(pk=spent["id"]).signed_amount, -1200)
+        history = TransactionHistory.objects.get(transaction_id=spent["id"])
+        self.assertEqual(history.transaction_data["amount"], "1200.00")
+
+    def test_stats_are_scoped_by_cash_box(self):
+        self.post(type="recette", amount="1000.00", cash_box_id=self.annex.pk)
+        self.post(type="recette", amount="300.00")
+        url = reverse("transaction-stats")
+        self.assertEqual(self.client.get(url).data["current_balance"], 1300)
+        scoped = self.client.get(url, {"cash_box": self.annex.pk}).data
+        self.assertEqual((scoped["current_balance"], scoped["transaction_count"]), (1000, 1))
+        listed = self.client.get(reverse("transaction-list-create"), {"cash_box": self.main.pk}).data
+        self.assertEqual(listed["count"], 1)
+
+
+class IncludedUsersTests(TestCase):
+    """?include=users lists each user once and leaves only their ID in the rows"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin, _, cls.user = ensure_bench_users(3)
+        for created_by, amount in ((cls.admin, "1000.00"), (cls.user, "2000.00"), (cls.admin, "3000.00")):
+            Transaction.objects.create(type="recette", amount=Decimal(amount), cash_box=CashBox.get_default(), created_by=created_by)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def assertIncludedUsers(self, data, user_field):
+        users = {str(self.admin.pk), str(self.user.pk)}
+        self.assertEqual(set(data["included_users"]), users)
+        self.assertEqual(data["included_users"][str(self.user.pk)]["email"], self.user.email)
+        self.assertEqual({str(row[user_field]) for row in data["results"]}, users)
+
+    def test_transaction_list(self):
+        for fast_list in (True, False):
+            with self.subTest(fast_list=fast_list), override_settings(TRANSACTIONS_FAST_LIST=fast_list):
+                response = self.client.get(reverse("transaction-list-create"), {"include": "category,users"})
+                self.assertIncludedUsers(response.data, "created_by")
+                self.assertTrue(all(row["modified_by"] is None for row in response.data["results"]))
+
+                response = self.client.get(reverse("transaction-list-create"))
+                self.assertNotIn("included_users", response.data)
+                self.assertEqual(response.data["results"][0]["created_by"]["email"], self.admin.email)
+
+    def test_history(self):
+        response = self.client.get(reverse("transaction-history"), {"include": "users"})
+        self.assertIncludedUsers(response.data, "performed_by")
+        self.assertNotIn("included_users", self.client.get(reverse("transaction-history")).data)
+
+
+class SparseFieldsetTests(TestCase):
+    """?fields= / ?omit= trim the rows, and the SQL loads only what they need"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = ensure_bench_users(1)[0]
+        for amount in ("1000.00", "2000.00"):
+            Transaction.objects.create(type="recette", amount=Decimal(amount), cash_box=CashBox.get_default(), created_by=cls.admin)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_transaction_list_and_detail(self):
+        all_fields = set(self.client.get(reverse("transaction-list-create")).data["results"][0])
+        for fast_list in (True, False):
+            with self.subTest(fast_list=fast_list), override_settings(TRANSACTIONS_FAST_LIST=fast_list):
+                rows = self.client.get(reverse("transaction-list-create"), {"fields": "id,amount"}).data["results"]
+                self.assertEqual([set(row) for row in rows], [{"id", "amount"}] * 2)
+                rows = self.client.get(reverse("transaction-list-create"), {"omit": "balance,created_by"}).data["results"]
+                self.assertEqual(set(rows[0]), all_fields - {"balance", "created_by"})
+        url = reverse("transaction-detail", args=[Transaction.objects.first().pk])
+        self.assertEqual(set(self.client.get(url, {"fields": "id,type"}).data), {"id", "type"})
+
+    def test_history(self):
+        rows = self.client.get(reverse("transaction-history"), {"fields": "id,action"}).data["results"]
+        self.assertEqual([set(row) for row in rows], [{"id", "action"}] * 2)
+
+    def test_queryset_is_narrowed(self):
+        sql = str(TransactionSerializer.narrow_queryset(Transaction.objects.select_related("created_by"), ["id", "category"]).query)
+        self.assertIn('JOIN "categories"', sql)
+        self.assertNotIn('"users"', sql)
+        self.assertNotIn('"description"', sql)
+
+        with override_settings(TRANSACTIONS_FAST_LIST=False), CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("transaction-list-create"), {"fields": "id,amount"})
+        rows_sql = [query["sql"] for query in queries if '"description"' in query["sql"] or 'JOIN "users"' in query["sql"]]
+        self.assertEqual(rows_sql, [])
+
+
+class IdempotencyKeyTests(TestCase):
+    """Retries of a write sent with the same Idempotency-Key replay the first response"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = ensure_bench_users(1)[0]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def post(self, key, **body):
+        return self.client.post(reverse("transaction-list-create"), body, format="json", HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retried_create_is_replayed(self):
+        first = self.post("create-1", type="recette", amount="5000.00")
+        self.assertEqual(first.status_code, 201)
+        with self.assertNumQueries(1):
+            retry = self.post("create-1", type="recette", amount="5000.00")
+        self.assertEqual((retry.status_code, retry.data), (201, first.data))
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Transaction.objects.count(), 1)
+        self.assertEqual(CashBoxBalance.objects.get(cash_box=CashBox.get_default()).current_balance, 5000)
+
+    def test_key_is_bound_to_its_request(self):
+        self.assertEqual(self.post("create-2", type="recette", amount="10.50").status_code, 400)
+        # A failed attempt does not keep the key
+        self.assertEqual(self.post("create-2", type="recette", amount="700.00").status_code, 201)
+        self.assertEqual(self.post("create-2", type="recette", amount="800.00").status_code, 422)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_retried_update_and_delete_are_replayed(self):
+        created = self.post("create-3", type="recette", amount="5000.00").data
+        url = reverse("transaction-detail", args=[created["id"]])
+        for _ in range(2):
+            updated = self.client.patch(url, {"amount": "4000.00"}, format="json", HTTP_IDEMPOTENCY_KEY="update-3")
+            self.assertEqual(updated.data["amount"], "4000.00")
+        self.assertEqual(TransactionHistory.objects.filter(transaction_id=created["id"], action="updated").count(), 1)
+        for _ in range(2):
+            self.assertEqual(self.client.delete(url, HTTP_IDEMPOTENCY_KEY="delete-3").status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 404)
+
+    def test_expired_key_is_claimed_again(self):
+        self.post("create-4", type="recette", amount="5000.00")
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+        self.assertEqual(self.post("create-4", type="recette", amount="5000.00").status_code, 201)
+        self.assertEqual(Transaction.objects.count(), 2)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+    def test_writes_only_free_their_own_expired_key(self):
+        self.post("create-5", type="recette", amount="5000.00")
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+        self.post("create-6", type="recette", amount="5000.00")
+        self.assertEqual(IdempotencyKey.objects.count(), 2)
+
+        out = StringIO()
+        call_command("purge_idempotency_keys", stdout=out)
+        self.assertEqual(list(IdempotencyKey.objects.values_list("key", flat=True)), ["create-6"])
+        self.assertIn("1 clé(s)", out.getvalue())
+
+
+class ReportTests(TestCase):
+    """Reports still render, and workers do not load ReportLab/openpyxl until one is asked for"""
+
+    def test_worker_does_not_load_report_libraries(self):
+        script = (
+            "import sys\n"
+            "from django.core.wsgi import get_wsgi_application\n"
+            "from django.urls import get_resolver\n"
+            "get_wsgi_application()\n"
+            "get_resolver().reverse_dict\n"
+            "import transactions.reports\n"
+            "print(sorted(name for name in ('reportlab', 'openpyxl') if name in sys.modules))\n"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", script], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+            env={**os.environ, "DJANGO_SETTINGS_MODULE": "cash_track_api.test_settings"},
+        ).stdout
+        self.assertEqual(output.strip(), "[]")
+
+    def test_pdf_and_xlsx(self):
+        admin = ensure_bench_users(1)[0]
+        for type_, amount in (("recette", "5000.00"), ("depense", "1200.00")):
+            Transaction.objects.create(type=type_, amount=Decimal(amount), cash_box=CashBox.get_default(), created_by=admin)
+        rows = list(Transaction.objects.select_related("category", "created_by"))
+        today = timezone.localdate()
+        arguments = (rows, "complet", "Mars 2026", today, today, admin.name)
+        self.assertTrue(reports.generate_pdf_report(*arguments).getvalue().startswith(b"%PDF"))
+        self.assertTrue(reports.generate_xlsx_report(*arguments).getvalue().startswith(b"PK"))
+
+
+class ArchiveTests(TestCase):
+    """Archiving a closed month keeps every balance and count, and archived reads stay available on request"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = ensure_bench_users(1)[0]
+        cls.annex = CashBox.objects.create(name="Annexe")
+        month = partitioning.period_start(timezone.localdate(), "month")
+        cls.archived_month = partitioning.period_start(month - timedelta(days=40), "month")
+        old = partitioning.bound(cls.archived_month) + timedelta(days=3)
+        for amount, box, moment in (
+            ("1000.00", cls.annex, old), ("3000.00", CashBox.get_default(), old), ("400.00", cls.annex, timezone.now()),
+        ):
+            transaction = Transaction.objects.create(type="recette", amount=Decimal(amount), cash_box=box, created_by=cls.admin)
+            Transaction.objects.filter(pk=transaction.pk).update(created_at=moment)
+            TransactionHistory.objects.filter(transaction_id=transaction.pk).update(created_at=moment)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(ARCHIVE_ROOT=directory.name))
+
+    def get(self, name, **params):
+        return self.client.get(reverse(name), params).data
+
+    def test_archive_keeps_balances(self):
+        url = reverse("transaction-list-create")
+        before = self.client.get(url, {"cash_box": self.annex.pk}).data["results"]
+        stats = self.get("transaction-stats")
+
+        segment = archive.archive_period(self.archived_month)
+        self.assertEqual((segment.transaction_count, segment.history_count), (2, 2))
+        self.assertEqual(Transaction.objects.count(), 1)
+        self.assertEqual(self.get("transaction-stats"), stats)
+        CashBoxBalance.refresh()
+        self.assertEqual(CashBoxBalance.objects.get(cash_box=self.annex).current_balance, 1400)
+
+        # Day-to-day reads only see the hot rows, with unchanged balances
+        recent = self.client.get(url, {"cash_box": self.annex.pk}).data["results"]
+        self.assertEqual(recent, before[:1])
+        self.assertEqual(self.get("transaction-history")["count"], 1)
+
+        # Asking for archived dates reads the archive too
+        self.assertEqual(self.client.get(url, {"cash_box": self.annex.pk, "archived": "true"}).data["results"], before)
+        history = self.get("transaction-history", date_from=self.archived_month.isoformat())
+        self.assertEqual(history["count"], 3)
+        self.assertEqual(history["stats"]["total_recettes"], 4400)
+
+    def test_archive_refuses_open_or_out_of_order_months(self):
+        with self.assertRaises(archive.ArchiveError):
+            archive.archive_period(timezone.localdate())
+        archive.archive_period(self.archived_month)
+        with self.assertRaises(archive.ArchiveError):
+            archive.archive_period(self.archived_month)
+        self.assertEqual(ArchiveSegment.objects.count(), 1)
+
+    def test_archived_reads_stop_at_the_page_and_are_bounded(self):
+        older = partitioning.period_start(self.archived_month - timedelta(days=1), "month")
+        transaction = Transaction.objects.create(type="depense", amount=Decimal("200.00"), cash_box=self.annex, created_by=self.admin)
+        moment = partitioning.bound(older) + timedelta(days=3)
+        Transaction.objects.filter(pk=transaction.pk).update(created_at=moment)
+        TransactionHistory.objects.filter(transaction_id=transaction.pk).update(created_at=moment)
+        archive.archive_period(older)
+        archive.archive_period(self.archived_month)
+        url = reverse("transaction-list-create")
+
+        # The hot row and one archived row: only the newest segment is opened
+        with patch.object(archive, "read_rows", wraps=archive.read_rows) as read_rows:
+            page = self.client.get(url, {"archived": "true", "page_size": 2}).data
+        self.assertEqual(read_rows.call_count, 1)
+        self.assertEqual((page["count"], page["count_is_estimate"], len(page["results"])), (4, False, 2))
+        # With filters the unread segments only give an estimate, unless asked for the exact count
+        params = {"archived": "true", "cash_box": self.annex.pk, "page_size": 2}
+        self.assertTrue(self.client.get(url, params).data["count_is_estimate"])
+        exact = self.client.get(url, {**params, "exact_count": "true"}).data
+        self.assertEqual((exact["count"], exact["count_is_estimate"]), (3, False))
+
+        with override_settings(ARCHIVE_MAX_SEGMENTS=1):
+            self.assertEqual(self.client.get(url, {"archived": "true"}).status_code, 400)
+            self.assertEqual(self.client.get(reverse("transaction-history"), {"archived": "true"}).status_code, 400)
+            month = {"date_from": self.archived_month.isoformat()}
+            self.assertEqual(self.client.get(url, month).data["count"], 3)
+
+    def test_legacy_fractional_amounts_are_rounded_half_up(self):
+        path = Path(archive.settings.ARCHIVE_ROOT) / "legacy.jsonl.zst"
+        archive.write_rows(path, [{"type": "recette", "amount": amount} for amount in ("0.50", "0.50", "1.49")])
+        self.assertEqual([row["amount"] for row in archive.read_rows(path)], [1, 1, 1])
+
+
+@override_settings(REPLICA_DATABASE="replica")
+class ReplicaRoutingTests(TestCase):
+    """
+    Analytics and ?all=true history read the replica, except for a user who
+    just wrote. The stand-in replica is a second, empty test database, so a
+    response computed on it counts no transactions.
+    """
+    databases = {"default", "replica"}
+
+    @classmethod
+    def setUpTestData(cls):
+        users = ensure_bench_users(3)
+        cls.admin, cls.other = users[0], users[2]
+        for amount in ("1000.00", "2000.00"):
+            Transaction.objects.create(type="recette", amount=Decimal(amount), cash_box=CashBox.get_default(), created_by=cls.admin)
+
+    def setUp(self):
+        cache.clear()
+        self.client = self.client_for(self.admin)
+
+    @staticmethod
+    def client_for(user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def analytics_count(self, client):
+        return client.get(reverse("transaction-analytics")).data["transaction_count"]
+
+    def test_router_reads_replica_only_inside_block(self):
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Transaction))
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Transaction), "replica")
+            self.assertEqual(router.db_for_write(Transaction), "default")
+        with override_settings(REPLICA_DATABASE=""), replica_reads():
+            self.assertIsNone(router.db_for_read(Transaction))
+
+    def test_replica_is_never_migrated(self):
+        router = ReplicaRouter()
+        self.assertIs(router.allow_migrate("replica", "transactions"), False)
+        self.assertIsNone(router.allow_migrate("default", "transactions"))
+        # The test stand-in is migrated before routing is switched on
+        with override_settings(REPLICA_DATABASE=""):
+            self.assertIsNone(router.allow_migrate("replica", "transactions"))
+
+    def test_analytics_reads_replica(self):
+        self.assertEqual(self.analytics_count(self.client), 0)
+        self.assertEqual(self.client.get(reverse("transaction-list-create")).data["count"], 2)
+
+    def test_only_full_history_reads_replica(self):
+        url = reverse("transaction-history")
+        self.assertEqual(self.client.get(url, {"all": "true"}).data["count"], 0)
+        self.assertEqual(self.client.get(url).data["count"], 2)
+
+    def test_writer_reads_own_write(self):
+        response = self.client.post(
+            reverse("transaction-list-create"), {"type": "recette", "amount": "500.00"}, format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.analytics_count(self.client), 3)
+        self.assertEqual(self.analytics_count(self.client_for(self.other)), 0)
+
+        # Once the pin expires the writer is back on the replica
+        cache.clear()
+        self.assertEqual(self.analytics_count(self.client), 0)
+
+    async def test_async_analytics_reads_replica(self):
+        request = AsyncRequestFactory().get(
+            reverse("transaction-analytics"), headers={"Authorization": f"Bearer {AccessToken.for_user(self.admin)}"},
+        )
+        response = await async_views.analytics_view(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'"transaction_count":0', response.content)
+
+
+class AsyncViewParityTests(TestCase):
+    """The async read views answer like their DRF counterparts, errors included"""
+
+    @classmethod
+    def setUpTestData(cls):
+        users = ensure_bench_users(3)
+        cls.admin, cls.other = users[0], users[2]
+        for amount in ("1000.00", "2000.00"):
+            Transaction.objects.create(type="recette", amount=Decimal(amount), cash_box=CashBox.get_default(), created_by=cls.admin)
+        Transaction.objects.create(type="depense", amount=Decimal("500.00"), cash_box=CashBox.get_default(), created_by=cls.admin)
+
+    def setUp(self):
+        cache.clear()
+
+    @staticmethod
+    def call(view, method="get", data=None, user=None, **headers):
+        """Response of a sync or async view function, rendered"""
+        if user is not None:
+            headers["Authorization"] = f"Bearer {AccessToken.for_user(user)}"
+        if iscoroutinefunction(view):
+            return async_to_sync(view)(getattr(AsyncRequestFactory(), method)("/", data, headers=headers))
+        return view(getattr(RequestFactory(), method)("/", data, headers=headers)).render()
+
+    def both(self, name, **kwargs):
+        """(sync, async) responses of the view behind ``name`` for the same request"""
+        responses = []
+        for module in (views, async_views):
+            cache.clear()
+            responses.append(self.call(getattr(module, name), **kwargs))
+        return responses
+
+    def assertSameResponse(self, responses):
+        sync_response, async_response = responses
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(async_response.content, sync_response.content)
+        for header in ("Content-Type", "WWW-Authenticate", "Allow"):
+            self.assertEqual(async_response.get(header), sync_response.get(header), header)
+        return sync_response
+
+    def test_authenticated_reads(self):
+        now = timezone.now()
+        date_range = {"date_from": (now - timedelta(days=1)).isoformat(), "date_to": (now + timedelta(days=1)).isoformat()}
+        for name, data in (("dashboard_stats_view", None), ("analytics_view", date_range), ("transaction_history_view", None)):
+            with self.subTest(name):
+                self.assertEqual(self.assertSameResponse(self.both(name, data=data, user=self.admin)).status_code, 200)
+        response = self.assertSameResponse(self.both("dashboard_stats_view", user=self.admin, Accept="application/msgpack"))
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+
+    def test_errors(self):
+        cases = {
+            "anonymous": ({}, 401),
+            "bad token": ({"headers": {"Authorization": "Bearer nope"}}, 401),
+            "non-admin explain": ({"user": self.other, "data": {"explain": "1"}}, 403),
+            "post": ({"user": self.admin, "method": "post"}, 405),
+            "unacceptable": ({"user": self.admin, "headers": {"Accept": "text/csv"}}, 406),
+        }
+        for case, (kwargs, status) in cases.items():
+            with self.subTest(case):
+                kwargs = dict(kwargs)
+                responses = self.both("analytics_view", **kwargs.pop("headers", {}), **kwargs)
+                self.assertEqual(self.assertSameResponse(responses).status_code, status)
+
+    def test_throttle_classes_apply(self):
+        class OnePerMinute(UserRateThrottle):
+            rate = "1/min"
+
+        second = []
+        for view in (views.dashboard_stats_view, async_views.dashboard_stats_view):
+            cache.clear()
+            with patch.object(view.cls, "throttle_classes", [OnePerMinute]):
+                self.assertEqual(self.call(view, user=self.admin).status_code, 200)
+                second.append(self.call(view, user=self.admin))
+        self.assertEqual(self.assertSameResponse(second).status_code, 429)
+
+
+class BenchHarnessTests(TestCase):
+    """seed_bench writes a consistent ledger, bench_endpoints runs every scenario against it and rolls back"""
+
+    def seed(self, **options):
+        call_command("seed_bench", transactions=120, users=3, cash_boxes=2, batch_size=50, seed=1, stdout=StringIO(), **options)
+
+    def test_seed_and_clear(self):
+        self.seed()
+        self.assertEqual(Transaction.objects.count(), 120)
+        self.assertGreaterEqual(TransactionHistory.objects.count(), 120)
+        self.assertEqual(Transaction.objects.values("cash_box").distinct().count(), 2)
+        for balance in CashBoxBalance.objects.filter(cash_box__transactions__isnull=False).distinct():
+            rows = Transaction.objects.filter(cash_box=balance.cash_box)
+            self.assertEqual(balance.total_recettes, sum(row.amount for row in rows if row.type == "recette"))
+            self.assertEqual(balance.total_depenses, sum(row.amount for row in rows if row.type == "depense"))
+
+        self.seed(clear=True)
+        self.assertEqual(Transaction.objects.count(), 120)
+        self.assertEqual(len(ensure_bench_users(3)), 3)
+
+    def test_bench_endpoints(self):
+        self.seed()
+        counts = Transaction.objects.count(), TransactionHistory.objects.count()
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / "run.json"
+            call_command("bench_endpoints", iterations=1, warmup=0, output=str(output), stdout=StringIO(), stderr=StringIO())
+            report = json.loads(output.read_text())
+        self.assertEqual(report["dataset"]["transactions"], 120)
+        self.assertEqual([result["name"] for result in report["endpoints"] if result["errors"]], [])
+        self.assertEqual((Transaction.objects.count(), TransactionHistory.objects.count()), counts)
+
+
+class LoadtestTests(LiveServerTestCase):
+    """loadtest drives a running instance over HTTP and reports each stage"""
+
+    def test_stage_figures_and_saturation(self):
+        stats = loadtest.StageStats()
+        stats.record("ignored", 5.0, 200)
+        stats.start()
+        for seconds, outcome in ((0.010, 200), (0.020, 201), (0.030, 500), (0.040, "timeout")):
+            stats.record("list", seconds, outcome)
+        stats.stop()
+        stats.started, stats.stopped = 0.0, 2.0
+        stage = stats.summary(4)
+        self.assertEqual((stage["requests"], stage["throughput_rps"], stage["error_rate"]), (4, 2.0, 0.5))
+        self.assertEqual(stage["endpoints"]["list"]["statuses"], {"200": 1, "201": 1, "500": 1, "timeout": 1})
+
+        limits = {"max_error_rate": 0.01, "max_p99": 100}
+        healthy = {"concurrency": 2, "error_rate": 0, "p99_ms": 50, "throughput_rps": 100}
+        self.assertIsNone(loadtest.Command.saturation_reason(healthy, None, limits))
+        for change, reason in (({"error_rate": 0.5}, "error rate"), ({"p99_ms": 150}, "p99"), ({"throughput_rps": 105}, "throughput")):
+            with self.subTest(reason):
+                stage = {**healthy, "concurrency": 4, **change}
+                self.assertTrue(loadtest.Command.saturation_reason(stage, healthy, limits).startswith(reason))
+
+    def test_runs_against_live_server(self):
+        call_command("seed_bench", transactions=50, users=3, stdout=StringIO())
+        # The live server shares its in-memory SQLite connection between threads: one user at a time there
+        stages = [1, 2] if connection.vendor == "postgresql" else [1, 1]
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / "load.json"
+            call_command(
+                "loadtest", url=self.live_server_url, concurrency=",".join(map(str, stages)), duration=1, users=3,
+                keep_going=True, output=str(output), stdout=StringIO(),
+            )
+            report = json.loads(output.read_text())
+        self.assertEqual([stage["concurrency"] for stage in report["stages"]], stages)
+        for stage in report["stages"]:
+            self.assertGreater(stage["requests"], 0)
+            for name, figures in stage["endpoints"].items():
+                # The list pages past the end of this small ledger answer 404
+                allowed = {"200", "201", "404"} if name == "transactions" else {"200", "201"}
+                self.assertLessEqual(set(figures["statuses"]), allowed, name)
+
+
+@skipUnless(connection.vendor == "postgresql", "partitioning needs PostgreSQL")
+class PartitioningTests(TestCase):
+    """Converting to monthly partitions keeps the rows and prunes date-bounded queries"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = ensure_bench_users(1)[0]
+        for amount in ("1000.00", "2000.00"):
+            Transaction.objects.create(type="recette", amount=Decimal(amount), cash_box=CashBox.get_default(), created_by=cls.admin)
+
+    def test_convert_and_prune(self):
+        ahead = partitioning.next_period(partitioning.period_start(timezone.localdate(), "month"), "month")
+        for model in partitioning.PARTITIONED_MODELS:
+            partitioning.convert(model, "month", ahead)
+            self.assertTrue(partitioning.is_partitioned(model))
+        self.assertEqual(Transaction.objects.count(), 2)
+
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.post(reverse("transaction-list-create"), {"type": "depense", "amount": "500.00"}, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Transaction.get_current_balance(), 2500)
+
+        start = timezone.now() - timedelta(hours=1)
+        plan = Transaction.objects.filter(created_at__gte=start, created_at__lt=timezone.now()).explain()
+        current = partitioning.partition_name("transactions", partitioning.period_start(timezone.localdate(), "month"), "month")
+        self.assertIn(current, plan)
+        self.assertNotIn("transactions_default", plan)
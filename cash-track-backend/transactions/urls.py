@@ -1,21 +1,26 @@
+from django.conf import settings
 from django.urls import path
+from . import views, async_views
 from .views import (
     TransactionListCreateView,
     TransactionDetailView,
+    CashBoxListCreateView,
+    CashBoxDetailView,
     transaction_stats_view,
-    dashboard_stats_view,
-    analytics_view,
-    transaction_history_view,
 )
 
+# Async versions of the read-only statistics endpoints under ASGI
+read_views = async_views if settings.ASYNC_READ_VIEWS else views
+
 urlpatterns = [
     path("", TransactionListCreateView.as_view(), name="transaction-list-create"),
     # Specific routes must come before parameterized routes
     path("stats/", transaction_stats_view, name="transaction-stats"),
-    path("dashboard-stats/", dashboard_stats_view, name="dashboard-stats"),
-    path("analytics/", analytics_view, name="transaction-analytics"),
-    path("history/", transaction_history_view, name="transaction-history"),
+    path("dashboard-stats/", read_views.dashboard_stats_view, name="dashboard-stats"),
+    path("analytics/", read_views.analytics_view, name="transaction-analytics"),
+    path("history/", read_views.transaction_history_view, name="transaction-history"),
+    path("cash-boxes/", CashBoxListCreateView.as_view(), name="cash-box-list-create"),
+    path("cash-boxes/<int:pk>/", CashBoxDetailView.as_view(), name="cash-box-detail"),
     # Parameterized routes come last
     path("<int:pk>/", TransactionDetailView.as_view(), name="transaction-detail"),
 ]
-
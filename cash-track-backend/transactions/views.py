@@ -2,17 +2,151 @@ from rest_framework import generics, status, filters
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from django.db.models import Q, Sum, Count
+from rest_framework.exceptions import NotFound, ValidationError
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import ProtectedError, Q, Sum, Count
 from django.utils import timezone
+from django.utils.decorators import method_decorator
+import math
 from datetime import datetime, timedelta
-from decimal import Decimal
-from .models import Transaction, TransactionHistory
-from .serializers import TransactionSerializer, TransactionHistorySerializer
+from decimal import Decimal, InvalidOperation
+from categories.models import Category
+from .models import BalanceSnapshot, CashBox, CashBoxBalance, Transaction, TransactionHistory
+from .serializers import CashBoxSerializer, TransactionSerializer, TransactionHistorySerializer
 from .permissions import IsAdminRole, IsOwnerOrAdmin, IsNotReadOnly
-from .pagination import TransactionPagination
+from .pagination import TransactionPagination, large_estimate, planner_estimate, positive_int, wants_exact_count
+from . import archive, fastpath
+from .idempotency import idempotent
+from cash_track_api.db_router import reads_from_replica
+from cash_track_api.diagnostics import explainable
 
 
-class TransactionListCreateView(generics.ListCreateAPIView):
+def wants_included_users(request):
+    """Return True when the client asked for the compact ``?include=users`` payload"""
+    include = request.query_params.get("include", "")
+    return "users" in [part.strip() for part in include.split(",")]
+
+
+def amount_bound(value, lower):
+    """Whole-FCFA bound of ``amount_min`` (lower) / ``amount_max``, or None when invalid"""
+    try:
+        bound = Decimal(value or "")
+    except InvalidOperation:
+        return None
+    if not bound.is_finite():
+        return None
+    return math.ceil(bound) if lower else math.floor(bound)
+
+
+def selected_cash_box(params):
+    """The ``?cash_box=<id>`` filter, or None for all cash boxes"""
+    try:
+        return int(params["cash_box"])
+    except (KeyError, ValueError):
+        return None
+
+
+def for_cash_box(queryset, cash_box_id):
+    """Restrict a transaction or history queryset to one cash box (None: all of them)"""
+    if cash_box_id is None:
+        return queryset
+    return queryset.filter(cash_box_id=cash_box_id)
+
+
+def list_date_from(params):
+    """Start of the list's creation date filter (created_at_from or date_from)"""
+    return params.get("created_at_from") or params.get("date_from")
+
+
+def archived_transactions(params):
+    """
+    Archived transactions matching the list filters of
+    ``TransactionListCreateView`` (and ``?search=``), newest first, read
+    as far as the requested page.
+    """
+    checks = []
+    cash_box_id = selected_cash_box(params)
+    if cash_box_id is not None:
+        checks.append(lambda row: row["cash_box_id"] == cash_box_id)
+    transaction_type = params.get("type")
+    if transaction_type in ["recette", "depense"]:
+        checks.append(lambda row: row["type"] == transaction_type)
+    category = params.get("category")
+    if category:
+        category_ids = set(Category.objects.filter(name=category).values_list("pk", flat=True))
+        checks.append(lambda row: row["category_id"] in category_ids)
+    author = params.get("author")
+    if author:
+        author_ids = set(get_user_model().objects.filter(name__icontains=author).values_list("pk", flat=True))
+        checks.append(lambda row: row["created_by_id"] in author_ids)
+    updated_from = archive.parse_bound(params.get("updated_at_from"))
+    updated_to = archive.parse_bound(params.get("updated_at_to"), end=True)
+    if updated_from:
+        checks.append(lambda row: row["updated_at"] >= updated_from)
+    if updated_to:
+        checks.append(lambda row: row["updated_at"] <= updated_to)
+    for param, keep in (("amount_min", lambda amount, bound: amount >= bound),
+                        ("amount_max", lambda amount, bound: amount <= bound)):
+        bound = amount_bound(params.get(param), param == "amount_min")
+        if bound is not None:
+            checks.append(lambda row, bound=bound, keep=keep: keep(row["amount"], bound))
+    for term in params.get("search", "").replace(",", " ").split():
+        term = term.lower()
+        term_categories = set(Category.objects.filter(name__icontains=term).values_list("pk", flat=True))
+        checks.append(lambda row, term=term, term_categories=term_categories: row["category_id"] in term_categories or any(
+            term in (row[name] or "").lower() for name in ("description", "ref", "exporter_fournisseur")
+        ))
+
+    return read_archive(
+        "transactions",
+        archive.parse_bound(list_date_from(params)),
+        archive.parse_bound(params.get("created_at_to") or params.get("date_to"), end=True),
+        checks,
+    )
+
+
+def read_archive(kind, start, end, checks):
+    """``archive.ArchivedRows`` passing every check; a range over too many archived months is a 400"""
+    try:
+        return archive.ArchivedRows(
+            kind, start, end, (lambda row: all(check(row) for check in checks)) if checks else None
+        )
+    except archive.ArchiveError as error:
+        raise ValidationError({"detail": str(error)})
+
+
+def parse_field_list(request, param):
+    """Parse a comma-separated field list query param (``?fields=`` / ``?omit=``)"""
+    value = request.query_params.get(param)
+    if not value:
+        return None
+    return {part.strip() for part in value.split(",") if part.strip()} or None
+
+
+class SparseFieldsetViewMixin:
+    """
+    Apply ``?fields=`` / ``?omit=`` to GET requests: the serializer drops the
+    other fields and the queryset only loads the columns and joins they need.
+    """
+    
+    def get_sparse_fields(self):
+        if self.request.method != "GET":
+            return None, None
+        return parse_field_list(self.request, "fields"), parse_field_list(self.request, "omit")
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["fields"], context["omit"] = self.get_sparse_fields()
+        return context
+    
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        fields, omit = self.get_sparse_fields()
+        return self.get_serializer_class().narrow_queryset(queryset, fields, omit)
+
+
+class TransactionListCreateView(SparseFieldsetViewMixin, generics.ListCreateAPIView):
     """List and create transactions"""
     serializer_class = TransactionSerializer
     permission_classes = [IsAuthenticated]
@@ -31,9 +165,51 @@ class TransactionListCreateView(generics.ListCreateAPIView):
             return [IsNotReadOnly()]
         return [IsAuthenticated()]
     
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        included_users = getattr(self, "included_users", None)
+        if included_users is not None:
+            context["included_users"] = included_users
+        return context
+    
+    @method_decorator(explainable)
+    def list(self, request, *args, **kwargs):
+        """List transactions, adding the deduplicated ``included_users`` map when requested"""
+        self.included_users = {} if wants_included_users(request) else None
+        # Archived rows are only rendered by the fast path
+        self.with_archive = archive.archive_requested(request.query_params, list_date_from(request.query_params))
+        if settings.TRANSACTIONS_FAST_LIST or self.with_archive:
+            response = self.fast_list(request)
+        else:
+            response = super().list(request, *args, **kwargs)
+        if self.included_users is not None:
+            response.data["included_users"] = self.included_users
+        return response
+    
+    def fast_list(self, request):
+        """Same response as ``list()``, rendered from a ``values()`` query by the fast path"""
+        fields, omit = self.get_sparse_fields()
+        rows = fastpath.values_queryset(self.filter_queryset(self.get_queryset()), fields, omit)
+        if self.with_archive:
+            # Archived rows are all older: they follow the hot rows, newest first
+            rows = archive.WithArchive(
+                rows, archived_transactions(request.query_params),
+                lambda archived: fastpath.archived_values(archived, fields, omit),
+            )
+        page = self.paginate_queryset(rows)
+        data = fastpath.serialize_rows(
+            page if page is not None else rows, fields, omit, self.included_users
+        )
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+    
     def get_queryset(self):
         queryset = Transaction.objects.select_related("category", "created_by", "modified_by").all()
         
+        # Filter by cash box
+        queryset = for_cash_box(queryset, selected_cash_box(self.request.query_params))
+        
         # Filter by type
         transaction_type = self.request.query_params.get("type")
         if transaction_type in ["recette", "depense"]:
@@ -77,23 +253,27 @@ class TransactionListCreateView(generics.ListCreateAPIView):
             except ValueError:
                 queryset = queryset.filter(updated_at__lte=updated_at_to)
         
-        # Filter by amount range
-        amount_min = self.request.query_params.get("amount_min")
-        amount_max = self.request.query_params.get("amount_max")
-        if amount_min:
+        # Filter by amount range (whole FCFA)
+        amount_min = amount_bound(self.request.query_params.get("amount_min"), lower=True)
+        amount_max = amount_bound(self.request.query_params.get("amount_max"), lower=False)
+        if amount_min is not None:
             queryset = queryset.filter(amount__gte=amount_min)
-        if amount_max:
+        if amount_max is not None:
             queryset = queryset.filter(amount__lte=amount_max)
         
         return queryset
     
+    @method_decorator(idempotent)
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+    
     def perform_create(self, serializer):
         instance = serializer.save(created_by=self.request.user)
         # Pass user to signal for history tracking
         instance._history_user = self.request.user
 
 
-class TransactionDetailView(generics.RetrieveUpdateDestroyAPIView):
+class TransactionDetailView(SparseFieldsetViewMixin, generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update or delete a transaction"""
     queryset = Transaction.objects.select_related("category", "created_by", "modified_by")
     serializer_class = TransactionSerializer
@@ -110,6 +290,14 @@ class TransactionDetailView(generics.RetrieveUpdateDestroyAPIView):
             return [IsAdminRole()]
         return [IsAuthenticated()]
     
+    @method_decorator(idempotent)
+    def update(self, request, *args, **kwargs):
+        return super().update(request, *args, **kwargs)
+    
+    @method_decorator(idempotent)
+    def destroy(self, request, *args, **kwargs):
+        return super().destroy(request, *args, **kwargs)
+    
     def perform_update(self, serializer):
         instance = serializer.instance
         # Store old values for change tracking
@@ -120,6 +308,7 @@ class TransactionDetailView(generics.RetrieveUpdateDestroyAPIView):
             'ref': instance.ref,
             'exporter_fournisseur': instance.exporter_fournisseur,
             'category_id': instance.category_id,
+            'cash_box_id': instance.cash_box_id,
         }
         # Pass user to signal for history tracking
         instance._history_user = self.request.user
@@ -131,26 +320,55 @@ class TransactionDetailView(generics.RetrieveUpdateDestroyAPIView):
         instance.delete()
 
 
+class CashBoxListCreateView(generics.ListCreateAPIView):
+    """List and create cash boxes"""
+    queryset = CashBox.objects.select_related("balance")
+    serializer_class = CashBoxSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get_permissions(self):
+        """Only admins can create cash boxes"""
+        if self.request.method == 'POST':
+            return [IsAdminRole()]
+        return [IsAuthenticated()]
+
+
+class CashBoxDetailView(generics.RetrieveUpdateDestroyAPIView):
+    """Retrieve, update or delete a cash box"""
+    queryset = CashBox.objects.select_related("balance")
+    serializer_class = CashBoxSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get_permissions(self):
+        """Only admins can update or delete cash boxes"""
+        if self.request.method in ['PUT', 'PATCH', 'DELETE']:
+            return [IsAdminRole()]
+        return [IsAuthenticated()]
+    
+    def perform_destroy(self, instance):
+        if instance.is_default:
+            raise ValidationError({"detail": "La caisse par défaut ne peut pas être supprimée."})
+        try:
+            instance.delete()
+        except ProtectedError:
+            raise ValidationError({"detail": "Cette caisse contient des transactions et ne peut pas être supprimée."})
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def transaction_stats_view(request):
     """Get transaction statistics"""
     date_from = request.query_params.get("date_from")
     date_to = request.query_params.get("date_to")
+    cash_box_id = selected_cash_box(request.query_params)
     
-    queryset = Transaction.objects.all()
+    queryset = for_cash_box(Transaction.objects.all(), cash_box_id)
     # Note: date_from and date_to are deprecated, use created_at_from and created_at_to instead
     
-    total_recettes = queryset.filter(type="recette").aggregate(
-        total=Sum("amount")
-    )["total"] or 0
-    
-    total_depenses = abs(queryset.filter(type="depense").aggregate(
-        total=Sum("amount")
-    )["total"] or 0)
-    
-    current_balance = Transaction.get_current_balance()
-    transaction_count = queryset.count()
+    # Totals come from the cash box balance rows, not from the whole ledger
+    total_recettes, total_depenses = CashBoxBalance.totals(cash_box_id)
+    current_balance = total_recettes - total_depenses
+    transaction_count = queryset.count() + BalanceSnapshot.archived_count(cash_box_id)
     
     return Response({
         "current_balance": float(current_balance),
@@ -165,29 +383,28 @@ def transaction_stats_view(request):
 def dashboard_stats_view(request):
     """Get dashboard statistics"""
     today = timezone.now().date()
+    cash_box_id = selected_cash_box(request.query_params)
+    transactions = for_cash_box(Transaction.objects.all(), cash_box_id)
     
     # Today's stats
     # Get today's transactions based on created_at
     today_start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
     today_end = timezone.now().replace(hour=23, minute=59, second=59, microsecond=999999)
     
-    today_recettes = Transaction.objects.filter(
-        type="recette",
-        created_at__gte=today_start,
-        created_at__lte=today_end
-    ).aggregate(total=Sum("amount"))["total"] or 0
-    
-    today_depenses = abs(Transaction.objects.filter(
-        type="depense",
+    today_totals = transactions.filter(
         created_at__gte=today_start,
         created_at__lte=today_end
-    ).aggregate(total=Sum("amount"))["total"] or 0)
+    ).aggregate(
+        recettes=Sum("amount", filter=Q(type="recette")),
+        depenses=Sum("amount", filter=Q(type="depense")),
+    )
+    today_recettes = today_totals["recettes"] or 0
+    today_depenses = abs(today_totals["depenses"] or 0)
     
-    # Overall stats
-    current_balance = Transaction.get_current_balance()
-    total_recettes = Transaction.get_total_recettes()
-    total_depenses = Transaction.get_total_depenses()
-    transaction_count = Transaction.objects.count()
+    # Overall stats, from the cash box balance rows
+    total_recettes, total_depenses = CashBoxBalance.totals(cash_box_id)
+    current_balance = total_recettes - total_depenses
+    transaction_count = transactions.count() + BalanceSnapshot.archived_count(cash_box_id)
     
     return Response({
         "current_balance": float(current_balance),
@@ -199,8 +416,42 @@ def dashboard_stats_view(request):
     })
 
 
+def archived_analytics(params, cash_box_id):
+    """
+    Archived part of the analytics range, when it starts before the archive
+    cutoff: (transactions, category_stats, recettes, depenses), shaped like
+    the view's ``values()`` queries and type sums. Empty otherwise.
+    """
+    date_from, date_to = params.get("date_from"), params.get("date_to")
+    if not date_from or not date_to or not archive.archive_requested(params, date_from):
+        return [], [], 0, 0
+    rows = [
+        row for row in archive.archived_rows("transactions", archive.parse_bound(date_from), archive.parse_bound(date_to))
+        if cash_box_id is None or row["cash_box_id"] == cash_box_id
+    ]
+    sums = {}
+    for row in rows:
+        key = (row["category_id"], row["type"])
+        sums[key] = sums.get(key, 0) + row["amount"]
+    categories = Category.objects.in_bulk({category_id for category_id, _ in sums if category_id})
+    category_stats = []
+    for (category_id, transaction_type), total in sums.items():
+        category = categories.get(category_id)
+        category_stats.append({
+            "category__name": category.name if category else None,
+            "category__color": category.color if category else None,
+            "type": transaction_type,
+            "total": total,
+        })
+    recettes = sum((row["amount"] for row in rows if row["type"] == "recette"), 0)
+    depenses = sum((row["amount"] for row in rows if row["type"] == "depense"), 0)
+    return rows, category_stats, recettes, depenses
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@reads_from_replica
+@explainable
 def analytics_view(request):
     """Get detailed analytics data for charts"""
     date_from = request.query_params.get("date_from")
@@ -213,14 +464,20 @@ def analytics_view(request):
         date_from = start_date.isoformat()
         date_to = end_date.isoformat()
     
-    queryset = Transaction.objects.select_related("category").filter(
+    cash_box_id = selected_cash_box(request.query_params)
+    queryset = for_cash_box(Transaction.objects.select_related("category"), cash_box_id).filter(
         created_at__gte=date_from,
         created_at__lte=date_to
     )
     
+    # Archived transactions, only when the range reaches back into the archive
+    archived, archived_categories, archived_recettes, archived_depenses = archived_analytics(
+        request.query_params, cash_box_id
+    )
+    
     # Daily data for area chart (grouped by created_at date)
     daily_data = {}
-    transactions = queryset.values("created_at", "type", "amount")
+    transactions = list(queryset.values("created_at", "type", "amount")) + archived
     
     for txn in transactions:
         date_str = txn["created_at"].date().strftime("%Y-%m-%d")
@@ -236,9 +493,9 @@ def analytics_view(request):
     area_data = sorted(daily_data.values(), key=lambda x: x["date"])
     
     # Category distribution for bar chart
-    category_stats = queryset.values("category__name", "category__color", "type").annotate(
+    category_stats = list(queryset.values("category__name", "category__color", "type").annotate(
         total=Sum("amount")
-    )
+    )) + archived_categories
     
     category_data = {}
     for stat in category_stats:
@@ -275,16 +532,15 @@ def analytics_view(request):
     category_chart_data.sort(key=lambda x: x["value"], reverse=True)
     
     # Overall stats
-    total_recettes = queryset.filter(type="recette").aggregate(
-        total=Sum("amount")
-    )["total"] or 0
-    
-    total_depenses = abs(queryset.filter(type="depense").aggregate(
-        total=Sum("amount")
-    )["total"] or 0)
+    totals = queryset.aggregate(
+        recettes=Sum("amount", filter=Q(type="recette")),
+        depenses=Sum("amount", filter=Q(type="depense")),
+    )
+    total_recettes = (totals["recettes"] or 0) + archived_recettes
+    total_depenses = abs((totals["depenses"] or 0) + archived_depenses)
     
-    current_balance = Transaction.get_current_balance()
-    transaction_count = queryset.count()
+    current_balance = Transaction.get_current_balance(cash_box_id)
+    transaction_count = queryset.count() + len(archived)
     
     profit_margin = 0
     if total_recettes > 0:
@@ -303,14 +559,13 @@ def analytics_view(request):
     })
 
 
-@api_view(["GET"])
-@permission_classes([IsAuthenticated])
-def transaction_history_view(request):
-    """Get transaction history (all actions: create, update, delete)"""
+def filter_history_queryset(params):
+    """History queryset with the cash_box / transaction_id / action / user_id / date filters applied"""
     queryset = TransactionHistory.objects.select_related("performed_by").all()
+    queryset = for_cash_box(queryset, selected_cash_box(params))
     
     # Filter by transaction_id if provided
-    transaction_id = request.query_params.get("transaction_id")
+    transaction_id = params.get("transaction_id")
     if transaction_id:
         try:
             queryset = queryset.filter(transaction_id=int(transaction_id))
@@ -318,12 +573,12 @@ def transaction_history_view(request):
             pass
     
     # Filter by action if provided
-    action = request.query_params.get("action")
+    action = params.get("action")
     if action in ["created", "updated", "deleted"]:
         queryset = queryset.filter(action=action)
     
     # Filter by user (performed_by) if provided
-    user_id = request.query_params.get("user_id")
+    user_id = params.get("user_id")
     if user_id:
         try:
             queryset = queryset.filter(performed_by_id=int(user_id))
@@ -331,8 +586,8 @@ def transaction_history_view(request):
             pass
     
     # Filter by date range
-    date_from = request.query_params.get("date_from")
-    date_to = request.query_params.get("date_to")
+    date_from = params.get("date_from")
+    date_to = params.get("date_to")
     if date_from:
         queryset = queryset.filter(created_at__gte=date_from)
     if date_to:
@@ -343,85 +598,208 @@ def transaction_history_view(request):
         except ValueError:
             queryset = queryset.filter(created_at__lte=date_to)
     
-    # Calculate stats for the filtered queryset
-    total_actions = queryset.count()
-    created_count = queryset.filter(action="created").count()
-    updated_count = queryset.filter(action="updated").count()
-    deleted_count = queryset.filter(action="deleted").count()
-    
-    # Calculate amounts from transaction_data
+    return queryset
+
+
+def archived_history(params):
+    """
+    Archived history entries matching the filters of ``filter_history_queryset``,
+    newest first, when the request asks for archived dates; None otherwise.
+    """
+    date_from = params.get("date_from")
+    if not archive.archive_requested(params, date_from):
+        return None
+    checks = []
+    cash_box_id = selected_cash_box(params)
+    if cash_box_id is not None:
+        checks.append(lambda row: row["cash_box_id"] == cash_box_id)
+    for param, column in (("transaction_id", "transaction_id"), ("user_id", "performed_by_id")):
+        try:
+            value = int(params.get(param) or "")
+        except ValueError:
+            continue
+        checks.append(lambda row, column=column, value=value: row[column] == value)
+    action = params.get("action")
+    if action in ["created", "updated", "deleted"]:
+        checks.append(lambda row: row["action"] == action)
+    return read_archive(
+        "history", archive.parse_bound(date_from), archive.parse_bound(params.get("date_to"), end=True), checks
+    )
+
+
+def history_instances(rows):
+    """Unsaved ``TransactionHistory`` instances of archived entries, for the serializer"""
+    users = get_user_model().objects.in_bulk({row["performed_by_id"] for row in rows if row["performed_by_id"]})
+    items = []
+    for row in rows:
+        item = TransactionHistory(**row)
+        item.performed_by = users.get(row["performed_by_id"])
+        items.append(item)
+    return items
+
+
+def add_archived_history(archived, counts, totals, users):
+    """Add archived entries to the history (counts, totals, users) stats"""
+    counts = dict(counts)
+    counts["total_actions"] += len(archived)
+    for row in archived:
+        counts[f"{row['action']}_count"] += 1
+    recettes, depenses = history_amount_totals(row["transaction_data"] for row in archived)
+    users = list(users)
+    known = {user["performed_by__id"] for user in users}
+    missing = {row["performed_by_id"] for row in archived if row["performed_by_id"]} - known
+    users.extend(
+        {"performed_by__id": user.pk, "performed_by__name": user.name, "performed_by__email": user.email}
+        for user in get_user_model().objects.filter(pk__in=missing).only("id", "name", "email")
+    )
+    return counts, (totals[0] + recettes, totals[1] + depenses), users
+
+
+def history_amount_totals(snapshots):
+    """Sum recettes / dépenses from the transaction_data snapshots of history entries"""
     total_recettes = 0
     total_depenses = 0
     
-    for history_item in queryset:
-        if history_item.transaction_data and history_item.transaction_data.get("amount"):
+    for transaction_data in snapshots:
+        if transaction_data and transaction_data.get("amount"):
             try:
-                amount = float(history_item.transaction_data["amount"])
-                if history_item.transaction_data.get("type") == "recette":
+                amount = float(transaction_data["amount"])
+                if transaction_data.get("type") == "recette":
                     total_recettes += amount
                 else:
                     total_depenses += abs(amount)
             except (ValueError, TypeError):
                 pass
     
-    # Get unique users who performed actions
-    unique_users = queryset.exclude(performed_by__isnull=True).values(
+    return total_recettes, total_depenses
+
+
+HISTORY_COUNTS = {
+    "total_actions": Count("id"),
+    "created_count": Count("id", filter=Q(action="created")),
+    "updated_count": Count("id", filter=Q(action="updated")),
+    "deleted_count": Count("id", filter=Q(action="deleted")),
+}
+
+
+def history_counts(queryset, exact=False):
+    """
+    (counts, is_estimate) of the history stats: one conditional aggregate,
+    or the planner estimates when the history is large (see pagination.py)
+    """
+    total = None if exact else large_estimate(queryset)
+    if total is None:
+        return queryset.aggregate(**HISTORY_COUNTS), False
+    counts = {"total_actions": total}
+    for action in ("created", "updated", "deleted"):
+        counts[f"{action}_count"] = planner_estimate(queryset.filter(action=action))
+    return counts, True
+
+
+def history_unique_users(queryset):
+    """Distinct users who performed the actions of the queryset"""
+    return queryset.exclude(performed_by__isnull=True).values(
         "performed_by__id", "performed_by__name", "performed_by__email"
     ).distinct()
+
+
+def history_serializer_context(request):
+    """Serializer context honoring ?fields= / ?omit= and ?include=users"""
+    # Compact payload: rows carry user IDs, users are listed once in included_users
+    serializer_context = {
+        "request": request,
+        "fields": parse_field_list(request, "fields"),
+        "omit": parse_field_list(request, "omit"),
+    }
+    if wants_included_users(request):
+        serializer_context["included_users"] = {}
+    return serializer_context
+
+
+def wants_full_history(request):
+    """?all=true: the whole history in one response, read from the replica if any"""
+    return request.query_params.get("all", "false").lower() == "true"
+
+
+def history_page(params, total_count):
+    """
+    Pagination of the history view: returns (page, page_size, start, end),
+    with end None when ?all=true asks for every result.
+    """
+    # Check if user wants all results (no pagination)
+    if params.get("all", "false").lower() == "true":
+        return 1, total_count, 0, None
+    
+    # Like TransactionPagination: a bad page size falls back to the default, a bad page is a 404
+    page_size = positive_int(params.get("page_size"), 50)
+    page = positive_int(params.get("page", 1), None)
+    if page is None:
+        raise NotFound(TransactionPagination.invalid_page_message)
+    start = (page - 1) * page_size
+    return page, page_size, start, start + page_size
+
+
+def history_response_data(results, total_count, page, page_size, end, counts, totals, users, serializer_context,
+                          count_is_estimate=False):
+    """Assemble the history view payload"""
+    response_data = {
+        "results": results,
+        "count": total_count,
+        "count_is_estimate": count_is_estimate,
+        "page": page,
+        "page_size": page_size,
+        "next": f"?page={page + 1}&page_size={page_size}" if end is not None and (
+            end < total_count or count_is_estimate and len(results) == page_size
+        ) else None,
+        "previous": f"?page={page - 1}&page_size={page_size}" if end is not None and page > 1 else None,
+        "stats": {
+            "total_actions": counts["total_actions"],
+            "created_count": counts["created_count"],
+            "updated_count": counts["updated_count"],
+            "deleted_count": counts["deleted_count"],
+            "total_recettes": float(totals[0]),
+            "total_depenses": float(totals[1]),
+        },
+        "users": users,
+    }
+    if "included_users" in serializer_context:
+        response_data["included_users"] = serializer_context["included_users"]
+    return response_data
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@reads_from_replica(when=wants_full_history)
+@explainable
+def transaction_history_view(request):
+    """Get transaction history (all actions: create, update, delete)"""
+    queryset = filter_history_queryset(request.query_params)
+    archived = archived_history(request.query_params)
     
-    total_count = queryset.count()
+    # Calculate stats for the filtered queryset
+    counts, count_is_estimate = history_counts(queryset, wants_exact_count(request.query_params))
     
-    # Check if user wants all results (no pagination)
-    get_all = request.query_params.get("all", "false").lower() == "true"
+    # Calculate amounts from transaction_data
+    totals = history_amount_totals(queryset.values_list("transaction_data", flat=True))
     
-    if get_all:
-        # Return all results without pagination
-        history_items = queryset.all()
-        serializer = TransactionHistorySerializer(history_items, many=True)
-        
-        return Response({
-            "results": serializer.data,
-            "count": total_count,
-            "page": 1,
-            "page_size": total_count,
-            "next": None,
-            "previous": None,
-            "stats": {
-                "total_actions": total_actions,
-                "created_count": created_count,
-                "updated_count": updated_count,
-                "deleted_count": deleted_count,
-                "total_recettes": float(total_recettes),
-                "total_depenses": float(total_depenses),
-            },
-            "users": list(unique_users),
-        })
-    else:
-        # Pagination
-        page_size = int(request.query_params.get("page_size", 50))
-        page = int(request.query_params.get("page", 1))
-        
-        start = (page - 1) * page_size
-        end = start + page_size
-        
-        history_items = queryset[start:end]
-        
-        serializer = TransactionHistorySerializer(history_items, many=True)
-        
-        return Response({
-            "results": serializer.data,
-            "count": total_count,
-            "page": page,
-            "page_size": page_size,
-            "next": f"?page={page + 1}&page_size={page_size}" if end < total_count else None,
-            "previous": f"?page={page - 1}&page_size={page_size}" if page > 1 else None,
-            "stats": {
-                "total_actions": total_actions,
-                "created_count": created_count,
-                "updated_count": updated_count,
-                "deleted_count": deleted_count,
-                "total_recettes": float(total_recettes),
-                "total_depenses": float(total_depenses),
-            },
-            "users": list(unique_users),
-        })
+    # Get unique users who performed actions
+    unique_users = list(history_unique_users(queryset))
+    
+    if archived is not None:
+        counts, totals, unique_users = add_archived_history(archived, counts, totals, unique_users)
+    total_count = counts["total_actions"]
+    page, page_size, start, end = history_page(request.query_params, total_count)
+    
+    serializer_context = history_serializer_context(request)
+    history_items = TransactionHistorySerializer.narrow_queryset(
+        queryset, serializer_context["fields"], serializer_context["omit"]
+    )
+    if archived is not None:
+        # Archived entries are all older: they follow the hot ones
+        history_items = archive.WithArchive(history_items, archived, history_instances)
+    serializer = TransactionHistorySerializer(history_items[start:end], many=True, context=serializer_context)
+    
+    return Response(history_response_data(
+        serializer.data, total_count, page, page_size, end, counts, totals,
+        unique_users, serializer_context, count_is_estimate,
+    ))
@@ -90,7 +90,8 @@ class TokenStorage {
       );
 
       if (response.data.access) {
-        this.setTokens(response.data.access, refreshToken);
+        // The backend rotates refresh tokens: keep the new one when provided
+        this.setTokens(response.data.access, response.data.refresh || refreshToken);
         return response.data.access;
       }
 
@@ -580,7 +581,7 @@ const apiClientWrapper = {
   
   logout: async () => {
     try {
-      await apiClient.post("/auth/logout/");
+      await apiClient.post("/auth/logout/", { refresh: tokenStorage.getRefreshToken() });
     } finally {
       tokenStorage.clear();
     }
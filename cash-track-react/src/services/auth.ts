@@ -25,7 +25,7 @@ export const authService = {
 
   logout: async (): Promise<void> => {
     try {
-      await apiClient.post("/auth/logout/");
+      await apiClient.post("/auth/logout/", { refresh: tokenStorage.getRefreshToken() });
     } finally {
       tokenStorage.clear();
     }
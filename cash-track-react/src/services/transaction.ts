@@ -1,6 +1,13 @@
 import type { Transaction } from "@/types";
 import { apiClient } from "./api";
 
+// One key per write: the retries of the request (token refresh) reuse its
+// config, so the backend replays the first response instead of writing twice
+const idempotent = () =>
+  typeof crypto !== "undefined" && "randomUUID" in crypto
+    ? { headers: { "Idempotency-Key": crypto.randomUUID() } }
+    : {};
+
 export interface CreateTransactionDto {
   type: "recette" | "depense";
   description: string;
@@ -107,7 +114,7 @@ export const transactionService = {
   },
 
   createTransaction: async (transaction: CreateTransactionDto): Promise<Transaction> => {
-    const response = await apiClient.post("/transactions/", transaction);
+    const response = await apiClient.post("/transactions/", transaction, idempotent());
     return formatTransaction(response.data);
   },
 
@@ -115,12 +122,12 @@ export const transactionService = {
     transactionId: number,
     transaction: UpdateTransactionDto
   ): Promise<Transaction> => {
-    const response = await apiClient.patch(`/transactions/${transactionId}/`, transaction);
+    const response = await apiClient.patch(`/transactions/${transactionId}/`, transaction, idempotent());
     return formatTransaction(response.data);
   },
 
   deleteTransaction: async (transactionId: number): Promise<void> => {
-    await apiClient.delete(`/transactions/${transactionId}/`);
+    await apiClient.delete(`/transactions/${transactionId}/`, idempotent());
   },
 
   getStats: async (params?: { date_from?: string; date_to?: string }): Promise<TransactionStats> => {